@@ -0,0 +1,227 @@
+"""
+Recognition of many pdf files with a pool of long-lived worker processes
+Each worker loads configuration once and processes whole files, outputs are written next to input files
+as with reco_pdf.py, printed output of each file goes to its <file>_reco.log
+Tables are written in one output file by pdf file, or in one sqlite database shared by all workers
+"""
+import glob
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout
+
+## local import
+from reco_pdf import get_config_info, process_document
+from ocr_cache import OcrCache, DEFAULT_CACHE_DIR
+from sinks import create_sink, OUTPUT_FORMATS
+from instrumentation import Tracer, get_tracer, set_tracer
+from registry import ConfigRegistry
+from parallel import init_worker_process
+from ocr import CONFIGS_DIR, OCR_BACKEND_NAMES, create_ocr_backend, get_ocr_backend, set_ocr_backend
+
+
+def get_pdf_files(input_path):
+    """
+    :param input_path: directory or glob pattern of pdf files
+    :return: sorted list of pdf files (extension .pdf in any case), outputs of previous recognitions (_output.pdf)
+             are excluded
+    """
+    if os.path.isdir(input_path):
+        input_path = os.path.join(input_path, "*")
+    pdf_files = []
+    for f in glob.glob(input_path):
+        root_file, ext = os.path.splitext(f)
+        if ext.lower() == ".pdf" and not root_file.endswith("_output"):
+            pdf_files.append(f)
+    return sorted(pdf_files)
+
+
+# context of worker processes, set once by init_batch_worker
+_batch_worker_context = {}
+
+
+def get_output_path(root_file, output_format, output=''):
+    """
+    :param root_file: pdf filename without extension
+    :param output_format: format of tables output (see sinks.OUTPUT_FORMATS)
+    :param output: path of sqlite database shared by all files ('' for one output file by pdf file)
+    :return: path of tables output of file (None for stdout)
+    """
+    if output_format == "stdout":
+        return None
+    if output_format == "sqlite" and output:
+        return output
+    return '{}_tables.{}'.format(root_file, output_format)
+
+
+def init_batch_worker(config_filename, ocr_cache, output_format, output, tracer, registry, ocr_backend, verbose):
+    """
+    initializer of batch worker processes : configuration (or registry of configurations) is read once for all files
+    """
+    init_worker_process(ocr_backend, tracer)
+    _batch_worker_context.update({"cfg_json": get_config_info(config_filename) if registry is None else None,
+                                  "registry": registry, "ocr_cache": ocr_cache, "output_format": output_format,
+                                  "output": output, "verbose": verbose})
+
+
+def get_file_result(pdf_file, error=None):
+    """
+    :param pdf_file: path of pdf file
+    :param error: error message (None if no error)
+    :return: result of a file not yet recognized (see process_file_task)
+    """
+    return {"file": pdf_file, "nb_pages": 0, "nb_tables": 0, "time": 0., "error": error}
+
+
+def process_file_task(pdf_file):
+    """
+    task of batch worker processes : recognition of one file
+    :param pdf_file: path of pdf file
+    :return: dictionary with keys file, nb_pages, nb_tables, time (seconds), error (None if no error), trace
+             (records of stages of file, see instrumentation.Tracer.pop_records) and with a registry config (name
+             of configuration of document, None for an unknown document)
+    """
+    ctx = _batch_worker_context
+    root_file = os.path.splitext(pdf_file)[0]
+    file_result = get_file_result(pdf_file)
+    start = time.perf_counter()
+    try:
+        with open('{}_reco.log'.format(root_file), 'w') as log, redirect_stdout(log):
+            cfg_json = ctx["cfg_json"]
+            if ctx["registry"] is not None:
+                # only the configuration of document type is used, unknown documents are not recognized
+                config_name, score = ctx["registry"].classify_document(pdf_file, verbose=ctx["verbose"])
+                print("document template : {} (score {:.2f})".format(config_name or "unknown", score))
+                file_result["config"] = config_name
+                cfg_json = ctx["registry"].configs.get(config_name)
+                if cfg_json is None:
+                    file_result["error"] = "unknown document template (best score {:.2f})".format(score)
+            if cfg_json is not None:
+                with create_sink(ctx["output_format"], get_output_path(root_file, ctx["output_format"], ctx["output"]),
+                                 document=os.path.basename(pdf_file)) as sink:
+                    stats = process_document(root_file, cfg_json, ocr_cache=ctx["ocr_cache"], sink=sink,
+                                             pdf_path=pdf_file, verbose=ctx["verbose"])
+                file_result.update(stats)
+    except Exception as e:
+        file_result["error"] = "{}: {}".format(type(e).__name__, e)
+    file_result["time"] = time.perf_counter() - start
+    file_result["trace"] = get_tracer().pop_records()
+    return file_result
+
+
+def process_batch(pdf_files, config_filename, jobs=None, ocr_cache=None, output_format="stdout", output='',
+                  registry=None, verbose=0):
+    """
+    recognition of a list of pdf files, files are distributed on a pool of worker processes
+    :param pdf_files: list of pdf files
+    :param config_filename: config filename (not used if a registry is given)
+    :param jobs: number of worker processes (default number of cores)
+    :param ocr_cache: OcrCache object or None
+    :param output_format: format of tables output (see sinks.OUTPUT_FORMATS), stdout tables go to files logs
+    :param output: path of sqlite database shared by all files (see get_output_path)
+    :param registry: ConfigRegistry object : configuration of each file is found among its configurations
+    :param verbose: verbose mode
+    :return: list of files results (see process_file_task) in order of completion
+    :note: stages are traced with tracer of process (see instrumentation.set_tracer), records of workers are merged,
+           workers use OCR backend of process (see ocr.set_ocr_backend)
+    """
+    jobs = jobs or os.cpu_count() or 1
+    files_results = []
+    tracer = get_tracer()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_batch_worker,
+                             initargs=(config_filename, ocr_cache, output_format, output, tracer, registry,
+                                       get_ocr_backend(), verbose)) as executor:
+        futures = {executor.submit(process_file_task, f): f for f in pdf_files}
+        for future in as_completed(futures):
+            try:
+                file_result = future.result()
+            except BrokenProcessPool as e:
+                # a worker died (crash, killed by memory limit...) : its file and files not finished fail
+                file_result = get_file_result(futures[future], "worker process ended abruptly ({})".format(e))
+            tracer.merge(file_result.pop("trace", []))
+            files_results.append(file_result)
+            print("{}/{} {} : {} pages, {} tables in {:.1f} s{}".format(
+                len(files_results), len(pdf_files), file_result["file"], file_result["nb_pages"],
+                file_result["nb_tables"], file_result["time"],
+                " FAILED {}".format(file_result["error"]) if file_result["error"] else ""))
+    return files_results
+
+
+def print_batch_summary(files_results, elapsed):
+    """
+    print throughput of a batch and its failed files
+    :param files_results: list of files results (see process_file_task)
+    :param elapsed: elapsed time of batch in seconds
+    :return: nothing
+    """
+    nb_files = len(files_results)
+    nb_pages = sum(r["nb_pages"] for r in files_results)
+    failed = [r for r in files_results if r["error"]]
+    elapsed = max(elapsed, 1e-9)
+    print("----------------")
+    print("files : {} ({} failed)".format(nb_files, len(failed)))
+    print("pages : {}".format(nb_pages))
+    print("tables : {}".format(sum(r["nb_tables"] for r in files_results)))
+    print("elapsed : {:.1f} s".format(elapsed))
+    print("throughput : {:.2f} files/s, {:.2f} pages/s".format(nb_files / elapsed, nb_pages / elapsed))
+    templates = Counter(r["config"] or "unknown" for r in files_results if "config" in r)
+    if templates:
+        print("templates : {}".format(", ".join("{} {}".format(name, nb) for name, nb in templates.most_common())))
+    for r in failed:
+        print("failed : {} ({})".format(r["file"], r["error"]))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Recognition of a batch of pdf files')
+    parser.add_argument('-d', '--dir', type=str, help='directory or glob pattern of pdf files')
+    parser.add_argument('-c', '--config', type=str, default='',
+                        help='config filename, auto : config of each file is found among configs of --configs-dir')
+    parser.add_argument('--configs-dir', type=str, default=CONFIGS_DIR, help='directory of configs (with -c auto)')
+    parser.add_argument('--min-template-score', type=float, default=0.5,
+                        help='minimal part of headers of a config found in document (with -c auto)')
+    parser.add_argument('-v', '--verbose', type=int, default=0, help='verbose mode')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='number of worker processes (default number of cores)')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help='directory of OCR cache')
+    parser.add_argument('--cache-size', type=int, default=2048, help='maximal size of OCR cache in MB')
+    parser.add_argument('--no-cache', action='store_true', help='do not use OCR cache')
+    parser.add_argument('--output-format', type=str, default='stdout', choices=OUTPUT_FORMATS,
+                        help='format of tables output (stdout tables go to <file>_reco.log)')
+    parser.add_argument('--output', type=str, default='',
+                        help='sqlite database shared by all files (default one <file>_tables.<format> by file)')
+    parser.add_argument('--trace', type=str, default='',
+                        help='stages of pages are timed and written in this JSON lines file, summary is printed')
+    parser.add_argument('--profile-page', type=int, default=0,
+                        help='number of page (starting from 1) profiled with cProfile in each file')
+    parser.add_argument('--ocr-backend', type=str, default='auto', choices=OCR_BACKEND_NAMES,
+                        help='cli : tesseract program run for each image, tesserocr : tesseract engine kept in workers'
+                             ' (auto : tesserocr if it is installed)')
+
+    args = parser.parse_args()
+    set_ocr_backend(create_ocr_backend(args.ocr_backend))
+    ocr_cache = None
+    if not args.no_cache:
+        ocr_cache = OcrCache(args.cache_dir, max_size=args.cache_size * 1024 * 1024, verbose=args.verbose)
+
+    tracer = None
+    if args.trace or args.profile_page:
+        tracer = Tracer(args.trace, profile_page=args.profile_page - 1 if args.profile_page else None)
+        set_tracer(tracer)
+
+    pdf_files = get_pdf_files(args.dir)
+    print("{} pdf files to recognize".format(len(pdf_files)))
+    start_time = time.perf_counter()
+    config_registry = None
+    if args.config == "auto":
+        config_registry = ConfigRegistry.from_dir(args.configs_dir, min_score=args.min_template_score,
+                                                  verbose=args.verbose)
+    results = process_batch(pdf_files, args.config, jobs=args.jobs, ocr_cache=ocr_cache,
+                            output_format=args.output_format, output=args.output, registry=config_registry,
+                            verbose=args.verbose)
+    print_batch_summary(results, time.perf_counter() - start_time)
+    if tracer is not None:
+        tracer.close()
+        tracer.print_summary()
@@ -0,0 +1,68 @@
+"""
+Benchmark of skew angle estimation : angle from headers of a first OCR pass (headers.get_angle_from_headers_line)
+against angle from pixels only (deskew.estimate_skew_angle)
+Pages can be rotated by known angles to compare both methods with ground truth
+
+usage (from repository root) :
+> python3 -m benchmarks.bench_deskew -c ./configs/Hachette_config.json -f document.pdf -r 0 0.8 -1.5
+"""
+import time
+
+import pytesseract
+
+from box import update_tesseract_rec_with_boxes
+from deskew import estimate_skew_angle
+from headers import get_angle_from_headers_line
+from pages import generate_pages_images
+from reco_pdf import get_config_info, rotate_to_orientation
+
+
+def headers_angle(img, cfg_json):
+    """
+    angle found by headers method, including the full page OCR it needs
+    """
+    data_rec = pytesseract.image_to_data(img, lang='fra', output_type=pytesseract.Output.DICT)
+    update_tesseract_rec_with_boxes(data_rec)
+    return get_angle_from_headers_line(data_rec, cfg_json)
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    res = func(*args)
+    return res, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark of skew angle estimation')
+    parser.add_argument('-f', '--file', type=str, help='pdf filename')
+    parser.add_argument('-c', '--config', type=str, help='config filename')
+    parser.add_argument('-p', '--pages', type=int, default=5, help='maximal number of pages to use')
+    parser.add_argument('-r', '--rotations', type=float, nargs='*', default=[0.0],
+                        help='known rotations (degrees) applied to pages before estimation')
+    args = parser.parse_args()
+    config_json = get_config_info(args.config)
+
+    results = []
+    print("page;rotation;headers angle;headers time (s);pixels angle;pixels time (s)")
+    for page_idx, page_img in generate_pages_images(args.file, dpi=300, chunk_size=1):
+        if page_idx >= args.pages:
+            break
+        page_img = rotate_to_orientation(page_img, config_json)
+        for rotation in args.rotations:
+            # rotate clockwise so that expected angle is + rotation
+            img = page_img.rotate(-rotation, expand=True, fillcolor=(255, 255, 255)) if rotation else page_img
+            hdr_angle, hdr_time = time_call(headers_angle, img, config_json)
+            pix_angle, pix_time = time_call(estimate_skew_angle, img)
+            results.append((rotation, hdr_angle, hdr_time, pix_angle, pix_time))
+            print("{};{};{:.3f};{:.3f};{:.3f};{:.3f}".format(page_idx + 1, rotation, hdr_angle, hdr_time,
+                                                             pix_angle, pix_time))
+
+    if results:
+        nb = len(results)
+        print("mean |headers - pixels| : {:.3f} degrees".format(sum(abs(r[1] - r[3]) for r in results) / nb))
+        print("mean |rotation - headers| : {:.3f} degrees".format(sum(abs(r[0] - r[1]) for r in results) / nb))
+        print("mean |rotation - pixels| : {:.3f} degrees".format(sum(abs(r[0] - r[3]) for r in results) / nb))
+        print("mean time headers : {:.3f} s, pixels : {:.3f} s".format(sum(r[2] for r in results) / nb,
+                                                                      sum(r[4] for r in results) / nb))
@@ -0,0 +1,101 @@
+"""
+Benchmark of page preprocessing : historical PIL pipeline (rotations of color image, rank filters and ImageMath
+expressions) against the numpy preprocessing engine (preprocessing.py)
+Pages are rendered from a pdf file, or synthetic pages are used when no file is given
+
+usage (from repository root) :
+> python3 -m benchmarks.bench_preprocessing -c ./configs/Hachette_config.json -f document.pdf
+> python3 -m benchmarks.bench_preprocessing -c ./configs/Hachette_config.json -n 5
+"""
+import time
+
+import numpy
+from PIL import Image, ImageDraw, ImageFilter, ImageMath
+
+from deskew import estimate_skew_angle
+from pages import generate_pages_images
+from preprocessing import PreprocessingEngine
+from reco_pdf import get_config_info, rotate_to_orientation
+
+
+def legacy_image_improvement(img, cfg_json):
+    """
+    historical preprocessing : orientation rotation, deskew rotation of color image then opening with ImageMath
+    """
+    img = rotate_to_orientation(img, cfg_json)
+    cur_angle = estimate_skew_angle(img)
+    if abs(cur_angle) > 0.5:
+        img = img.rotate(cur_angle, expand=True, fillcolor=(255, 255, 255))
+    gs_image = img.convert("L")
+    coeff = cfg_json.get("image_graysacle_opening_coeff", 0)
+    if not 0 < coeff <= 1.0:
+        return gs_image
+    if coeff == 1:
+        return gs_image.filter(ImageFilter.MaxFilter(3)).filter(ImageFilter.MinFilter(3))
+    max_val = 1
+    int_coeff = coeff
+    while int(int_coeff) != int_coeff:
+        max_val *= 10
+        int_coeff *= 10
+    imageMath_txt = "convert(({} * A + {} * B)/{}, 'L')".format(int(int_coeff), int(max_val - int_coeff), max_val)
+    temp_image = ImageMath.eval(imageMath_txt, A=gs_image.filter(ImageFilter.MaxFilter(3)), B=gs_image)
+    return ImageMath.eval(imageMath_txt, A=temp_image.filter(ImageFilter.MinFilter(3)), B=temp_image)
+
+
+def synthetic_page(page_idx, size=(2480, 3508), angle=1.2):
+    """
+    portrait page of text lines, skewed by angle
+    """
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    rng = numpy.random.default_rng(page_idx)
+    for top in range(200, size[1] - 200, 60):
+        left = 150
+        while left < size[0] - 300:
+            width = int(rng.integers(40, 250))
+            draw.rectangle((left, top, left + width, top + 25), fill="black")
+            left += width + 30
+    return img.rotate(-angle, expand=False, fillcolor="white")
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    res = func(*args)
+    return res, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark of page preprocessing')
+    parser.add_argument('-f', '--file', type=str, default='', help='pdf filename (synthetic pages if not given)')
+    parser.add_argument('-c', '--config', type=str, help='config filename')
+    parser.add_argument('-n', '--nb-pages', type=int, default=5, help='maximal number of pages to use')
+    args = parser.parse_args()
+    config_json = get_config_info(args.config)
+
+    if args.file:
+        pages = (img for (page_idx, img) in generate_pages_images(args.file, dpi=300, chunk_size=1,
+                                                                  nb_pages=args.nb_pages))
+    else:
+        pages = (synthetic_page(page_idx) for page_idx in range(args.nb_pages))
+
+    engine = PreprocessingEngine()
+    results = []
+    print("page;legacy time (s);engine time (s);mean absolute difference")
+    for page_idx, page_img in enumerate(pages):
+        legacy_img, legacy_time = time_call(legacy_image_improvement, page_img, config_json)
+        engine_img, engine_time = time_call(engine.run, page_img, config_json)
+        diff = float("nan")
+        if legacy_img.size == engine_img.size:
+            diff = float(numpy.mean(numpy.abs(numpy.asarray(legacy_img, dtype=numpy.int16) -
+                                              numpy.asarray(engine_img, dtype=numpy.int16))))
+        results.append((legacy_time, engine_time))
+        print("{};{:.3f};{:.3f};{:.2f}".format(page_idx + 1, legacy_time, engine_time, diff))
+
+    if results:
+        nb = len(results)
+        legacy_mean = sum(r[0] for r in results) / nb
+        engine_mean = sum(r[1] for r in results) / nb
+        print("mean time by page legacy : {:.3f} s, engine : {:.3f} s (x{:.1f})".format(
+            legacy_mean, engine_mean, legacy_mean / max(engine_mean, 1e-9)))
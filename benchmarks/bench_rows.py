@@ -0,0 +1,140 @@
+"""
+Benchmark of rows detection of package tables : historical per pixel row Counter and per word column search
+against difference array histogram and vectorized run detection (utils.get_rows_from_selected_rec), then
+historical scan of all boxes for each row against one pass assignment with a spatial index (Table.add_rows_from_lines)
+Dense synthetic 300 dpi pages are used : a headers row then lines of words in each column
+
+usage (from repository root) :
+> python3 -m benchmarks.bench_rows -n 5
+"""
+import time
+from collections import Counter
+
+import numpy
+
+from box import Box, BoxFormats, SpatialIndex, update_tesseract_rec_with_boxes
+from rec_frame import DATA_REC_KEYS
+from table import Table
+from utils import get_rows_from_selected_rec
+
+
+def legacy_search_rec_in_headed_columns(table, data_rec):
+    """
+    historical search : one tuple (column index, [recognition index]) by word
+    """
+    idx_col_rec = []
+    header_bottom = table.rows[0].box.bottom
+    ind_rec_below = [idx for idx, box in enumerate(data_rec["box"]) if box.top >= header_bottom]
+    for ind_rec in ind_rec_below:
+        if not data_rec["text"][ind_rec]:
+            continue
+        rec_box = data_rec["box"][ind_rec]
+        for idx_col, col in enumerate(table.columns):
+            if col.box.left <= rec_box.left and col.box.right >= rec_box.right:
+                idx_col_rec.append((idx_col, [ind_rec]))
+    return idx_col_rec
+
+
+def legacy_get_rows_from_selected_rec(data_rec, indexes_any_rec, threshold=1):
+    """
+    historical rows detection : Counter incremented for each pixel row of each word, then sorted scan
+    """
+    horiz_count = Counter()
+    for indexes in indexes_any_rec:
+        for data_idx in indexes[1]:
+            rec_box = data_rec["box"][data_idx]
+            for h in range(rec_box.top, rec_box.bottom + 1):
+                horiz_count[h] += rec_box.get_horizontal_span()
+    h_lines_begin_end = []
+    sorted_h_pos = sorted([hz_pos for hz_pos in horiz_count if horiz_count[hz_pos] >= threshold])
+    begin = last = end = sorted_h_pos[0]
+    for h in sorted_h_pos[1:]:
+        if h == last + 1:
+            end = h
+        else:
+            h_lines_begin_end.append((begin, end))
+            begin = end = h
+        last = h
+    h_lines_begin_end.append((begin, end))
+    return h_lines_begin_end
+
+
+def legacy_add_rows(table, data_rec, horiz_lines):
+    """
+    historical table building : all boxes are scanned for each row, all columns are tested for each word
+    """
+    for (l_top, l_bottom) in horiz_lines:
+        idx_rec_list = [idx for idx, c_box in enumerate(data_rec["box"]) if c_box.top >= l_top and c_box.bottom <= l_bottom]
+        table.add_new_line_from_idx_rec(data_rec, idx_rec_list, True)
+
+
+def synthetic_page(page_idx, size=(3508, 2480), nb_columns=12, line_height=32, line_step=40):
+    """
+    landscape page at 300 dpi : headers row then dense lines of words under each column
+    :return: tuple (data dictionary with boxes, list of headers)
+    """
+    rng = numpy.random.default_rng(page_idx)
+    width, height = size
+    col_width = (width - 200) // nb_columns
+    entries = [(1, 1, 0, 0, 0, 0, 0, 0, width, height, -1, "")]
+    headers_list = []
+    for col in range(nb_columns):
+        left = 100 + col * col_width
+        entries.append((5, 1, 1, 1, 1, col + 1, left, 200, col_width // 2, line_height, 95, "H{}".format(col)))
+        headers_list.append({"name": "H{}".format(col), "cfg_index": col, "rec_index": len(entries) - 1,
+                             "conf": 95, "text": "H{}".format(col),
+                             "box": Box(BoxFormats.TUPLE_TBLR, (200, 200 + line_height - 1, left, left + col_width - 5))})
+    for line_idx, top in enumerate(range(260, height - 100, line_step)):
+        for col in range(nb_columns):
+            left = 100 + col * col_width
+            while left < 100 + (col + 1) * col_width - 60:
+                word_width = int(rng.integers(20, 50))
+                if left + word_width >= 100 + (col + 1) * col_width - 5:
+                    break
+                entries.append((5, 1, 2, 1, line_idx + 1, len(entries), left, top + int(rng.integers(0, 4)),
+                                word_width, line_height - 4, 90, "w"))
+                left += word_width + 12
+    data_rec = {key: list(values) for key, values in zip(DATA_REC_KEYS, zip(*entries))}
+    update_tesseract_rec_with_boxes(data_rec)
+    return data_rec, headers_list
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark of rows detection')
+    parser.add_argument('-n', '--nb-pages', type=int, default=5, help='number of synthetic pages')
+    parser.add_argument('-t', '--threshold', type=int, default=200, help='min pixels for a line')
+    args = parser.parse_args()
+
+    results = []
+    print("page;nb words;nb rows;legacy time (s);vectorized time (s);same rows;same table")
+    for page_idx in range(args.nb_pages):
+        page_rec, page_headers = synthetic_page(page_idx)
+        legacy_table = Table(page_headers, headers_of_columns=True)
+        table = Table(page_headers, headers_of_columns=True)
+
+        start = time.perf_counter()
+        legacy_indexes = legacy_search_rec_in_headed_columns(legacy_table, page_rec)
+        legacy_rows = legacy_get_rows_from_selected_rec(page_rec, legacy_indexes, threshold=args.threshold)
+        legacy_add_rows(legacy_table, page_rec, legacy_rows)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        spatial_index = SpatialIndex.from_data_rec(page_rec)
+        indexes = table.search_rec_in_headed_columns(page_rec, spatial_index)
+        rows = get_rows_from_selected_rec(page_rec, indexes, threshold=args.threshold)
+        table.add_rows_from_lines(page_rec, rows, spatial_index)
+        new_time = time.perf_counter() - start
+
+        results.append((legacy_time, new_time))
+        print("{};{};{};{:.3f};{:.3f};{};{}".format(page_idx + 1, len(page_rec["level"]), len(rows), legacy_time,
+                                                    new_time, rows == legacy_rows,
+                                                    table.get_csv_string() == legacy_table.get_csv_string()))
+
+    if results:
+        nb = len(results)
+        legacy_mean = sum(r[0] for r in results) / nb
+        new_mean = sum(r[1] for r in results) / nb
+        print("mean time by page legacy : {:.3f} s, vectorized : {:.3f} s (x{:.1f})".format(
+            legacy_mean, new_mean, legacy_mean / max(new_mean, 1e-9)))
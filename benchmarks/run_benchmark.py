@@ -0,0 +1,268 @@
+"""
+End to end benchmark of recognition : latency of each stage of page recognition as traced by reco_pdf (rendering,
+preprocessing, OCR, headers search and table analysis), pages per second, peak memory and accuracy of cells against
+a ground truth
+Documents are synthetic manifests generated from the configuration (benchmarks/synthetic_forms.py) or a pdf file
+with its ground truth file
+
+usage (from repository root) :
+> python3 -m benchmarks.run_benchmark -c ./configs/Hachette_config.json -n 10 --skew 0 0.8 -1.5 --noise 0.05
+> python3 -m benchmarks.run_benchmark -c ./configs/Hachette_config.json -f manifest.pdf -j 4 --json results.json
+> python3 -m benchmarks.run_benchmark -c ./configs/Hachette_config.json -n 10 --ocr-backend cli
+"""
+import json
+import os
+import resource
+import tempfile
+import time
+from collections import Counter
+
+from headers import DocumentLayout, use_document_layout
+from pages import get_nb_pages, render_page
+from reco_pdf import get_config_info, get_dpi, get_render_dpi, generate_pages_sources, recognize_document_page, \
+    process_document
+from sinks import MemorySink, get_table_records
+from instrumentation import Tracer, get_tracer, set_tracer, get_peak_rss_mb
+from ocr import CONFIGS_DIR, OCR_BACKEND_NAMES, create_ocr_backend, get_ocr_backend, set_ocr_backend
+from benchmarks.synthetic_forms import generate_manifest
+
+
+def normalize_text(text):
+    """
+    :param text: text of a cell
+    :return: text compared to ground truth : spaces are collapsed
+    """
+    return " ".join(text.split())
+
+
+def get_recognized_rows(tables):
+    """
+    :param tables: list of tuples (page number, Table object) of a page
+    :return: list of rows, dictionary header id -> text of not empty cells
+    """
+    rows = []
+    for (page_num, table) in tables:
+        by_row = {}
+        for record in get_table_records(table, page_num):
+            (_, _, row_idx, _, header, text, _, _, _, _, _) = record
+            by_row.setdefault(row_idx, {})[header] = normalize_text(text)
+        rows += [by_row[row_idx] for row_idx in sorted(by_row)]
+    return rows
+
+
+def align_rows(truth_rows, rec_rows):
+    """
+    rows of truth and recognized rows are aligned in order so that the number of equal cells is maximal,
+    missing or spurious rows do not shift the following ones
+    :param truth_rows: list of dictionaries header id -> text
+    :param rec_rows: list of dictionaries header id -> text
+    :return: number of equal cells of aligned rows
+    """
+    def nb_equal(truth_row, rec_row):
+        return sum(1 for hdr_id, text in truth_row.items() if rec_row.get(hdr_id) == text)
+
+    # best[i][j] : best number of equal cells with truth_rows[:i] and rec_rows[:j]
+    best = [[0] * (len(rec_rows) + 1) for _ in range(len(truth_rows) + 1)]
+    for i in range(1, len(truth_rows) + 1):
+        for j in range(1, len(rec_rows) + 1):
+            best[i][j] = max(best[i - 1][j], best[i][j - 1],
+                             best[i - 1][j - 1] + nb_equal(truth_rows[i - 1], rec_rows[j - 1]))
+    return best[-1][-1]
+
+
+def score_page(truth_page, tables):
+    """
+    accuracy of cells of a page
+    :param truth_page: page dictionary of ground truth (keys headers and rows)
+    :param tables: list of tuples (page number, Table object) found in page
+    :return: Counter with keys truth_cells, recognized_cells, correct_cells, truth_rows, recognized_rows
+    """
+    truth_rows = [{hdr_id: normalize_text(text) for hdr_id, text in zip(truth_page["headers"], row) if text.strip()}
+                  for row in truth_page["rows"]]
+    rec_rows = get_recognized_rows(tables)
+    return Counter({"truth_cells": sum(len(row) for row in truth_rows),
+                    "recognized_cells": sum(len(row) for row in rec_rows),
+                    "correct_cells": align_rows(truth_rows, rec_rows),
+                    "truth_rows": len(truth_rows), "recognized_rows": len(rec_rows)})
+
+
+def get_accuracy(counts):
+    """
+    :param counts: Counter of score_page results
+    :return: dictionary with keys precision, recall and f1 of cells
+    """
+    precision = counts["correct_cells"] / counts["recognized_cells"] if counts["recognized_cells"] else 0.
+    recall = counts["correct_cells"] / counts["truth_cells"] if counts["truth_cells"] else 0.
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def get_peak_rss():
+    """
+    :return: tuple (peak resident memory of this process, peak of largest child process : workers or tesseract)
+             in MB
+    """
+    return get_peak_rss_mb(), get_peak_rss_mb(resource.RUSAGE_CHILDREN)
+
+
+def get_pages_stages_times(records):
+    """
+    :param records: records of stages (see instrumentation.Tracer)
+    :return: dictionary stage -> list of times of each page (sum of records of stage for this page), in order of
+             first record of stages
+    """
+    times = {}
+    for record in records:
+        page_times = times.setdefault(record["stage"], {})
+        page_times[record["page"]] = page_times.get(record["page"], 0.) + record["wall"]
+    return {stage: list(page_times.values()) for stage, page_times in times.items()}
+
+
+def run_stages_benchmark(pdf_path, cfg_json, truth=None, verbose=0):
+    """
+    sequential recognition of all pages of a document as reco_pdf.process_document does (text layer, adaptive
+    resolution, without pdf, hocr and OCR cache), stages of pages are timed by a Tracer
+    :param pdf_path: path of pdf file
+    :param cfg_json: json of configuration for this type of document
+    :param truth: ground truth dictionary (see synthetic_forms.generate_manifest) or None
+    :param verbose: verbose mode
+    :return: dictionary with keys nb_pages, time, pages_per_second, stages (stage -> mean and max time by page)
+             and accuracy (if truth is given)
+    """
+    nb_pages = get_nb_pages(pdf_path)
+    layout = DocumentLayout() if use_document_layout(cfg_json) else None
+    counts = Counter()
+    # records are kept in memory only
+    tracer = Tracer()
+    tracer.document = os.path.basename(pdf_path)
+    previous_tracer = get_tracer()
+    set_tracer(tracer)
+    start = time.perf_counter()
+    try:
+        pages_sources = generate_pages_sources(pdf_path, nb_pages, cfg_json, dpi=get_dpi(cfg_json), extract_pdf=False,
+                                               extract_hocr=False, verbose=verbose)
+        for page_idx, page_source in enumerate(pages_sources):
+            img = render_page(pdf_path, page_idx, dpi=get_render_dpi(cfg_json), grayscale=True) \
+                if page_source is None else None
+            page_result = recognize_document_page(page_idx, img, page_source, pdf_path, cfg_json, extract_pdf=False,
+                                                  extract_hocr=False, layout=layout, verbose=verbose)
+            if truth is not None and page_idx < len(truth["pages"]):
+                page_counts = score_page(truth["pages"][page_idx], page_result["tables"])
+                counts.update(page_counts)
+                if verbose:
+                    print("page {} : {}".format(page_idx + 1, dict(page_counts)))
+    finally:
+        set_tracer(previous_tracer)
+    total_time = time.perf_counter() - start
+    result = {"nb_pages": nb_pages, "time": total_time, "pages_per_second": nb_pages / max(total_time, 1e-9),
+              "stages": {stage: {"mean": sum(times) / len(times), "max": max(times)}
+                         for stage, times in get_pages_stages_times(tracer.records).items()}}
+    if truth is not None:
+        result["accuracy"] = dict(get_accuracy(counts), **counts)
+    return result
+
+
+def run_document_benchmark(pdf_path, cfg_json, jobs=1, truth=None, verbose=0):
+    """
+    recognition of a document with reco_pdf.process_document (pages in parallel if jobs > 1)
+    :param pdf_path: path of pdf file
+    :param cfg_json: json of configuration for this type of document
+    :param jobs: number of worker processes
+    :param truth: ground truth dictionary or None
+    :param verbose: verbose mode
+    :return: dictionary with keys nb_pages, jobs, time, pages_per_second and accuracy (if truth is given)
+    """
+    sink = MemorySink()
+    start = time.perf_counter()
+    stats = process_document(pdf_path[:-4], cfg_json, jobs=jobs, extract_pdf=False, extract_hocr=False,
+                             ocr_cache=None, sink=sink, verbose=verbose)
+    total_time = time.perf_counter() - start
+    result = {"nb_pages": stats["nb_pages"], "jobs": jobs, "time": total_time,
+              "pages_per_second": stats["nb_pages"] / max(total_time, 1e-9)}
+    if truth is not None:
+        counts = Counter()
+        for page_truth in truth["pages"]:
+            counts.update(score_page(page_truth, [(page_num, table) for (page_num, table) in sink.tables
+                                                  if page_num == page_truth["page"]]))
+        result["accuracy"] = dict(get_accuracy(counts), **counts)
+    return result
+
+
+def print_result(name, result):
+    print("{} : {} pages in {:.2f} s, {:.2f} pages/s".format(name, result["nb_pages"], result["time"],
+                                                            result["pages_per_second"]))
+    for stage, stage_times in result.get("stages", {}).items():
+        print("  {:<14} mean {:.3f} s, max {:.3f} s".format(stage, stage_times["mean"], stage_times["max"]))
+    if "accuracy" in result:
+        acc = result["accuracy"]
+        print("  cells precision {:.3f}, recall {:.3f}, f1 {:.3f} ({} correct of {} in truth, {} recognized), "
+              "rows {} of {}".format(acc["precision"], acc["recall"], acc["f1"], acc["correct_cells"],
+                                     acc["truth_cells"], acc["recognized_cells"], acc["recognized_rows"],
+                                     acc["truth_rows"]))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='End to end benchmark of recognition')
+    parser.add_argument('-c', '--config', type=str, default=os.path.join(CONFIGS_DIR, "Hachette_config.json"),
+                        help='config filename (default Hachette config, target of synthetic manifests)')
+    parser.add_argument('-f', '--file', type=str, default='', help='pdf filename (synthetic manifest if not given)')
+    parser.add_argument('-t', '--truth', type=str, default='',
+                        help='ground truth filename (default <file>_truth.json if it exists)')
+    parser.add_argument('-n', '--nb-pages', type=int, default=5, help='number of synthetic pages')
+    parser.add_argument('--rows', type=int, nargs=2, default=[10, 30], help='minimal and maximal rows by page')
+    parser.add_argument('--dpi', type=int, default=300, help='resolution of synthetic pages')
+    parser.add_argument('--skew', type=float, nargs='+', default=[0.], help='skew angles of pages (degrees)')
+    parser.add_argument('--noise', type=float, default=0., help='gaussian noise (fraction of 255)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of random values')
+    parser.add_argument('--font', type=str, default='', help='truetype font file of synthetic pages')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='number of worker processes of document recognition (not run if 0)')
+    parser.add_argument('--no-stages', action='store_true', help='do not run timing of stages')
+    parser.add_argument('--json', type=str, default='', help='results are also written in this json file')
+    parser.add_argument('--ocr-backend', type=str, default='auto', choices=OCR_BACKEND_NAMES,
+                        help='cli : tesseract program run for each image, tesserocr : tesseract engine kept in process'
+                             ' (auto : tesserocr if it is installed)')
+    parser.add_argument('-v', '--verbose', type=int, default=0, help='verbose mode')
+    args = parser.parse_args()
+    config_json = get_config_info(args.config)
+    set_ocr_backend(create_ocr_backend(args.ocr_backend))
+    print("OCR backend : {}".format(get_ocr_backend().name))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.file:
+            pdf_file = args.file if args.file.endswith(".pdf") else args.file + ".pdf"
+            truth_file = args.truth or "{}_truth.json".format(pdf_file[:-4])
+            truth_json = None
+            if os.path.exists(truth_file):
+                with open(truth_file) as f:
+                    truth_json = json.load(f)
+        else:
+            with open(args.config) as f:
+                raw_config = json.load(f)
+            root = os.path.join(tmp_dir, "manifest")
+            truth_json = generate_manifest(root, raw_config, nb_pages=args.nb_pages, rows_range=args.rows,
+                                           dpi=args.dpi, skews=args.skew, noise=args.noise, seed=args.seed,
+                                           font_path=args.font or None)
+            pdf_file = root + ".pdf"
+
+        results = {"config": args.config, "file": args.file or "synthetic", "dpi": get_dpi(config_json),
+                   "ocr_backend": get_ocr_backend().name}
+        if not args.file:
+            results["synthetic"] = {"nb_pages": args.nb_pages, "rows": args.rows, "dpi": args.dpi,
+                                    "skew": args.skew, "noise": args.noise, "seed": args.seed}
+        if not args.no_stages:
+            results["stages"] = run_stages_benchmark(pdf_file, config_json, truth=truth_json, verbose=args.verbose)
+            print_result("stages", results["stages"])
+        if args.jobs > 0:
+            results["document"] = run_document_benchmark(pdf_file, config_json, jobs=args.jobs, truth=truth_json,
+                                                         verbose=args.verbose)
+            print_result("document ({} jobs)".format(args.jobs), results["document"])
+
+    peak_self, peak_children = get_peak_rss()
+    results["peak_rss_mb"] = {"main": peak_self, "children": peak_children}
+    print("peak RSS : main process {:.0f} MB, largest child process {:.0f} MB".format(peak_self, peak_children))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
@@ -0,0 +1,204 @@
+"""
+Generator of synthetic package manifests : pdf files of scanned like pages with a headers row then package rows,
+built from a configuration (columns of its headers with their lengths), and their ground truth (text of each cell)
+Skew angle, gaussian noise, scan resolution and number of rows by page are controlled
+
+usage (from repository root) :
+> python3 -m benchmarks.synthetic_forms -c ./configs/Hachette_config.json -o /tmp/manifest -n 10 --skew 0 0.8 -1.5
+it writes /tmp/manifest.pdf and /tmp/manifest_truth.json
+"""
+import json
+import string
+
+import numpy
+from PIL import Image, ImageDraw, ImageFont
+
+# reference resolution of pixel values of configuration files
+REFERENCE_DPI = 300
+
+# fonts tried in this order when no font file is given
+DEFAULT_FONTS = ["DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Arial.ttf", "FreeSans.ttf"]
+
+CITIES = ["PARIS", "LYON", "LILLE", "NANTES", "RENNES", "TOURS", "NIORT", "BREST", "DIJON", "METZ", "NANCY", "ARRAS",
+          "BRUXELLES", "LIEGE", "GENEVE", "NAMUR"]
+COUNTRIES = {"PARIS": "FRANCE", "LYON": "FRANCE", "LILLE": "FRANCE", "NANTES": "FRANCE", "RENNES": "FRANCE",
+             "TOURS": "FRANCE", "NIORT": "FRANCE", "BREST": "FRANCE", "DIJON": "FRANCE", "METZ": "FRANCE",
+             "NANCY": "FRANCE", "ARRAS": "FRANCE", "BRUXELLES": "BELGIQUE", "LIEGE": "BELGIQUE", "GENEVE": "SUISSE",
+             "NAMUR": "BELGIQUE"}
+CLIENT_WORDS = ["LIBRAIRIE", "PRESSE", "RELAIS", "MAISON", "LIVRES", "PAGE", "PLUME", "ENCRE", "SAINT", "CENTRE",
+                "DU", "DES", "ARTS", "GARE"]
+OBSERVATIONS = ["", "", "", "URGENT", "FRAGILE", "RETOUR", "A REPRENDRE", "SANS RDV"]
+
+
+def get_header_label(cfg_header):
+    """
+    :param cfg_header: header dictionary of configuration file
+    :return: text printed for this header : its search text, without final * of prefixes
+    """
+    return cfg_header["search_text"].rstrip("*")
+
+
+def get_cell_text(hdr_id, rng, row_info):
+    """
+    random value of a cell, values of a row are consistent (city and country)
+    :param hdr_id: id of header of column
+    :param rng: numpy random generator
+    :param row_info: dictionary of values already drawn for this row
+    :return: text of cell (empty string for an empty cell)
+    """
+    if hdr_id == "UM":
+        return str(int(rng.integers(1, 40)))
+    if hdr_id == "Palette":
+        return str(int(rng.integers(1, 9)))
+    if hdr_id == "Poids":
+        return "{},{}".format(int(rng.integers(1, 900)), int(rng.integers(0, 10)))
+    if hdr_id == "RUN":
+        return str(int(rng.integers(100, 999)))
+    if hdr_id == "LOREC":
+        return str(int(rng.integers(10000, 99999)))
+    if hdr_id == "Facture.":
+        return str(int(rng.integers(1000000, 9999999)))
+    if hdr_id == "L.I.T.":
+        return str(int(rng.integers(10000, 99999)))
+    if hdr_id == "D":
+        return string.ascii_uppercase[int(rng.integers(0, 26))]
+    if hdr_id == "CLIENT":
+        return " ".join(CLIENT_WORDS[int(i)] for i in rng.choice(len(CLIENT_WORDS), size=2, replace=False))
+    if hdr_id == "VILLE":
+        row_info["city"] = CITIES[int(rng.integers(0, len(CITIES)))]
+        return row_info["city"]
+    if hdr_id == "PAYS":
+        return COUNTRIES.get(row_info.get("city"), "FRANCE")
+    if hdr_id == "OBSERVATIONS":
+        return OBSERVATIONS[int(rng.integers(0, len(OBSERVATIONS)))]
+    return "".join(string.ascii_uppercase[int(i)] for i in rng.integers(0, 26, size=4))
+
+
+def get_font(size, font_path=None):
+    """
+    :param size: size of font in pixels
+    :param font_path: truetype font file (default fonts are tried if not given)
+    :return: PIL font
+    """
+    for path in ([font_path] if font_path else DEFAULT_FONTS):
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    print("No truetype font found, bitmap default font is used (too small for recognition), give one with --font")
+    return ImageFont.load_default()
+
+
+def generate_manifest_page(cfg_json, nb_rows, dpi=REFERENCE_DPI, skew=0., noise=0., seed=0, font_path=None):
+    """
+    one page of a package manifest : headers row at configured lengths then nb_rows rows of random values
+    :param cfg_json: json of configuration file as loaded (headers are dictionaries)
+    :param nb_rows: number of package rows
+    :param dpi: resolution of page image (A4 page)
+    :param skew: angle of page in degrees (counterclockwise)
+    :param noise: standard deviation of gaussian noise added to pixels, as a fraction of 255
+    :param seed: seed of random values
+    :param font_path: truetype font file
+    :return: tuple (grayscale PIL image, ground truth dictionary with keys headers (list of ids) and rows
+             (list of lists of cell texts in headers order))
+    """
+    rng = numpy.random.default_rng(seed)
+    ratio = dpi / REFERENCE_DPI
+    size = (int(round(3508 * ratio)), int(round(2480 * ratio)))
+    if cfg_json.get("orientation") == "portrait":
+        size = (size[1], size[0])
+    img = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(img)
+    font = get_font(int(round(34 * ratio)), font_path)
+
+    headers = cfg_json["headers"]
+    lengths = [int(round(hdr.get("length", 200) * ratio)) for hdr in headers]
+    ids = [hdr["id"] for hdr in headers]
+    margin = max(int(round(20 * ratio)), (size[0] - sum(lengths)) // 2)
+    lefts = [margin + sum(lengths[:idx]) for idx in range(len(lengths))]
+    line_step = int(round(62 * ratio))
+    top = int(round(300 * ratio))
+
+    for hdr, left in zip(headers, lefts):
+        draw.text((left + int(4 * ratio), top), get_header_label(hdr), fill=0, font=font)
+    draw.line((margin, top + line_step - int(12 * ratio), lefts[-1] + lengths[-1], top + line_step - int(12 * ratio)),
+              fill=0, width=max(1, int(3 * ratio)))
+
+    rows = []
+    max_rows = (size[1] - top - int(200 * ratio)) // line_step - 1
+    for row_idx in range(min(nb_rows, max_rows)):
+        row_top = top + (row_idx + 1) * line_step
+        row_info = {}
+        row = []
+        for hdr_id, left in zip(ids, lefts):
+            text = get_cell_text(hdr_id, rng, row_info)
+            if text:
+                draw.text((left + int(4 * ratio), row_top), text, fill=0, font=font)
+            row.append(text)
+        rows.append(row)
+
+    if skew:
+        img = img.rotate(skew, resample=Image.BILINEAR, expand=False, fillcolor=255)
+    if noise > 0:
+        pixels = numpy.asarray(img, dtype=numpy.float32)
+        pixels += rng.normal(0., noise * 255, size=pixels.shape).astype(numpy.float32)
+        img = Image.fromarray(numpy.clip(pixels, 0, 255).astype(numpy.uint8), "L")
+    return img, {"headers": ids, "rows": rows}
+
+
+def generate_manifest(root_file, cfg_json, nb_pages=5, rows_range=(10, 30), dpi=REFERENCE_DPI, skews=(0.,), noise=0.,
+                      seed=0, font_path=None, verbose=0):
+    """
+    pdf file of a synthetic manifest and its ground truth, pages are appended to the pdf one by one
+    :param root_file: filename without extension, <root_file>.pdf and <root_file>_truth.json are written
+    :param cfg_json: json of configuration file as loaded (headers are dictionaries)
+    :param nb_pages: number of pages
+    :param rows_range: tuple (minimal, maximal) number of rows by page
+    :param dpi: resolution of pages images
+    :param skews: skew angles of pages in degrees, used in turn
+    :param noise: standard deviation of gaussian noise, as a fraction of 255
+    :param seed: seed of random values
+    :param font_path: truetype font file
+    :param verbose: verbose mode
+    :return: ground truth dictionary (keys pdf, dpi, noise and pages, list of page dictionaries with keys page, skew,
+             headers and rows)
+    """
+    pdf_path = "{}.pdf".format(root_file)
+    rng = numpy.random.default_rng(seed)
+    truth = {"pdf": pdf_path, "dpi": dpi, "noise": noise, "pages": []}
+    for page_idx in range(nb_pages):
+        skew = skews[page_idx % len(skews)] if skews else 0.
+        nb_rows = int(rng.integers(rows_range[0], rows_range[1] + 1))
+        img, page_truth = generate_manifest_page(cfg_json, nb_rows, dpi=dpi, skew=skew, noise=noise,
+                                                 seed=seed * 1000 + page_idx, font_path=font_path)
+        img.save(pdf_path, "PDF", resolution=float(dpi), append=page_idx > 0)
+        page_truth.update({"page": page_idx + 1, "skew": skew})
+        truth["pages"].append(page_truth)
+        if verbose:
+            print("page {} : {} rows, skew {}".format(page_idx + 1, len(page_truth["rows"]), skew))
+    with open("{}_truth.json".format(root_file), "w") as f:
+        json.dump(truth, f, indent=1)
+    return truth
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generation of synthetic package manifests')
+    parser.add_argument('-c', '--config', type=str, help='config filename')
+    parser.add_argument('-o', '--output', type=str, help='output filename without extension')
+    parser.add_argument('-n', '--nb-pages', type=int, default=5, help='number of pages')
+    parser.add_argument('--rows', type=int, nargs=2, default=[10, 30], help='minimal and maximal rows by page')
+    parser.add_argument('--dpi', type=int, default=REFERENCE_DPI, help='resolution of pages')
+    parser.add_argument('--skew', type=float, nargs='+', default=[0.], help='skew angles of pages (degrees)')
+    parser.add_argument('--noise', type=float, default=0., help='gaussian noise (fraction of 255)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of random values')
+    parser.add_argument('--font', type=str, default='', help='truetype font file')
+    parser.add_argument('-v', '--verbose', type=int, default=0, help='verbose mode')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config_json = json.load(f)
+    generate_manifest(args.output, config_json, nb_pages=args.nb_pages, rows_range=args.rows,
+                      dpi=args.dpi, skews=args.skew, noise=args.noise, seed=args.seed, font_path=args.font or None,
+                      verbose=args.verbose)
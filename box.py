@@ -3,7 +3,11 @@
 Contains all usefull code about boxes :
 tesseract and pdf formats
 class Box
+class BoxArray
+class SpatialIndex
 """
+import numpy
+
 
 class BoxFormats:
     """
@@ -28,18 +32,12 @@ class Box:
 
     Methods
     """
+    # no instance dictionary : pages have thousands of boxes
+    __slots__ = ("top", "bottom", "left", "right")
+
     def __init__(self, input_format, box_tuple=None, box_class=None):
-        if input_format == BoxFormats.EMPTY:
-            self.top = self.bottom = self.left = self.right = -1
-        elif input_format == BoxFormats.TUPLE_TBLR:
-            if box_tuple:
-                self.top = box_tuple[0]
-                self.bottom = box_tuple[1]
-                self.left = box_tuple[2]
-                self.right = box_tuple[3]
-            else:
-                raise Exception("With input_format = BoxFormats.TUPLE_TBLR a 4 values tuple should be given in box_tuple parameter")
-        elif input_format == BoxFormats.TUPLE_LTWH:
+        # most frequent formats first
+        if input_format == BoxFormats.TUPLE_LTWH:
             if box_tuple:
                 self.top = box_tuple[1]
                 self.bottom = box_tuple[1] + box_tuple[3] - 1
@@ -55,9 +53,35 @@ class Box:
                 self.right = box_class.right
             else:
                 raise Exception("With input_format = BoxFormats.BOX_CLASS a Box object should be given in box_class parameter")
+        elif input_format == BoxFormats.TUPLE_TBLR:
+            if box_tuple:
+                self.top, self.bottom, self.left, self.right = box_tuple
+            else:
+                raise Exception("With input_format = BoxFormats.TUPLE_TBLR a 4 values tuple should be given in box_tuple parameter")
+        elif input_format == BoxFormats.EMPTY:
+            self.top = self.bottom = self.left = self.right = -1
         else:
             raise Exception("Box format {} NOT YET IMPLEMENTED".format(input_format))
 
+    @classmethod
+    def from_tblr(cls, top, bottom, left, right):
+        """
+        create a box without format dispatch
+        :return: Box object
+        """
+        new_box = cls.__new__(cls)
+        new_box.top = top
+        new_box.bottom = bottom
+        new_box.left = left
+        new_box.right = right
+        return new_box
+
+    def copy(self):
+        """
+        :return: new Box object with same positions
+        """
+        return Box.from_tblr(self.top, self.bottom, self.left, self.right)
+
     def __str__(self):
         return "({}, {}, {}, {})".format(self.top, self.bottom, self.left, self.right)
 
@@ -150,15 +174,35 @@ def update_tesseract_rec_with_boxes(data_rec):
     :param data_rec: tesseract structure
     :return:
     """
-    data_rec["box"] = []
-    nb_obj = len(data_rec["left"])
-    for idx in range(nb_obj):
-        data_rec["box"].append(Box(BoxFormats.TUPLE_LTWH,
-                                   (data_rec["left"][idx], data_rec["top"][idx], data_rec["width"][idx], data_rec["height"][idx])))
+    from rec_frame import RecognitionFrame
+    if isinstance(data_rec, RecognitionFrame):
+        # boxes of a frame are created from its columns when they are read
+        data_rec["box"] = None
+        return
+
+    # positions may have changed, line index is built again when needed
+    data_rec.pop("line_index", None)
+    data_rec["box"] = [Box.from_tblr(top, top + height - 1, left, left + width - 1) for (left, top, width, height) in
+                       zip(data_rec["left"], data_rec["top"], data_rec["width"], data_rec["height"])]
 
     return
 
 
+def get_box_array(data_rec, indexes=None):
+    """
+    :param data_rec: tesseract structure with boxes (see update_tesseract_rec_with_boxes)
+    :param indexes: list of indexes of objects (all objects if None)
+    :return: BoxArray of objects of data_rec
+    """
+    from rec_frame import RecognitionFrame
+    if isinstance(data_rec, RecognitionFrame):
+        boxes = data_rec.box_array()
+        return boxes if indexes is None else boxes[numpy.asarray(indexes, dtype=numpy.int64)]
+    if indexes is None:
+        return BoxArray.from_boxes(data_rec["box"])
+    return BoxArray.from_boxes([data_rec["box"][idx] for idx in indexes])
+
+
 def horizontal_overlapping(box1: Box, box2: Box):
     """
     Compute horizontal overlapping between box1 and box2
@@ -185,3 +229,245 @@ def vertical_overlapping(box1: Box, box2: Box):
         return (0, 0, 0)
     else:
         return (overlap, overlap / box1.get_vertical_span(), overlap / box2.get_vertical_span())
+
+
+class BoxArray:
+    """N boxes in one integer array, for geometry of many boxes at once
+    ...
+    Attributes
+    tblr : numpy array of shape (N, 4) : top, bottom, left, right of each box (-1 values for empty boxes)
+
+    Methods
+    """
+    def __init__(self, tblr=None):
+        """
+        Constructor
+        :param tblr: array like of shape (N, 4) of (top, bottom, left, right) values
+        """
+        self.tblr = numpy.zeros((0, 4), dtype=numpy.int64) if tblr is None else \
+            numpy.asarray(tblr, dtype=numpy.int64).reshape(-1, 4)
+
+    @classmethod
+    def from_boxes(cls, boxes):
+        """
+        :param boxes: iterable of Box objects
+        :return: BoxArray object
+        """
+        return cls([(b.top, b.bottom, b.left, b.right) for b in boxes])
+
+    @classmethod
+    def from_ltwh(cls, left, top, width, height):
+        """
+        :param left, top, width, height: array like of same length (tesseract format)
+        :return: BoxArray object
+        """
+        left = numpy.asarray(left, dtype=numpy.int64)
+        top = numpy.asarray(top, dtype=numpy.int64)
+        return cls(numpy.stack([top, top + numpy.asarray(height) - 1, left, left + numpy.asarray(width) - 1], axis=1))
+
+    def __len__(self):
+        return len(self.tblr)
+
+    def __getitem__(self, index):
+        """
+        :param index: integer (Box object is returned) or slice, index array, boolean mask (BoxArray is returned)
+        """
+        if isinstance(index, (int, numpy.integer)):
+            return Box.from_tblr(*self.tblr[index].tolist())
+        return BoxArray(self.tblr[index])
+
+    def to_boxes(self):
+        """
+        :return: list of Box objects
+        """
+        return [Box.from_tblr(*tblr) for tblr in self.tblr.tolist()]
+
+    @property
+    def tops(self):
+        return self.tblr[:, 0]
+
+    @property
+    def bottoms(self):
+        return self.tblr[:, 1]
+
+    @property
+    def lefts(self):
+        return self.tblr[:, 2]
+
+    @property
+    def rights(self):
+        return self.tblr[:, 3]
+
+    def is_empty(self):
+        """
+        :return: boolean array, True for empty boxes
+        """
+        return numpy.all(self.tblr == -1, axis=1)
+
+    def get_horizontal_spans(self):
+        """
+        :return: array of number of horizontal pixels of boxes (right - left + 1)
+        """
+        return self.rights - self.lefts + 1
+
+    def get_vertical_spans(self):
+        """
+        :return: array of number of vertical pixels of boxes (bottom - top + 1)
+        """
+        return self.bottoms - self.tops + 1
+
+    def union(self):
+        """
+        :return: Box union of all not empty boxes (empty box if there is none)
+        """
+        tblr = self.tblr[~self.is_empty()]
+        if len(tblr) == 0:
+            return Box(BoxFormats.EMPTY)
+        return Box.from_tblr(int(tblr[:, 0].min()), int(tblr[:, 1].max()), int(tblr[:, 2].min()), int(tblr[:, 3].max()))
+
+    def in_vertical_range(self, top, bottom):
+        """
+        :return: boolean array, True for boxes entirely between rows top and bottom
+        """
+        return (self.tops >= top) & (self.bottoms <= bottom)
+
+    def in_horizontal_range(self, left, right):
+        """
+        :return: boolean array, True for boxes entirely between columns left and right
+        """
+        return (self.lefts >= left) & (self.rights <= right)
+
+    def contained_in(self, box):
+        """
+        :param box: Box object
+        :return: boolean array, True for boxes entirely inside box
+        """
+        return self.in_vertical_range(box.top, box.bottom) & self.in_horizontal_range(box.left, box.right)
+
+    @staticmethod
+    def _overlapping(begin1, end1, begin2, end2):
+        overlap = numpy.minimum(end1, end2) - numpy.maximum(begin1, begin2) + 1
+        overlap = numpy.maximum(overlap, 0)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            ratio1 = numpy.where(overlap > 0, overlap / (end1 - begin1 + 1), 0.)
+            ratio2 = numpy.where(overlap > 0, overlap / (end2 - begin2 + 1), 0.)
+        return overlap, ratio1, ratio2
+
+    def horizontal_overlapping(self, box):
+        """
+        one to many horizontal_overlapping
+        :param box: Box object
+        :return: tuple of arrays (nb pixels in common, ratio of boxes of array, ratio of box)
+        """
+        return self._overlapping(self.lefts, self.rights, box.left, box.right)
+
+    def vertical_overlapping(self, box):
+        """
+        one to many vertical_overlapping
+        :param box: Box object
+        :return: tuple of arrays (nb pixels in common, ratio of boxes of array, ratio of box)
+        """
+        return self._overlapping(self.tops, self.bottoms, box.top, box.bottom)
+
+    def pairwise_horizontal_overlapping(self, other):
+        """
+        :param other: BoxArray object of M boxes
+        :return: tuple of arrays of shape (N, M) (nb pixels in common, ratio of boxes of self, ratio of boxes of other)
+        """
+        return self._overlapping(self.lefts[:, None], self.rights[:, None], other.lefts[None, :],
+                                 other.rights[None, :])
+
+    def pairwise_vertical_overlapping(self, other):
+        """
+        :param other: BoxArray object of M boxes
+        :return: tuple of arrays of shape (N, M) (nb pixels in common, ratio of boxes of self, ratio of boxes of other)
+        """
+        return self._overlapping(self.tops[:, None], self.bottoms[:, None], other.tops[None, :],
+                                 other.bottoms[None, :])
+
+
+class SpatialIndex:
+    """Boxes of a page sorted by top and by left (sweep lines), built once by page to find boxes in bands and
+    intervals with binary searches
+    ...
+    Attributes
+    boxes : BoxArray of indexed boxes
+    by_top : indexes of boxes sorted by top
+    sorted_tops : tops of boxes in by_top order
+    by_left : indexes of boxes sorted by left
+    sorted_lefts : lefts of boxes in by_left order
+
+    Methods
+    in_vertical_range : boxes entirely inside a band of rows
+    in_horizontal_range : boxes entirely inside a band of columns
+    get_bands : band containing each box among sorted disjoint bands
+    get_intervals : interval containing each box among intervals
+    """
+    def __init__(self, boxes):
+        """
+        Constructor
+        :param boxes: BoxArray object
+        """
+        self.boxes = boxes
+        self.by_top = numpy.argsort(boxes.tops, kind="stable")
+        self.sorted_tops = boxes.tops[self.by_top]
+        self.by_left = numpy.argsort(boxes.lefts, kind="stable")
+        self.sorted_lefts = boxes.lefts[self.by_left]
+
+    @classmethod
+    def from_data_rec(cls, data_rec):
+        """
+        :param data_rec: tesseract structure with boxes
+        :return: SpatialIndex of all objects of data_rec
+        """
+        return cls(get_box_array(data_rec))
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def in_vertical_range(self, top, bottom):
+        """
+        :return: sorted numpy array of indexes of boxes entirely between rows top and bottom
+        """
+        start = numpy.searchsorted(self.sorted_tops, top, side="left")
+        end = numpy.searchsorted(self.sorted_tops, bottom, side="right")
+        candidates = self.by_top[start:end]
+        return numpy.sort(candidates[self.boxes.bottoms[candidates] <= bottom])
+
+    def in_horizontal_range(self, left, right):
+        """
+        :return: sorted numpy array of indexes of boxes entirely between columns left and right
+        """
+        start = numpy.searchsorted(self.sorted_lefts, left, side="left")
+        end = numpy.searchsorted(self.sorted_lefts, right, side="right")
+        candidates = self.by_left[start:end]
+        return numpy.sort(candidates[self.boxes.rights[candidates] <= right])
+
+    def get_bands(self, bands):
+        """
+        :param bands: list of tuples (top, bottom) of disjoint bands sorted by top
+        :return: numpy array of index of band entirely containing each box, -1 if there is none
+        """
+        if not bands:
+            return numpy.full(len(self.boxes), -1, dtype=numpy.int64)
+        band_tops = numpy.array([band[0] for band in bands], dtype=numpy.int64)
+        band_bottoms = numpy.array([band[1] for band in bands], dtype=numpy.int64)
+        band_idx = numpy.searchsorted(band_tops, self.boxes.tops, side="right") - 1
+        inside = (band_idx >= 0) & (self.boxes.bottoms <= band_bottoms[numpy.maximum(band_idx, 0)])
+        return numpy.where(inside, band_idx, -1)
+
+    def get_intervals(self, intervals):
+        """
+        :param intervals: list of tuples (left, right), they may overlap
+        :return: numpy array of index of interval entirely containing each box, -1 if there is none,
+                 -2 if there are several ones
+        """
+        if not intervals:
+            return numpy.full(len(self.boxes), -1, dtype=numpy.int64)
+        lefts = numpy.array([interval[0] for interval in intervals], dtype=numpy.int64)
+        rights = numpy.array([interval[1] for interval in intervals], dtype=numpy.int64)
+        # number of intervals is small (columns of a table) : one vectorized test by interval
+        inside = (self.boxes.lefts[:, None] >= lefts[None, :]) & (self.boxes.rights[:, None] <= rights[None, :])
+        nb_inside = inside.sum(axis=1)
+        return numpy.where(nb_inside == 1, numpy.argmax(inside, axis=1), numpy.where(nb_inside == 0, -1, -2))
+
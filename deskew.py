@@ -0,0 +1,75 @@
+"""
+Estimation of page skew from pixels only (no OCR needed)
+Angle is found by projection profiles : when dark pixels are projected along the right angle,
+text lines give sharp peaks in the rows histogram
+"""
+import numpy
+
+
+def get_dark_threshold(gray_array):
+    """
+    Otsu threshold of a grayscale array
+    :param gray_array: numpy array of uint8 gray values
+    :return: threshold, pixels strictly below it are dark
+    """
+    hist = numpy.bincount(gray_array.ravel(), minlength=256).astype(numpy.float64)
+    total = hist.sum()
+    cum_weight = numpy.cumsum(hist)
+    cum_mean = numpy.cumsum(hist * numpy.arange(256))
+    global_mean = cum_mean[-1] / total
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        between_var = (global_mean * cum_weight - cum_mean) ** 2 / (cum_weight * (total - cum_weight))
+    between_var = numpy.nan_to_num(between_var)
+    return int(numpy.argmax(between_var)) + 1
+
+
+def get_projection_score(ys, xs, angle):
+    """
+    score of a projection of dark pixels along an angle (sum of squares of rows histogram)
+    :param ys: vertical positions of dark pixels
+    :param xs: horizontal positions of dark pixels (centered)
+    :param angle: angle in degrees
+    :return: score, greater when text lines are aligned with angle
+    """
+    rows = numpy.rint(ys - xs * numpy.tan(numpy.radians(angle))).astype(numpy.int64)
+    hist = numpy.bincount(rows - rows.min())
+    return float(numpy.dot(hist, hist))
+
+
+def estimate_skew_angle(img, max_angle=5.0, max_size=1200, coarse_step=0.25, fine_step=0.025, max_points=300000,
+                        verbose=0):
+    """
+    estimate skew angle of a page from its pixels, on a downscaled grayscale copy
+    :param img: PIL image of page (in its final orientation)
+    :param max_angle: greatest absolute angle searched (degrees)
+    :param max_size: greatest dimension of downscaled copy (pixels)
+    :param coarse_step: step of first search (degrees)
+    :param fine_step: step of search around best coarse angle (degrees)
+    :param max_points: greatest number of dark pixels used (sampled if more)
+    :param verbose: verbose mode
+    :return: angle in degrees, positive when lines go down to the right,
+             as headers.get_angle_from_headers_line (0.0 if no dark pixels)
+    """
+    gray = img.convert("L")
+    factor = max(1, int(numpy.ceil(max(gray.size) / max_size)))
+    if factor > 1:
+        gray = gray.reduce(factor)
+    gray_array = numpy.asarray(gray)
+    ys, xs = numpy.nonzero(gray_array < get_dark_threshold(gray_array))
+    if len(ys) == 0:
+        return 0.0
+    if len(ys) > max_points:
+        kept = numpy.random.default_rng(0).choice(len(ys), max_points, replace=False)
+        ys, xs = ys[kept], xs[kept]
+    ys = ys.astype(numpy.float64)
+    xs = xs.astype(numpy.float64) - gray_array.shape[1] / 2
+
+    coarse_angles = numpy.arange(-max_angle, max_angle + coarse_step / 2, coarse_step)
+    coarse_scores = [get_projection_score(ys, xs, a) for a in coarse_angles]
+    best_angle = coarse_angles[int(numpy.argmax(coarse_scores))]
+    fine_angles = numpy.arange(best_angle - coarse_step, best_angle + coarse_step + fine_step / 2, fine_step)
+    fine_scores = [get_projection_score(ys, xs, a) for a in fine_angles]
+    angle = float(fine_angles[int(numpy.argmax(fine_scores))])
+    if verbose:
+        print("skew angle estimated from pixels : {:.3f} (downscale factor {})".format(angle, factor))
+    return angle
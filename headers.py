@@ -1,10 +1,11 @@
 
 from collections import Counter
+import re
 import numpy
 
 # local imports
-from utils import get_line_tuple_from_index, get_min_max_line_idx, is_same_line, get_best_count, is_simple_reg_ex_ok,\
-    count_objects_by_rows
+from utils import get_line_tuple_from_index, get_min_max_line_idx, is_same_line, get_best_count, \
+    count_objects_by_rows, get_bigrams, get_bounded_edit_distance
 from box import BoxFormats, Box
 
 
@@ -16,12 +17,197 @@ class ConfigHeader:
         self.id = cfg_dict["id"]
         self.search_text = cfg_dict["search_text"].lower()
         self.length = int(cfg_dict["length"])
+        # tesseract options used for the column of this header with ROI recognition (ex: digits whitelist)
+        self.tesseract_config = cfg_dict.get("tesseract_config", "")
+        # regular expression matching whole words (case insensitive), replaces search_text when given
+        self.search_regex = cfg_dict.get("search_regex")
+        # number of OCR errors (edit distance) tolerated in search_text
+        self.max_errors = int(cfg_dict.get("max_errors", 0))
 
-def find_headers_in_line(hdr_list, data_rec, brut_headers_indexes, headers_line, verbose=0):
+
+class HeaderMatcher:
+    """
+    search texts of all headers of a configuration compiled once, to find header candidates in one pass over words
+    ...
+    Attributes
+    nb_headers : number of configured headers
+    trie : prefix tree of search texts, node = dictionary char -> child node, with key None for headers ending
+           at node : {"full": [cfg indexes of search texts], "star": [cfg indexes of search texts ending with *]}
+    regex_list : list of tuples (cfg index, compiled regular expression) of headers with a search_regex
+    any_regex : one regular expression with a named group by header of regex_list (None if there is none)
+    fuzzy_list : list of tuples (cfg index, text, prefix, max errors, bigrams) of headers with max_errors
+    bigram_index : dictionary bigram -> list of tuples (position in fuzzy_list, count in text)
+
+    Methods
+    match : headers matching a word (see utils.is_simple_reg_ex_ok)
+    fuzzy_match : headers matching a word with OCR errors
+    prefix_match : headers whose search text begins a word
+    match_words : words matching each header, with match scores
+    """
+    def __init__(self, hdr_list):
+        """
+        Constructor
+        :param hdr_list: list of ConfigHeader objects
+        """
+        self.nb_headers = len(hdr_list)
+        self.trie = {}
+        self.regex_list = []
+        self.fuzzy_list = []
+        self.bigram_index = {}
+        for cfg_idx, hdr in enumerate(hdr_list):
+            if hdr.search_regex:
+                self.regex_list.append((cfg_idx, re.compile(hdr.search_regex, re.IGNORECASE)))
+                continue
+            self._add(hdr.search_text, cfg_idx, "full")
+            is_prefix = hdr.search_text.endswith('*')
+            if is_prefix:
+                self._add(hdr.search_text[:-1], cfg_idx, "star")
+            text = hdr.search_text[:-1] if is_prefix else hdr.search_text
+            # at least one character of text must be right
+            max_errors = min(hdr.max_errors, len(text) - 1)
+            if max_errors > 0:
+                bigrams = get_bigrams(text)
+                for bigram, count in bigrams.items():
+                    self.bigram_index.setdefault(bigram, []).append((len(self.fuzzy_list), count))
+                self.fuzzy_list.append((cfg_idx, text, is_prefix, max_errors, sum(bigrams.values())))
+        self.any_regex = None
+        if self.regex_list:
+            self.any_regex = re.compile("|".join("(?P<h{}>{})".format(cfg_idx, regex.pattern)
+                                                 for cfg_idx, regex in self.regex_list), re.IGNORECASE)
+
+    def _add(self, text, cfg_idx, kind):
+        node = self.trie
+        for char in text:
+            node = node.setdefault(char, {})
+        node.setdefault(None, {"full": [], "star": []})[kind].append(cfg_idx)
+
+    def _walk(self, word):
+        """
+        :param word: lower case text
+        :return: generator of tuples (end nodes of headers met along word, True if word is fully read)
+        """
+        node = self.trie
+        if None in node:
+            yield node[None], not word
+        for pos, char in enumerate(word):
+            node = node.get(char)
+            if node is None:
+                return
+            if None in node:
+                yield node[None], pos == len(word) - 1
+
+    def _match_regex(self, word, fullmatch):
+        if self.any_regex is None or (fullmatch and not self.any_regex.fullmatch(word)):
+            return []
+        if fullmatch:
+            return [cfg_idx for cfg_idx, regex in self.regex_list if regex.fullmatch(word)]
+        return [cfg_idx for cfg_idx, regex in self.regex_list if regex.match(word)]
+
+    def match(self, word):
+        """
+        :param word: lower case text
+        :return: sorted list of cfg indexes of headers matching word : equal to search text, beginning with search
+                 text when it ends with *, fully matching search_regex
+        """
+        cfg_indexes = []
+        for ends, complete in self._walk(word):
+            cfg_indexes += ends["star"]
+            if complete:
+                cfg_indexes += ends["full"]
+        return sorted(set(cfg_indexes + self._match_regex(word, True)))
+
+    def fuzzy_match(self, word):
+        """
+        candidates are filtered by length, then by number of common bigrams (each error changes at most 2 bigrams),
+        edit distance is only computed for remaining ones
+        :param word: lower case text
+        :return: list of tuples (cfg index, match score) of headers matching word with at most max_errors errors,
+                 score is 1 - distance / length of search text
+        """
+        if not self.fuzzy_list:
+            return []
+        common = [0] * len(self.fuzzy_list)
+        for bigram, count in get_bigrams(word).items():
+            for fuzzy_idx, txt_count in self.bigram_index.get(bigram, []):
+                common[fuzzy_idx] += min(count, txt_count)
+        matches = []
+        for fuzzy_idx, (cfg_idx, text, is_prefix, max_errors, nb_bigrams) in enumerate(self.fuzzy_list):
+            if len(text) - len(word) > max_errors or (not is_prefix and len(word) - len(text) > max_errors):
+                continue
+            if common[fuzzy_idx] < nb_bigrams - 2 * max_errors:
+                continue
+            distance = get_bounded_edit_distance(text, word, max_errors, prefix=is_prefix)
+            if distance is not None:
+                matches.append((cfg_idx, 1 - distance / len(text)))
+        return matches
+
+    def get_score(self, word, cfg_idx):
+        """
+        :param word: lower case text
+        :param cfg_idx: index of header in configuration
+        :return: match score of word for header (1.0 for exact or prefix match, see fuzzy_match), None if word does
+                 not match header
+        """
+        if cfg_idx in self.match(word) or cfg_idx in self.prefix_match(word):
+            return 1.0
+        for fuzzy_idx, score in self.fuzzy_match(word):
+            if fuzzy_idx == cfg_idx:
+                return score
+        return None
+
+    def prefix_match(self, word):
+        """
+        :param word: lower case text
+        :return: sorted list of cfg indexes of headers whose search text (or search_regex) begins word
+        """
+        cfg_indexes = []
+        for ends, _ in self._walk(word):
+            cfg_indexes += ends["full"]
+        return sorted(cfg_indexes + self._match_regex(word, False))
+
+    def match_words(self, texts):
+        """
+        :param texts: list of recognized texts
+        :return: list by header of dictionary index of matching text -> match score (1.0 for exact matches),
+                 exact matches come first
+        """
+        words_by_header = [{} for _ in range(self.nb_headers)]
+        fuzzy_words = []
+        for rec_ind, rec_txt in enumerate(texts):
+            rec_txt = str(rec_txt).lower()
+            for cfg_idx in self.match(rec_txt):
+                words_by_header[cfg_idx][rec_ind] = 1.0
+            if self.fuzzy_list and rec_txt:
+                fuzzy_words += [(cfg_idx, rec_ind, score) for cfg_idx, score in self.fuzzy_match(rec_txt)]
+        for cfg_idx, rec_ind, score in fuzzy_words:
+            words_by_header[cfg_idx].setdefault(rec_ind, score)
+        return words_by_header
+
+
+def get_header_matcher(cfg_json):
+    """
+    get matcher of headers of configuration, it is created at first call and kept in cfg_json
+    (see reco_pdf.get_config_info)
+    :param cfg_json: json of configuration for this type of document
+    :return: HeaderMatcher object
+    """
+    matcher = cfg_json.get("header_matcher")
+    if matcher is None or matcher.nb_headers != len(cfg_json["headers"]):
+        matcher = HeaderMatcher(cfg_json["headers"])
+        cfg_json["header_matcher"] = matcher
+    return matcher
+
+
+def find_headers_in_line(hdr_list, data_rec, brut_headers_indexes, headers_line, matcher=None, verbose=0):
     headers_info = []
     list_is_complete = True
 
     min_line_idx, max_line_idx = get_min_max_line_idx(data_rec, headers_line)
+    if matcher is None:
+        matcher = HeaderMatcher(hdr_list)
+    # headers beginning each word of line
+    line_matches = {data_idx: matcher.prefix_match(data_rec["text"][data_idx].lower())
+                    for data_idx in range(min_line_idx, max_line_idx + 1)} if min_line_idx != -1 else {}
 
     # first search for headers already found
     for hdr, indexes in zip(hdr_list, brut_headers_indexes):
@@ -36,13 +222,14 @@ def find_headers_in_line(hdr_list, data_rec, brut_headers_indexes, headers_line,
 
         if not found_data_idx:
             for data_idx in range(min_line_idx, max_line_idx+1):
-                if data_rec["text"][data_idx].lower().startswith(hdr.search_text):
+                if indexes[0] in line_matches[data_idx]:
                     found_data_idx = True
                     break
 
         if found_data_idx:
             cur_info.update({"rec_index": data_idx, "box": data_rec["box"][data_idx],
-                                "conf": data_rec["conf"][data_idx], "text": data_rec["text"][data_idx]})
+                                "conf": data_rec["conf"][data_idx], "text": data_rec["text"][data_idx],
+                                "match_score": indexes[2].get(data_idx, 1.0)})
             if data_idx == min_line_idx: # optimize next search
                 min_line_idx += 1
         else:
@@ -115,7 +302,8 @@ def find_headers_by_position(hdr_list, data_rec, brut_headers_indexes, verbose=0
                     break
             if found_data_idx:
                 cur_info.update({"rec_index": data_idx, "box": data_rec["box"][data_idx],
-                                 "conf": data_rec["conf"][data_idx], "text": data_rec["text"][data_idx]})
+                                 "conf": data_rec["conf"][data_idx], "text": data_rec["text"][data_idx],
+                                 "match_score": indexes[2][data_idx]})
 
         headers_info.append(cur_info)
     return headers_info
@@ -184,20 +372,19 @@ def search_headers(data_rec, cfg_json, resize_hdr=False, verbose=0):
     :return: return headers of package table in same format as data_rec
     """
     min_diff_found_in_lines = 5
-    hdr_txt_list = [x.search_text for x in cfg_json["headers"]]
-    lower_rec_txt = [str(x).lower() for x in data_rec["text"]]
+    matcher = get_header_matcher(cfg_json)
     brut_headers_indexes = []
     line_cnt = Counter()
-    for cfg_ind, txt in enumerate(hdr_txt_list):
-        rec_ind_list = []
-        for rec_ind, rec_txt in enumerate(lower_rec_txt):
-            if is_simple_reg_ex_ok(txt, rec_txt):
-                rec_ind_list.append(rec_ind)
-                line_cnt[get_line_tuple_from_index(data_rec, rec_ind)] += 1
-
-        brut_headers_indexes.append((cfg_ind, rec_ind_list))
+    for cfg_ind, rec_scores in enumerate(matcher.match_words(data_rec["text"])):
+        rec_ind_list = list(rec_scores)
+        for rec_ind in rec_ind_list:
+            line_cnt[get_line_tuple_from_index(data_rec, rec_ind)] += 1
+
+        # tuple (cfg index, indexes of matching words, match score of each word)
+        brut_headers_indexes.append((cfg_ind, rec_ind_list, rec_scores))
         if verbose:
-            print("header {} of index {} recognised in {} positions".format(txt, cfg_ind, rec_ind_list))
+            print("header {} of index {} recognised in {} positions".format(cfg_json["headers"][cfg_ind].search_text,
+                                                                            cfg_ind, rec_ind_list))
 
     if verbose:
         print("headers txt found on lines {}".format(line_cnt))
@@ -205,7 +392,7 @@ def search_headers(data_rec, cfg_json, resize_hdr=False, verbose=0):
     if line_cnt:
         headers_line = get_best_count(line_cnt, min_diff_found_in_lines)
         if headers_line:
-            headers_list, list_is_complete = find_headers_in_line(cfg_json["headers"], data_rec, brut_headers_indexes, headers_line, verbose=verbose)
+            headers_list, list_is_complete = find_headers_in_line(cfg_json["headers"], data_rec, brut_headers_indexes, headers_line, matcher=matcher, verbose=verbose)
         else:
             headers_list = find_headers_by_position(cfg_json["headers"], data_rec, brut_headers_indexes, verbose=verbose)
     else:
@@ -217,11 +404,191 @@ def search_headers(data_rec, cfg_json, resize_hdr=False, verbose=0):
     return headers_list
 
 
-def get_angle_from_headers_line(data_rec, cfg_json, verbose=0):
+def use_document_layout(cfg_json):
+    """
+    :param cfg_json: json of configuration for this type of document
+    :return: True if headers found on a page are reused for next pages of document (config key document_layout,
+             default True)
+    """
+    return bool(cfg_json) and cfg_json.get("document_layout", True)
+
+
+def get_page_size(data_rec):
+    """
+    :param data_rec: data dictionary of recognition
+    :return: tuple (width, height) of page entry of data_rec, None if there is no page entry
+    """
+    if not len(data_rec["level"]) or data_rec["level"][0] != 1:
+        return None
+    return data_rec["width"][0], data_rec["height"][0]
+
+
+class DocumentLayout:
+    """
+    memory of headers of package tables of a document : headers found on a page are the template of next pages
+    of same size. A template is validated by searching a few of its header words (anchors) in a narrow band around
+    their positions, headers are searched in all page only when validation fails.
+    Templates are learnt on one page, the first one giving a template among the NB_LEARNING_PAGES first pages of
+    document, the layout is then frozen : headers of a page do not depend on the order of next pages, a frozen layout
+    can be given to page workers
+    ...
+    Attributes
+    templates : dictionary (resized headers, page width, page height) -> template {"headers", "anchors"}
+    frozen : True if templates are not learnt anymore
+    nb_pages : number of pages finished while layout was not frozen
+    nb_reused : number of headers lists given from a template
+    nb_searched : number of headers searches in all page
+
+    Methods
+    get_headers : headers of a page, from template or from a search in all page
+    get_template_headers : headers of template of a page size, not validated
+    validate : headers of template found in a page
+    learn : keep headers found as template
+    end_page : a page is finished, layout is frozen after its first template
+    """
+    # number of header words searched to validate a template
+    NB_ANCHORS = 3
+    # number of first pages of document on which templates can be learnt
+    NB_LEARNING_PAGES = 3
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.templates = {}
+        self.frozen = False
+        self.nb_pages = 0
+        self.nb_reused = 0
+        self.nb_searched = 0
+
+    @staticmethod
+    def _copy_headers(headers_list, dy=0, dx=0):
+        headers_copy = []
+        for hdr in headers_list:
+            hdr_copy = {"name": hdr["name"], "cfg_index": hdr["cfg_index"]}
+            if "box" in hdr:
+                hdr_box = hdr["box"]
+                hdr_copy["box"] = Box.from_tblr(hdr_box.top + dy, hdr_box.bottom + dy, hdr_box.left + dx,
+                                                hdr_box.right + dx)
+            headers_copy.append(hdr_copy)
+        return headers_copy
+
+    def learn(self, key, headers_list):
+        """
+        keep headers found as template, only if at least half of headers have a box and two of them are words
+        :param key: tuple (resized headers, page width, page height)
+        :param headers_list: list of headers found in page (see search_headers)
+        :return: True if headers are kept
+        """
+        words = [pos for pos, hdr in enumerate(headers_list) if "rec_index" in hdr and "box" in hdr]
+        nb_boxes = sum(1 for hdr in headers_list if "box" in hdr)
+        if self.frozen or key is None or len(words) < 2 or 2 * nb_boxes < len(headers_list):
+            return False
+        # first and last words give skew angle of headers line
+        anchors = sorted({words[0], words[len(words) // 2], words[-1]})[:self.NB_ANCHORS]
+        self.templates[key] = {"headers": self._copy_headers(headers_list), "anchors": anchors}
+        return True
+
+    def end_page(self):
+        """
+        a page of document is finished : layout is frozen if templates were learnt on this page or if it is the
+        last learning page
+        :return: nothing
+        """
+        if self.frozen:
+            return
+        self.nb_pages += 1
+        if self.templates or self.nb_pages >= self.NB_LEARNING_PAGES:
+            self.frozen = True
+
+    def get_template_headers(self, page_size, resize_hdr=True):
+        """
+        :param page_size: tuple (width, height) of page
+        :param resize_hdr: template of resized headers
+        :return: copy of headers of template (not validated), None if there is no template for this page size
+        """
+        template = self.templates.get((resize_hdr,) + tuple(page_size))
+        return self._copy_headers(template["headers"]) if template else None
+
+    def validate(self, data_rec, cfg_json, resize_hdr=True):
+        """
+        search anchors of template in a band around their positions : each anchor is the nearest word matching its
+        header at less than config key layout_tolerance pixels (default 50) from its template position
+        :param data_rec: data dictionary of recognition
+        :param cfg_json: json of configuration for this type of document
+        :param resize_hdr: template of resized headers
+        :return: list of headers of template moved by median offset of anchors, anchors are replaced by words found,
+                 None if there is no template or if an anchor is not found
+        """
+        page_size = get_page_size(data_rec)
+        template = self.templates.get((resize_hdr,) + page_size) if page_size else None
+        if template is None:
+            return None
+        tolerance = cfg_json.get("layout_tolerance", 50)
+        matcher = get_header_matcher(cfg_json)
+        anchor_boxes = [template["headers"][pos]["box"] for pos in template["anchors"]]
+        tops = numpy.asarray(data_rec["top"])
+        lefts = numpy.asarray(data_rec["left"])
+        band = numpy.flatnonzero((tops >= min(b.top for b in anchor_boxes) - tolerance) &
+                                 (tops <= max(b.top for b in anchor_boxes) + tolerance))
+        found = {}
+        for pos, anchor_box in zip(template["anchors"], anchor_boxes):
+            cfg_idx = template["headers"][pos]["cfg_index"]
+            near = band[(numpy.abs(tops[band] - anchor_box.top) <= tolerance) &
+                        (numpy.abs(lefts[band] - anchor_box.left) <= tolerance)]
+            best = None
+            for rec_idx in near.tolist():
+                score = matcher.get_score(str(data_rec["text"][rec_idx]).lower(), cfg_idx)
+                if score is None:
+                    continue
+                dy, dx = int(tops[rec_idx]) - anchor_box.top, int(lefts[rec_idx]) - anchor_box.left
+                if best is None or abs(dy) + abs(dx) < abs(best[1]) + abs(best[2]):
+                    best = (rec_idx, dy, dx, score)
+            if best is None:
+                return None
+            found[pos] = best
+        dy = int(numpy.median([val[1] for val in found.values()]))
+        dx = int(numpy.median([val[2] for val in found.values()]))
+        headers_list = self._copy_headers(template["headers"], dy, dx)
+        for pos, (rec_idx, anchor_dy, anchor_dx, score) in found.items():
+            hdr_box = template["headers"][pos]["box"]
+            headers_list[pos].update({"rec_index": rec_idx, "conf": data_rec["conf"][rec_idx],
+                                      "text": data_rec["text"][rec_idx], "match_score": score,
+                                      "box": Box.from_tblr(hdr_box.top + anchor_dy, hdr_box.bottom + anchor_dy,
+                                                           hdr_box.left + anchor_dx, hdr_box.right + anchor_dx)})
+        return headers_list
+
+    def get_headers(self, data_rec, cfg_json, resize_hdr=False, verbose=0):
+        """
+        headers of a page from template of its size if it is validated, else from search_headers (headers found are
+        learnt as template if layout is not frozen)
+        :param data_rec: data dictionary of recognition (with boxes)
+        :param cfg_json: json of configuration for this type of document
+        :param resize_hdr: resize headers (see search_headers)
+        :param verbose: verbose mode
+        :return: list of headers (see search_headers)
+        """
+        headers_list = self.validate(data_rec, cfg_json, resize_hdr=resize_hdr)
+        if headers_list is not None:
+            self.nb_reused += 1
+            if verbose:
+                print("headers reused from document layout")
+            return headers_list
+        headers_list = search_headers(data_rec, cfg_json, resize_hdr=resize_hdr, verbose=verbose)
+        self.nb_searched += 1
+        page_size = get_page_size(data_rec)
+        self.learn((resize_hdr,) + page_size if page_size else None, headers_list)
+        return headers_list
+
+
+def get_angle_from_headers_line(data_rec, cfg_json, verbose=0, layout=None):
     angle = 0.0 # in degrees
     r_l = l_l = -1
     r_t = l_t = -1
-    headers_list = search_headers(data_rec, cfg_json, resize_hdr=False, verbose=verbose)
+    if layout is not None:
+        headers_list = layout.get_headers(data_rec, cfg_json, resize_hdr=False, verbose=verbose)
+    else:
+        headers_list = search_headers(data_rec, cfg_json, resize_hdr=False, verbose=verbose)
     for hdr in headers_list:
         if "box" in hdr:
             l_l, l_t = hdr["box"].left, hdr["box"].top
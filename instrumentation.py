@@ -0,0 +1,265 @@
+"""
+Instrumentation of recognition stages
+Each stage of a page (rendering, OCR, preprocessing, headers search, table building, exports) is run in
+`with trace_stage(name):`, a record is kept for it with wall time, CPU time of process, CPU time of subprocesses
+(tesseract, pdftoppm), growth of resident memory during the stage and peak resident memory of process since its
+start, records are written in a JSON lines trace file
+Tracing is disabled by default (stages are not measured), a Tracer is set once in each process with set_tracer
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+# stages not measured when tracing is disabled
+_NO_STAGE = nullcontext()
+# ru_maxrss is given in bytes on macOS, in kilobytes elsewhere
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def get_peak_rss_mb(who=resource.RUSAGE_SELF):
+    """
+    :param who: resource.RUSAGE_SELF (process) or resource.RUSAGE_CHILDREN (largest finished subprocess)
+    :return: peak resident memory of process since its start (or of its largest finished subprocess) in MB
+    """
+    return resource.getrusage(who).ru_maxrss * _MAXRSS_UNIT / 1024 ** 2
+
+
+def get_rss_mb():
+    """
+    :return: current resident memory of process in MB, peak resident memory where it can not be read (no /proc)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 1024 ** 2
+    except (OSError, IndexError, ValueError):
+        return get_peak_rss_mb()
+
+
+def get_usage():
+    """
+    :return: tuple (CPU time of process, CPU time of finished subprocesses, current resident memory of process in MB,
+             peak resident memory of process since its start in MB)
+    """
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time(), children.ru_utime + children.ru_stime, get_rss_mb(), get_peak_rss_mb()
+
+
+class Tracer:
+    """
+    Records of stages of recognition
+    ...
+    Attributes
+    enabled : stages are measured
+    trace_path : JSON lines file where records are appended (records are only kept in memory if empty)
+    profile_page : index of page (starting from 0) profiled with cProfile in each document, None for no profile
+    run_id : identifier of run given in all records, worker processes of a run use the same one
+    document : name of document being recognized
+    records : list of records of stages (dictionaries)
+
+    Methods
+    stage : context manager measuring a stage
+    page : context manager of recognition of a page, its stages are given its number
+    pop_records : records of a worker process, to be merged in tracer of main process
+    merge : add records of another process
+    get_summary : statistics by stage
+    print_summary : print table of statistics by stage
+    close : write summary and close trace file
+    """
+    def __init__(self, trace_path='', profile_page=None, enabled=True, run_id=None):
+        """
+        Constructor
+        :param trace_path: JSON lines trace file (appended)
+        :param profile_page: index of page (starting from 0) profiled with cProfile or None
+        :param enabled: False for a tracer measuring nothing
+        :param run_id: identifier of run (default a new one)
+        """
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.profile_page = profile_page
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.document = ""
+        self.records = []
+        self.page_idx = None
+        self._file = None
+
+    def __getstate__(self):
+        # worker processes get configuration only, they open trace file and keep their own records
+        return {"enabled": self.enabled, "trace_path": self.trace_path, "profile_page": self.profile_page,
+                "run_id": self.run_id}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _write(self, record):
+        if not self.trace_path:
+            return
+        if self._file is None:
+            # line buffered : one write by record, records of processes of a run do not mix in appended file
+            # and records of worker processes are not lost when they exit
+            self._file = open(self.trace_path, "a", buffering=1)
+        self._file.write(json.dumps(record) + "\n")
+
+    def stage(self, name, page_idx=None, **info):
+        """
+        :param name: name of stage
+        :param page_idx: index of page (default page being recognized)
+        :param info: other values given in record
+        :return: context manager measuring stage (nothing is done if tracer is disabled)
+        """
+        if not self.enabled:
+            return _NO_STAGE
+        return self._stage(name, page_idx, info)
+
+    @contextmanager
+    def _stage(self, name, page_idx, info):
+        start = time.time()
+        start_wall = time.perf_counter()
+        start_cpu, start_children, start_rss, start_peak_rss = get_usage()
+        try:
+            yield
+        finally:
+            cpu, children, rss, peak_rss = get_usage()
+            if page_idx is None:
+                page_idx = self.page_idx
+            record = {"run": self.run_id, "pid": os.getpid(), "document": self.document,
+                      "page": page_idx + 1 if page_idx is not None else None, "stage": name, "start": start,
+                      "wall": time.perf_counter() - start_wall, "cpu": cpu - start_cpu,
+                      "children_cpu": children - start_children,
+                      # memory kept at end of stage, and rise of process peak during stage (0 if peak is not reached)
+                      "rss_growth_mb": rss - start_rss, "peak_growth_mb": peak_rss - start_peak_rss,
+                      "process_peak_rss_mb": peak_rss}
+            record.update(info)
+            self.records.append(record)
+            self._write(record)
+
+    @contextmanager
+    def page(self, page_idx):
+        """
+        recognition of a page : it is measured as stage page, nested stages are given its number
+        and page profile_page is profiled
+        :param page_idx: index of page (starting from 0)
+        """
+        if not self.enabled:
+            yield
+            return
+        profiler = cProfile.Profile() if page_idx == self.profile_page else None
+        self.page_idx = page_idx
+        try:
+            with self.stage("page", page_idx):
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    yield
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            self.page_idx = None
+            if profiler is not None:
+                self._save_profile(profiler, page_idx)
+
+    def _save_profile(self, profiler, page_idx):
+        root = os.path.splitext(self.trace_path)[0] if self.trace_path else "reco"
+        document = "_{}".format(os.path.splitext(self.document)[0]) if self.document else ""
+        profile_path = "{}{}_p{}.prof".format(root, document, page_idx + 1)
+        profiler.dump_stats(profile_path)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(20)
+        print("profile of page {} written in {}".format(page_idx + 1, profile_path))
+        print(stream.getvalue())
+
+    def pop_records(self):
+        """
+        :return: list of records kept since last call, they are removed from tracer
+        """
+        records, self.records = self.records, []
+        return records
+
+    def merge(self, records):
+        """
+        :param records: records of another process (already written in trace file by their process)
+        :return: nothing
+        """
+        self.records += records
+
+    def get_summary(self):
+        """
+        :return: dictionary stage -> statistics (count, wall, mean_wall, max_wall, cpu, children_cpu, max_rss_growth_mb,
+                 max_peak_growth_mb, process_peak_rss_mb), in order of first record of stages
+        """
+        summary = {}
+        for record in self.records:
+            stats = summary.setdefault(record["stage"], {"count": 0, "wall": 0., "max_wall": 0., "cpu": 0.,
+                                                         "children_cpu": 0., "max_rss_growth_mb": 0.,
+                                                         "max_peak_growth_mb": 0., "process_peak_rss_mb": 0.})
+            stats["count"] += 1
+            stats["wall"] += record["wall"]
+            stats["max_wall"] = max(stats["max_wall"], record["wall"])
+            stats["cpu"] += record["cpu"]
+            stats["children_cpu"] += record["children_cpu"]
+            stats["max_rss_growth_mb"] = max(stats["max_rss_growth_mb"], record["rss_growth_mb"])
+            stats["max_peak_growth_mb"] = max(stats["max_peak_growth_mb"], record["peak_growth_mb"])
+            stats["process_peak_rss_mb"] = max(stats["process_peak_rss_mb"], record["process_peak_rss_mb"])
+        for stats in summary.values():
+            stats["mean_wall"] = stats["wall"] / stats["count"]
+        return summary
+
+    def print_summary(self):
+        """
+        print one line by stage : number, total, mean and max wall times, CPU times, greatest memory growths of a stage
+        and peak memory of processes (page stage includes its nested stages)
+        """
+        print("{:<16}{:>7}{:>10}{:>10}{:>10}{:>10}{:>12}{:>12}{:>12}{:>11}".format(
+            "stage", "count", "wall (s)", "mean (s)", "max (s)", "cpu (s)", "subproc (s)", "rss+ (MB)", "peak+ (MB)",
+            "peak (MB)"))
+        for name, stats in self.get_summary().items():
+            print("{:<16}{:>7}{:>10.2f}{:>10.3f}{:>10.3f}{:>10.2f}{:>12.2f}{:>12.1f}{:>12.1f}{:>11.0f}".format(
+                name, stats["count"], stats["wall"], stats["mean_wall"], stats["max_wall"], stats["cpu"],
+                stats["children_cpu"], stats["max_rss_growth_mb"], stats["max_peak_growth_mb"],
+                stats["process_peak_rss_mb"]))
+
+    def close(self):
+        """
+        summary of run is written at end of trace file
+        """
+        if not self.enabled:
+            return
+        if self.trace_path:
+            self._write({"run": self.run_id, "pid": os.getpid(), "stage": "summary", "summary": self.get_summary()})
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# tracer of process, disabled until set_tracer is called
+_tracer = Tracer(enabled=False)
+
+
+def get_tracer():
+    """
+    :return: Tracer of this process
+    """
+    return _tracer
+
+
+def set_tracer(tracer):
+    """
+    :param tracer: Tracer of this process, None to disable tracing
+    :return: nothing
+    """
+    global _tracer
+    _tracer = tracer if tracer is not None else Tracer(enabled=False)
+
+
+def trace_stage(name, page_idx=None, **info):
+    """
+    :return: context manager measuring a stage with tracer of process (see Tracer.stage)
+    """
+    return _tracer.stage(name, page_idx, **info)
@@ -1,5 +1,9 @@
 
 import pdfminer
+import numpy
+
+# local imports
+from rec_frame import DATA_REC_KEYS
 
 
 def mining_infos_pdf(path):
@@ -13,6 +17,184 @@ def mining_infos_pdf(path):
     return
 
 
+def get_words_from_layout(page_layout):
+    """
+    get words of a page layout from the characters of its text lines, a word ends at a space
+    :param page_layout: pdfminer LTPage object
+    :return: list of words, each one is a tuple (x0, y0, x1, y1, text) in pdf points
+    """
+    from pdfminer.layout import LTChar, LTContainer, LTTextLine
+
+    words = []
+
+    def add_word(chars):
+        if chars:
+            words.append((min(c.x0 for c in chars), min(c.y0 for c in chars),
+                          max(c.x1 for c in chars), max(c.y1 for c in chars), "".join(c.get_text() for c in chars)))
+
+    def walk(element):
+        if isinstance(element, LTTextLine):
+            chars = []
+            for char in element:
+                if isinstance(char, LTChar) and not char.get_text().isspace():
+                    chars.append(char)
+                else:
+                    add_word(chars)
+                    chars = []
+            add_word(chars)
+        elif isinstance(element, LTContainer):
+            for child in element:
+                walk(child)
+
+    walk(page_layout)
+    return words
+
+
+def get_text_layer_data_rec(page_layout, dpi=300, orientation=None):
+    """
+    create recognition data in tesseract format from the text layer of a pdf page
+    words are grouped in rows by their vertical position, each row is a block with one paragraph and one line
+    so that all headers of a table are in the same line as with tesseract
+    :param page_layout: pdfminer LTPage object
+    :param dpi: resolution of page pixels coordinates
+    :param orientation: configured orientation ('landscape' or 'portrait'), page is rotated of 90 degrees
+                        like rendered image if its orientation is not the configured one
+    :return: recognition data dictionary in pytesseract Output.DICT format (without boxes)
+    """
+    scale = dpi / 72.
+    page_width = int(round(page_layout.width * scale))
+    page_height = int(round(page_layout.height * scale))
+    rotate = (page_width < page_height and orientation == 'landscape') or\
+             (page_width > page_height and orientation == 'portrait')
+
+    def to_pixels(x0, y0, x1, y1):
+        # pdf origin is bottom left, image origin is top left
+        left = int(numpy.floor((x0 - page_layout.x0) * scale))
+        right = int(numpy.ceil((x1 - page_layout.x0) * scale)) - 1
+        top = int(numpy.floor((page_layout.y1 - y1) * scale))
+        bottom = int(numpy.ceil((page_layout.y1 - y0) * scale)) - 1
+        if rotate:
+            # same as PIL rotate(90, expand=True) : (x, y) goes to (y, width - 1 - x)
+            left, right, top, bottom = top, bottom, page_width - 1 - right, page_width - 1 - left
+        return left, top, max(1, right - left + 1), max(1, bottom - top + 1)
+
+    words = [to_pixels(*w[0:4]) + (w[4],) for w in get_words_from_layout(page_layout)]
+
+    # group words in rows
+    rows = []
+    for word in sorted(words, key=lambda w: w[1] + w[3] / 2):
+        center = word[1] + word[3] / 2
+        if rows and rows[-1]["top"] <= center <= rows[-1]["bottom"]:
+            rows[-1]["words"].append(word)
+        else:
+            rows.append({"top": word[1], "bottom": word[1] + word[3] - 1, "words": [word]})
+
+    data_rec = {key: [] for key in DATA_REC_KEYS}
+
+    def add_rec(level, block_num, par_num, line_num, word_num, ltwh, conf, text):
+        for key, val in zip(DATA_REC_KEYS, (level, 1, block_num, par_num, line_num, word_num) + ltwh + (conf, text)):
+            data_rec[key].append(val)
+
+    if rotate:
+        page_width, page_height = page_height, page_width
+    add_rec(1, 0, 0, 0, 0, (0, 0, page_width, page_height), -1, "")
+    for block_num, row in enumerate(rows, start=1):
+        row["words"].sort(key=lambda w: w[0])
+        left = min(w[0] for w in row["words"])
+        top = min(w[1] for w in row["words"])
+        right = max(w[0] + w[2] for w in row["words"])
+        bottom = max(w[1] + w[3] for w in row["words"])
+        row_ltwh = (left, top, right - left, bottom - top)
+        add_rec(2, block_num, 0, 0, 0, row_ltwh, -1, "")
+        add_rec(3, block_num, 1, 0, 0, row_ltwh, -1, "")
+        add_rec(4, block_num, 1, 1, 0, row_ltwh, -1, "")
+        for word_num, word in enumerate(row["words"], start=1):
+            add_rec(5, block_num, 1, 1, word_num, word[0:4], 100, word[4])
+    return data_rec
+
+
+def is_text_layer_usable(data_rec, min_words=20):
+    """
+    a text layer is usable if it has enough words and they are not made of unknown glyphs
+    :param data_rec: recognition data created by get_text_layer_data_rec
+    :param min_words: minimal number of words with letters or digits
+    :return: True if text layer can be used instead of OCR
+    """
+    words = [txt for (lvl, txt) in zip(data_rec["level"], data_rec["text"]) if lvl == 5]
+    nb_alnum = sum(1 for txt in words if any(c.isalnum() for c in txt))
+    nb_unknown = sum(1 for txt in words if "(cid:" in txt or "\ufffd" in txt)
+    return nb_alnum >= min_words and nb_unknown <= 0.1 * len(words)
+
+
+def generate_text_layers(pdf_path, nb_pages, dpi=300, cfg_json=None, page_numbers=None, verbose=0):
+    """
+    generator of usable text layers of pages
+    :param pdf_path: path of pdf file
+    :param nb_pages: number of pages of document
+    :param dpi: resolution of pixels coordinates
+    :param cfg_json: json of configuration (keys orientation and text_layer_min_words are used)
+    :param page_numbers: list of indexes of pages (starting from 0) to read (all pages if None)
+    :param verbose: verbose mode
+    :return: yields for each page its recognition data if text layer is usable, None otherwise
+    """
+    from pdfminer.high_level import extract_pages
+
+    cfg_json = cfg_json or {}
+    min_words = cfg_json.get("text_layer_min_words", 20)
+    # pages are given in document order
+    pages_indexes = list(range(nb_pages)) if page_numbers is None else sorted(page_numbers)
+    nb_expected = len(pages_indexes)
+    nb_given = 0
+    try:
+        for page_layout in extract_pages(pdf_path, page_numbers=page_numbers):
+            data_rec = get_text_layer_data_rec(page_layout, dpi=dpi, orientation=cfg_json.get("orientation"))
+            usable = is_text_layer_usable(data_rec, min_words)
+            if verbose:
+                print("text layer of page {} is {}usable".format(pages_indexes[nb_given] + 1,
+                                                                 "" if usable else "not "))
+            nb_given += 1
+            yield data_rec if usable else None
+    except Exception as e:
+        print("ERROR : text layer can not be read ({}), OCR is used".format(e))
+    # pages not read use OCR
+    for _ in range(nb_given, nb_expected):
+        yield None
+
+
+def get_hocr_from_data_rec(data_rec):
+    """
+    create a hocr page from recognition data in tesseract format
+    :param data_rec: recognition data dictionary in pytesseract Output.DICT format
+    :return: hocr html string
+    """
+    from html import escape
+
+    classes = {1: ("div", "ocr_page"), 2: ("div", "ocr_carea"), 3: ("p", "ocr_par"), 4: ("span", "ocr_line"),
+               5: ("span", "ocrx_word")}
+    out = ['<?xml version="1.0" encoding="UTF-8"?>',
+           '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" '
+           '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">',
+           '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">',
+           '<head><meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>'
+           '<meta name="ocr-system" content="pdf text layer"/></head>', '<body>']
+    opened = []
+    for idx, level in enumerate(data_rec["level"]):
+        while opened and opened[-1][0] >= level:
+            out.append("</{}>".format(opened.pop()[1]))
+        tag, cls = classes[level]
+        bbox = "bbox {} {} {} {}".format(data_rec["left"][idx], data_rec["top"][idx],
+                                         data_rec["left"][idx] + data_rec["width"][idx],
+                                         data_rec["top"][idx] + data_rec["height"][idx])
+        title = bbox if level < 5 else "{}; x_wconf {}".format(bbox, data_rec["conf"][idx])
+        out.append('<{} class="{}" id="{}_{}" title="{}">{}'.format(tag, cls, cls.split("_")[-1], idx + 1, title,
+                                                                   escape(str(data_rec["text"][idx]))))
+        opened.append((level, tag))
+    while opened:
+        out.append("</{}>".format(opened.pop()[1]))
+    out += ['</body>', '</html>']
+    return "\n".join(out)
+
+
 if __name__ == '__main__':
     import argparse
 
@@ -0,0 +1,353 @@
+"""
+Calls to tesseract OCR
+Images are recognized by the OCR backend of the process (see set_ocr_backend) :
+ - cli : tesseract program is run for each image (image is written in a file, language model is loaded each time)
+ - tesserocr : tesseract library engines are kept alive in process (language model loaded once), images are given
+   as raw pixel buffers
+ - fake : deterministic recognition data given by tests, no tesseract needed
+"""
+import os
+import shlex
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from pytesseract import pytesseract as tess
+
+# local imports
+from rec_frame import RecognitionFrame
+
+CONFIGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "configs")
+
+# names of OCR backends of command lines, auto is tesserocr if it is installed, cli otherwise
+OCR_BACKEND_NAMES = ["auto", "cli", "tesserocr"]
+
+# header line of tesseract TSV output (library gives lines of entries only)
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+
+# tesseract command line options given to the library as variables
+OPTION_VARIABLES = {"--dpi": "user_defined_dpi"}
+
+
+def image_to_data_pdf_hocr(img, lang='fra', config='', pdf=True, hocr=True):
+    """
+    recognize an image with only one tesseract run and get all its outputs :
+    word data, searchable pdf page and hocr are rendered from the same recognition
+    :param img: PIL image to recognize
+    :param lang: tesseract language
+    :param config: tesseract options (as for pytesseract.image_to_data)
+    :param pdf: compute searchable pdf page
+    :param hocr: compute hocr page
+    :return: tuple (RecognitionFrame of word data, pdf bytes or None, hocr bytes or None)
+    """
+    # config files must be given after all options
+    config_files = []
+    if pdf:
+        config_files.append(os.path.join(CONFIGS_DIR, "pdf"))
+    if hocr:
+        config_files.append(os.path.join(CONFIGS_DIR, "hocr"))
+    full_config = ' '.join(opt for opt in ['-c tessedit_create_tsv=1', config.strip()] + config_files if opt)
+
+    with tess.save(img) as (temp_name, input_filename):
+        tess.run_tesseract(input_filename, temp_name, 'tsv', lang, full_config)
+        with open(temp_name + os.extsep + 'tsv', 'rb') as f:
+            tsv = f.read().decode(tess.DEFAULT_ENCODING)
+        pdf_bytes = hocr_bytes = None
+        if pdf:
+            with open(temp_name + os.extsep + 'pdf', 'rb') as f:
+                pdf_bytes = f.read()
+        if hocr:
+            with open(temp_name + os.extsep + 'hocr', 'rb') as f:
+                hocr_bytes = f.read()
+
+    return RecognitionFrame.from_tsv(tsv), pdf_bytes, hocr_bytes
+
+
+def parse_tesseract_config(config):
+    """
+    :param config: tesseract command line options (ex: '--psm 6 -c tessedit_char_whitelist=0123456789')
+    :return: tuple (page segmentation mode or None, engine mode or None, dictionary variable name -> value)
+    :raise ValueError: an option can not be given to tesseract library (config files, -l, --user-words...)
+    """
+    psm = oem = None
+    variables = {}
+    tokens = shlex.split(config)
+    for idx in range(0, len(tokens), 2):
+        option = tokens[idx]
+        value = tokens[idx + 1] if idx + 1 < len(tokens) else None
+        if option in ("--psm", "-psm") and value is not None:
+            psm = int(value)
+        elif option in ("--oem", "-oem") and value is not None:
+            oem = int(value)
+        elif option == "-c" and value is not None and "=" in value:
+            name, var_value = value.split("=", 1)
+            variables[name] = var_value
+        elif option in OPTION_VARIABLES and value is not None:
+            variables[OPTION_VARIABLES[option]] = value
+        else:
+            raise ValueError("tesseract option {} is not supported".format(option))
+    return psm, oem, variables
+
+
+def get_hocr_document(hocr_page):
+    """
+    :param hocr_page: hocr of a page given by tesseract library (ocr_page div only)
+    :return: hocr html document of page, as written by tesseract program
+    """
+    return '\n'.join(['<?xml version="1.0" encoding="UTF-8"?>',
+                      '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"',
+                      '    "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">',
+                      '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">',
+                      ' <head>',
+                      '  <title></title>',
+                      '  <meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>',
+                      "  <meta name='ocr-system' content='tesseract' />",
+                      "  <meta name='ocr-capabilities' content='ocr_page ocr_carea ocr_par ocr_line ocrx_word'/>",
+                      ' </head>',
+                      ' <body>',
+                      hocr_page.rstrip('\n'),
+                      ' </body>',
+                      '</html>', ''])
+
+
+class OcrBackend:
+    """
+    engine recognizing images, base class of backends
+    backends are sent to worker processes by their configuration only, each process creates its own engines
+    ...
+    Attributes
+    name : name of backend
+
+    Methods
+    recognize : word data, searchable pdf page and hocr page of an image from one recognition
+    get_version : version of tesseract, part of OCR cache keys
+    close : release engines
+    """
+    name = ""
+
+    def recognize(self, img, lang='fra', config='', pdf=True, hocr=True):
+        """
+        :param img: PIL image to recognize
+        :param lang: tesseract language
+        :param config: tesseract options (as for pytesseract.image_to_data)
+        :param pdf: compute searchable pdf page
+        :param hocr: compute hocr page
+        :return: tuple (RecognitionFrame of word data, pdf bytes or None, hocr bytes or None)
+        """
+        raise NotImplementedError
+
+    def get_version(self):
+        """
+        :return: version of tesseract as a string ("unknown" if it can not be found)
+        """
+        return "unknown"
+
+    def close(self):
+        """
+        release engines of process, they are created again if backend is used after
+        """
+        pass
+
+
+class TesseractCliBackend(OcrBackend):
+    """
+    tesseract program run for each image (see image_to_data_pdf_hocr)
+    """
+    name = "cli"
+
+    def __init__(self):
+        self._version = None
+
+    def recognize(self, img, lang='fra', config='', pdf=True, hocr=True):
+        return image_to_data_pdf_hocr(img, lang=lang, config=config, pdf=pdf, hocr=hocr)
+
+    def get_version(self):
+        if self._version is None:
+            try:
+                self._version = str(tess.get_tesseract_version())
+            except Exception:
+                self._version = "unknown"
+        return self._version
+
+
+class TesserocrBackend(OcrBackend):
+    """
+    tesseract library in process (tesserocr module) : one engine by language and engine mode is initialized at its
+    first image and kept alive, so that its language model is loaded once by process and no program is run by image,
+    pixels are given to the engine from memory
+    searchable pdf pages are still rendered through files (the library only writes them in files),
+    images with tesseract options that can not be given to the library are recognized by tesseract program
+    ...
+    Attributes
+    tessdata_path : directory of language models (default directory of tesseract library)
+    """
+    name = "tesserocr"
+
+    def __init__(self, tessdata_path=''):
+        """
+        Constructor
+        :param tessdata_path: directory of language models
+        :raise ImportError: tesserocr is not installed
+        """
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.tessdata_path = tessdata_path
+        self._engines = {}
+        self._cli_backend = TesseractCliBackend()
+
+    def __getstate__(self):
+        # engines can not be sent to other processes, they create their own ones
+        return {"tessdata_path": self.tessdata_path}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _get_engine(self, lang, oem):
+        engine = self._engines.get((lang, oem))
+        if engine is None:
+            kwargs = {"lang": lang}
+            if oem is not None:
+                kwargs["oem"] = self._tesserocr.OEM(oem)
+            if self.tessdata_path:
+                kwargs["path"] = self.tessdata_path
+            engine = self._engines[(lang, oem)] = self._tesserocr.PyTessBaseAPI(**kwargs)
+        return engine
+
+    def recognize(self, img, lang='fra', config='', pdf=True, hocr=True):
+        try:
+            psm, oem, variables = parse_tesseract_config(config)
+        except ValueError:
+            return self._cli_backend.recognize(img, lang=lang, config=config, pdf=pdf, hocr=hocr)
+        engine = self._get_engine(lang, oem)
+        # options are given for this image only, engine gets its defaults back after recognition
+        # (None for unknown variables)
+        defaults = {name: engine.GetVariableAsString(name) for name in variables}
+        try:
+            if not all([engine.SetVariable(name, value) for name, value in variables.items()]):
+                # unknown variable or variable only read at engine initialization
+                return self._cli_backend.recognize(img, lang=lang, config=config, pdf=pdf, hocr=hocr)
+            engine.SetPageSegMode(self._tesserocr.PSM.AUTO if psm is None else psm)
+            if img.mode not in ("L", "RGB"):
+                img = img.convert("L" if img.mode in ("1", "LA", "I", "F") else "RGB")
+            pdf_bytes = None
+            if pdf:
+                # image is recognized while its pdf page is rendered
+                pdf_bytes = self._recognize_pdf(engine, img)
+            else:
+                bytes_per_pixel = 1 if img.mode == "L" else 3
+                engine.SetImageBytes(img.tobytes(), img.width, img.height, bytes_per_pixel,
+                                     bytes_per_pixel * img.width)
+                if img.info.get("dpi"):
+                    engine.SetSourceResolution(int(round(img.info["dpi"][0])))
+                engine.Recognize()
+            data = RecognitionFrame.from_tsv(TSV_HEADER + engine.GetTSVText(0))
+            hocr_bytes = get_hocr_document(engine.GetHOCRText(0)).encode('utf-8') if hocr else None
+        finally:
+            for name, value in defaults.items():
+                if value is not None:
+                    engine.SetVariable(name, value)
+            engine.Clear()
+        return data, pdf_bytes, hocr_bytes
+
+    @staticmethod
+    def _recognize_pdf(engine, img):
+        with TemporaryDirectory() as tmp_dir:
+            # pdf renderer embeds image file in page, as tesseract program does
+            image_path = os.path.join(tmp_dir, "page.png")
+            img.save(image_path)
+            output_base = os.path.join(tmp_dir, "page")
+            engine.SetVariable("tessedit_create_pdf", "1")
+            try:
+                if not engine.ProcessPage(output_base, img, 0, image_path):
+                    raise RuntimeError("tesseract could not recognize image")
+            finally:
+                engine.SetVariable("tessedit_create_pdf", "0")
+            with open(output_base + os.extsep + 'pdf', 'rb') as f:
+                return f.read()
+
+    def get_version(self):
+        # first line of library version is "tesseract <version>"
+        words = self._tesserocr.tesseract_version().split()
+        return words[1] if len(words) > 1 else "unknown"
+
+    def close(self):
+        for engine in self._engines.values():
+            engine.End()
+        self._engines = {}
+
+
+class FakeOcrBackend(OcrBackend):
+    """
+    deterministic backend for tests : recognition data are given, they do not depend on image pixels,
+    searchable pdf page is the image in a pdf without text and hocr page is created from recognition data
+    ...
+    Attributes
+    data_rec : recognition data of all images in pytesseract Output.DICT format, or function
+               (image, lang, config) -> recognition data, None for images without words
+    calls : list of tuples (image size, lang, config) of recognized images
+    """
+    name = "fake"
+
+    def __init__(self, data_rec=None):
+        """
+        Constructor
+        :param data_rec: recognition data of all images, or function (image, lang, config) -> recognition data
+        """
+        self.data_rec = data_rec
+        self.calls = []
+
+    def recognize(self, img, lang='fra', config='', pdf=True, hocr=True):
+        from mining_pdf import get_hocr_from_data_rec
+
+        self.calls.append((img.size, lang, config))
+        data_rec = self.data_rec(img, lang, config) if callable(self.data_rec) else self.data_rec
+        if data_rec is None:
+            data_rec = {"level": [1], "page_num": [1], "block_num": [0], "par_num": [0], "line_num": [0],
+                        "word_num": [0], "left": [0], "top": [0], "width": [img.width], "height": [img.height],
+                        "conf": [-1], "text": [""]}
+        pdf_bytes = None
+        if pdf:
+            pdf_buffer = BytesIO()
+            img.save(pdf_buffer, "PDF")
+            pdf_bytes = pdf_buffer.getvalue()
+        hocr_bytes = get_hocr_from_data_rec(data_rec).encode('utf-8') if hocr else None
+        return RecognitionFrame.from_dict(data_rec), pdf_bytes, hocr_bytes
+
+    def get_version(self):
+        # results of fake backend are never mixed with tesseract ones in OCR cache
+        return "fake"
+
+
+def create_ocr_backend(name="auto"):
+    """
+    :param name: name of backend (see OCR_BACKEND_NAMES, or fake)
+    :return: OcrBackend object, for auto tesserocr backend if tesserocr is installed, cli backend otherwise
+    :raise ImportError: tesserocr backend is asked and tesserocr is not installed
+    """
+    if name == "auto":
+        try:
+            return TesserocrBackend()
+        except ImportError:
+            return TesseractCliBackend()
+    backends = {"cli": TesseractCliBackend, "tesserocr": TesserocrBackend, "fake": FakeOcrBackend}
+    if name not in backends:
+        raise ValueError("unknown OCR backend {}".format(name))
+    return backends[name]()
+
+
+# backend of process, tesseract program until set_ocr_backend is called
+_ocr_backend = TesseractCliBackend()
+
+
+def get_ocr_backend():
+    """
+    :return: OcrBackend of this process
+    """
+    return _ocr_backend
+
+
+def set_ocr_backend(backend):
+    """
+    :param backend: OcrBackend of this process, None for tesseract program (cli)
+    :return: nothing
+    """
+    global _ocr_backend
+    _ocr_backend = backend if backend is not None else TesseractCliBackend()
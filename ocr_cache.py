@@ -0,0 +1,247 @@
+"""
+Persistent cache of OCR results on disk
+Entries are keyed by a hash of the recognized image pixels, OCR language and tesseract config,
+documents pages are linked to their entries so that a document already recognized is not rendered again
+Cache files are plain data (JSON recognition data and links, pdf and hocr pages as they are) : a cache directory
+shared between users or hosts never executes code when it is read
+"""
+import hashlib
+import json
+import os
+from tempfile import NamedTemporaryFile
+
+# local imports
+from ocr import get_ocr_backend
+from rec_frame import RecognitionFrame
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf_form")
+
+# configuration keys only used after OCR, changing them does not change recognition of pages
+ANALYSIS_ONLY_KEYS = {"headers", "next_header_margin", "min_pixels_for_a_line", "ratio_max_one_line_upon_headers",
+                      "text_layer", "text_layer_min_words", "header_matcher",
+                      "document_layout", "layout_tolerance"}
+
+
+def get_tesseract_version():
+    """
+    :return: tesseract version of OCR backend of process as a string ("unknown" if tesseract can not be called)
+    """
+    return get_ocr_backend().get_version()
+
+
+class OcrCache:
+    """
+    OCR results cache in a directory
+    ...
+    Attributes
+    cache_dir : directory of cache files
+    max_size : maximal size of cache in bytes, least recently used files are removed above it
+
+    Methods
+    """
+    # files of an entry : recognition data, searchable pdf page and hocr page
+    ENTRY_EXT = ".json"
+    PDF_EXT = ".pdf"
+    HOCR_EXT = ".hocr"
+    LINK_EXT = ".page"
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size=2 * 1024 ** 3, verbose=0):
+        """
+        Constructor
+        :param cache_dir: directory of cache files (created if necessary)
+        :param max_size: maximal size of cache in bytes
+        :param verbose: verbose mode
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.verbose = verbose
+        self.size = None  # computed at first put
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _get_path(self, key, ext):
+        return os.path.join(self.cache_dir, key[0:2], key + ext)
+
+    def get_image_key(self, img, lang, config=''):
+        """
+        :param img: PIL image to recognize
+        :param lang: tesseract language
+        :param config: tesseract options
+        :return: key of OCR results of this image
+        """
+        h = hashlib.sha256()
+        h.update("{}|{}|{}|{}|{}|".format(img.mode, img.size, lang, config, get_tesseract_version()).encode())
+        h.update(img.tobytes())
+        return h.hexdigest()
+
+    def get_document_key(self, pdf_path, cfg_json, dpi, lang, config=''):
+        """
+        key of a document for a configuration : pages of the same file rendered and improved with the same parameters
+        give the same images
+        :param pdf_path: path of pdf file
+        :param cfg_json: json of configuration for this type of document
+        :param dpi: resolution of rendered images
+        :param lang: tesseract language
+        :param config: tesseract options
+        :return: key of document
+        """
+        ignored_keys = set(ANALYSIS_ONLY_KEYS)
+        if cfg_json.get("deskew_method") == "headers":
+            # headers are used to improve image
+            ignored_keys.discard("headers")
+        image_cfg = {key: val for key, val in cfg_json.items() if key not in ignored_keys}
+        h = hashlib.sha256()
+        h.update(json.dumps([image_cfg, dpi, lang, config, get_tesseract_version()], sort_keys=True,
+                            default=lambda o: o.__dict__).encode())
+        with open(pdf_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        # most recently used
+        os.utime(path)
+        return content
+
+    def _read_json(self, path):
+        content = self._read(path)
+        if content is None:
+            return None
+        try:
+            return json.loads(content.decode('utf-8'))
+        except ValueError:
+            return None
+
+    def _write(self, path, content):
+        """
+        :param path: path of file
+        :param content: bytes of file
+        :return: growth of cache size in bytes (size of file replaced is subtracted)
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        # atomic write : other processes never read a partial file
+        with NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+            f.write(content)
+        os.replace(f.name, path)
+        return os.path.getsize(path) - old_size
+
+    def get(self, key, pdf=False, hocr=False):
+        """
+        :param key: key of image (get_image_key)
+        :param pdf: searchable pdf page is needed
+        :param hocr: hocr page is needed
+        :return: entry dictionary with keys data (RecognitionFrame), pdf and hocr (bytes if they are needed, else None),
+                 None if not in cache or if a needed output is missing
+        """
+        entry = None
+        columns = self._read_json(self._get_path(key, self.ENTRY_EXT))
+        if columns is not None:
+            entry = {"data": RecognitionFrame.from_dict(columns),
+                     "pdf": self._read(self._get_path(key, self.PDF_EXT)) if pdf else None,
+                     "hocr": self._read(self._get_path(key, self.HOCR_EXT)) if hocr else None}
+        if entry is None or (pdf and entry["pdf"] is None) or (hocr and entry["hocr"] is None):
+            if self.verbose:
+                print("OCR cache miss for {}".format(key))
+            return None
+        if self.verbose:
+            print("OCR cache hit for {}".format(key))
+        return entry
+
+    def put(self, key, data, pdf=None, hocr=None):
+        """
+        store OCR results of an image
+        :param key: key of image (get_image_key)
+        :param data: RecognitionFrame, or data dictionary in pytesseract Output.DICT format
+        :param pdf: searchable pdf page bytes
+        :param hocr: hocr page bytes
+        :return: nothing
+        """
+        columns = RecognitionFrame.from_dict(data).to_dict()
+        self._add_size(self._write(self._get_path(key, self.ENTRY_EXT), json.dumps(columns).encode('utf-8')))
+        for (content, ext) in ((pdf, self.PDF_EXT), (hocr, self.HOCR_EXT)):
+            if content is not None:
+                self._add_size(self._write(self._get_path(key, ext), content))
+
+    def get_page(self, document_key, page_idx, pdf=False, hocr=False):
+        """
+        :param document_key: key of document (get_document_key)
+        :param page_idx: index of page (starting from 0)
+        :param pdf: searchable pdf page is needed
+        :param hocr: hocr page is needed
+        :return: entry of page as given by get with resolution of its image in key dpi (None if not known),
+                 None if page is not in cache
+        """
+        link = self._read_json(self._get_path("{}_{}".format(document_key, page_idx), self.LINK_EXT))
+        if not link:
+            return None
+        entry = self.get(link["key"], pdf=pdf, hocr=hocr)
+        return dict(entry, dpi=link["dpi"]) if entry is not None else None
+
+    def put_page(self, document_key, page_idx, key, dpi=None):
+        """
+        link a page of a document to the entry of its image
+        :param document_key: key of document (get_document_key)
+        :param page_idx: index of page (starting from 0)
+        :param key: key of image (get_image_key)
+        :param dpi: resolution of image of page
+        :return: nothing
+        """
+        self._add_size(self._write(self._get_path("{}_{}".format(document_key, page_idx), self.LINK_EXT),
+                                   json.dumps({"key": key, "dpi": dpi}).encode('utf-8')))
+
+    def _get_files(self):
+        files = []
+        for sub_dir in os.scandir(self.cache_dir):
+            if sub_dir.is_dir():
+                for entry in os.scandir(sub_dir.path):
+                    if entry.name.endswith((self.ENTRY_EXT, self.PDF_EXT, self.HOCR_EXT, self.LINK_EXT)):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _add_size(self, nb_bytes):
+        if self.size is None:
+            self.size = sum(f[1] for f in self._get_files())
+        else:
+            self.size += nb_bytes
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self, ratio=0.9):
+        """
+        remove least recently used files until cache size is below ratio x max_size
+        :param ratio: ratio of max size to reach
+        :return: nothing
+        """
+        files = sorted(self._get_files())
+        self.size = sum(f[1] for f in files)
+        for (_, size, path) in files:
+            if self.size <= ratio * self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+        if self.verbose:
+            print("OCR cache size after eviction : {} bytes".format(self.size))
+
+    def clear(self):
+        """
+        remove all files of cache
+        :return: nothing
+        """
+        for (_, _, path) in self._get_files():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.size = 0
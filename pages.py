@@ -0,0 +1,110 @@
+"""
+Rasterization of pdf pages :
+pages are rendered chunk by chunk so that memory does not grow with the number of pages
+"""
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+# local imports
+from instrumentation import trace_stage
+
+
+def get_nb_pages(pdf_path):
+    """
+    :param pdf_path: path of pdf file
+    :return: number of pages of the pdf file
+    """
+    return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def generate_pages_images(pdf_path, dpi=300, chunk_size=4, nb_pages=None, grayscale=False, verbose=0):
+    """
+    generator of pages images, only chunk_size pages are rendered at a time
+    each image is released by the generator as soon as it has been given to the caller,
+    caller should not keep a reference on it once its page is finished
+    :param pdf_path: path of pdf file
+    :param dpi: resolution of rendered images
+    :param chunk_size: number of pages rendered by one call to pdftoppm
+    :param nb_pages: number of pages of the document (computed with pdfinfo if not given)
+    :param grayscale: render grayscale images (mode L) instead of color ones
+    :param verbose: verbose mode
+    :return: yields tuples (page index starting from 0, PIL image)
+    """
+    if nb_pages is None:
+        nb_pages = get_nb_pages(pdf_path)
+    chunk_size = max(1, chunk_size)
+    for first_page in range(1, nb_pages + 1, chunk_size):
+        last_page = min(first_page + chunk_size - 1, nb_pages)
+        if verbose:
+            print("rendering pages {} to {} at {} dpi".format(first_page, last_page, dpi))
+        with trace_stage("render", first_page - 1, nb_rendered=last_page - first_page + 1):
+            images = convert_from_path(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page,
+                                       grayscale=grayscale)
+        # pop images so that the chunk list does not keep them alive
+        images.reverse()
+        page_idx = first_page - 1
+        while images:
+            img = images.pop()
+            yield page_idx, img
+            del img
+            page_idx += 1
+
+
+def render_page(pdf_path, page_idx, dpi=300, grayscale=False):
+    """
+    render only one page of a pdf file
+    :param pdf_path: path of pdf file
+    :param page_idx: index of page (starting from 0)
+    :param dpi: resolution of rendered image
+    :param grayscale: render a grayscale image (mode L) instead of a color one
+    :return: PIL image of page
+    """
+    with trace_stage("render", page_idx, nb_rendered=1):
+        return convert_from_path(pdf_path, dpi=dpi, first_page=page_idx + 1, last_page=page_idx + 1,
+                                 grayscale=grayscale)[0]
+
+
+def generate_document_pages(pdf_path, dpi=300, chunk_size=4, nb_pages=None, pages_sources=None, grayscale=False,
+                            verbose=0):
+    """
+    generator of pages of a document : pages already known (from their text layer for example) are given without
+    image, other pages are rendered by chunks (only pages needing an image are rendered)
+    :param pdf_path: path of pdf file
+    :param dpi: resolution of rendered images
+    :param chunk_size: number of pages considered at once
+    :param nb_pages: number of pages of the document (computed with pdfinfo if not given)
+    :param pages_sources: iterable giving for each page what is known of it without rendering, or None if page must
+                          be rendered (all pages are rendered if pages_sources is None)
+    :param grayscale: render grayscale images (mode L) instead of color ones
+    :param verbose: verbose mode
+    :return: yields tuples (page index starting from 0, PIL image or None, page source or None)
+    """
+    if nb_pages is None:
+        nb_pages = get_nb_pages(pdf_path)
+    if pages_sources is None:
+        for page_idx, img in generate_pages_images(pdf_path, dpi=dpi, chunk_size=chunk_size, nb_pages=nb_pages,
+                                                   grayscale=grayscale, verbose=verbose):
+            yield page_idx, img, None
+        return
+
+    chunk_size = max(1, chunk_size)
+    chunk = []
+    for page_idx, page_source in zip(range(nb_pages), pages_sources):
+        chunk.append((page_idx, page_source))
+        if len(chunk) == chunk_size or page_idx == nb_pages - 1:
+            # render consecutive pages without text layer with one call
+            images = {}
+            to_render = [idx for (idx, source) in chunk if source is None]
+            while to_render:
+                first_idx = last_idx = to_render.pop(0)
+                while to_render and to_render[0] == last_idx + 1:
+                    last_idx = to_render.pop(0)
+                if verbose:
+                    print("rendering pages {} to {} at {} dpi".format(first_idx + 1, last_idx + 1, dpi))
+                with trace_stage("render", first_idx, nb_rendered=last_idx - first_idx + 1):
+                    rendered = convert_from_path(pdf_path, dpi=dpi, first_page=first_idx + 1, last_page=last_idx + 1,
+                                                 grayscale=grayscale)
+                images.update(zip(range(first_idx, last_idx + 1), rendered))
+                del rendered
+            for idx, source in chunk:
+                yield idx, images.pop(idx, None), source
+            chunk = []
@@ -0,0 +1,46 @@
+"""
+Helpers for process pools
+"""
+import os
+from collections import deque
+
+# local imports
+from instrumentation import set_tracer
+from ocr import set_ocr_backend
+
+
+def init_worker_process(ocr_backend, tracer=None):
+    """
+    setup shared by initializers of worker processes (pages, batch files and service jobs)
+    :param ocr_backend: OcrBackend object of worker, its engines are created in worker and kept for all its tasks
+    :param tracer: Tracer object of worker (stages are traced in the same run as main process) or None
+    :return: nothing
+    """
+    # workers already run in parallel, one tesseract thread by worker avoids oversubscription
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    set_ocr_backend(ocr_backend)
+    if tracer is not None:
+        set_tracer(tracer)
+
+
+def imap_ordered(executor, func, iterable, max_pending=None):
+    """
+    lazy equivalent of executor.map : results are given in the order of iterable as soon as they are available,
+    and no more than max_pending tasks are submitted ahead of the first not yet given result
+    so that a long iterable does not fill the memory with tasks and results
+    :param executor: concurrent.futures executor
+    :param func: function to apply on each item (must be picklable for a process pool)
+    :param iterable: items to process
+    :param max_pending: maximal number of submitted tasks not yet given to caller (default executor number of workers x 2)
+    :return: yields func(item) for each item of iterable, in order
+    """
+    if max_pending is None:
+        max_pending = 2 * getattr(executor, "_max_workers", 1)
+    max_pending = max(1, max_pending)
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
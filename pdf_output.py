@@ -0,0 +1,227 @@
+"""
+Searchable pdf output written page by page
+Each page is appended to the file with a pdf incremental update (objects of the page, new pages tree,
+cross reference section and trailer), so that the file is a valid pdf after each page
+and no more than one page is kept in memory
+Pages can also be built from an image and its recognition data, without OCR (invisible text over the image)
+"""
+import zlib
+from io import BytesIO
+from PyPDF4 import PdfFileReader
+from PyPDF4.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+# mean width of Helvetica characters (fraction of font size), used to stretch invisible words over their boxes
+MEAN_CHAR_WIDTH = 0.5
+
+
+def escape_pdf_text(text):
+    """
+    :param text: text of a word
+    :return: pdf literal string content (WinAnsi encoding, characters out of it are replaced by ?)
+    """
+    raw = text.encode("cp1252", errors="replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def get_searchable_pdf_page(img, data_rec, dpi=300):
+    """
+    searchable pdf of one page built from its image and recognition data (no OCR) : image is drawn on the whole page
+    and each word is written over its box in invisible text, as tesseract pdf renderer does
+    :param img: PIL image of page, positions of recognition data are given in its pixels
+    :param data_rec: recognition data in pytesseract Output.DICT format (words of level 5 are written)
+    :param dpi: resolution of image, it gives size of page
+    :return: pdf file content (one page)
+    """
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("L" if img.mode in ("1", "LA", "I", "F") else "RGB")
+    scale = 72. / dpi
+    page_width, page_height = img.width * scale, img.height * scale
+    text_ops = [b"BT 3 Tr"]
+    for idx, level in enumerate(data_rec["level"]):
+        text = str(data_rec["text"][idx]).strip()
+        if level != 5 or not text:
+            continue
+        width, height = data_rec["width"][idx] * scale, data_rec["height"][idx] * scale
+        if width <= 0 or height <= 0:
+            continue
+        x = data_rec["left"][idx] * scale
+        # baseline a little above bottom of box (descenders)
+        y = page_height - (data_rec["top"][idx] + data_rec["height"][idx]) * scale + 0.2 * height
+        stretch = 100. * width / (MEAN_CHAR_WIDTH * height * len(text))
+        text_ops.append("/F1 {:.2f} Tf {:.1f} Tz 1 0 0 1 {:.2f} {:.2f} Tm (".format(height, stretch, x, y).encode() +
+                        escape_pdf_text(text) + b") Tj")
+    text_ops.append(b"ET")
+    content = zlib.compress("q {:.2f} 0 0 {:.2f} 0 0 cm /Im1 Do Q\n".format(page_width, page_height).encode() +
+                            b"\n".join(text_ops))
+    pixels = zlib.compress(img.tobytes())
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+               "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {:.2f} {:.2f}] /Contents 4 0 R "
+               "/Resources << /XObject << /Im1 5 0 R >> /Font << /F1 6 0 R >> >> >>".format(
+                   page_width, page_height).encode(),
+               "<< /Length {} /Filter /FlateDecode >>\nstream\n".format(len(content)).encode() + content +
+               b"\nendstream",
+               "<< /Type /XObject /Subtype /Image /Width {} /Height {} /ColorSpace /{} /BitsPerComponent 8 "
+               "/Length {} /Filter /FlateDecode >>\nstream\n".format(
+                   img.width, img.height, "DeviceGray" if img.mode == "L" else "DeviceRGB", len(pixels)).encode() +
+               pixels + b"\nendstream",
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    out = BytesIO()
+    out.write(b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for num, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write("{} 0 obj\n".format(num).encode() + obj + b"\nendobj\n")
+    xref_offset = out.tell()
+    lines = ["xref", "0 {}".format(len(objects) + 1), "0000000000 65535 f "]
+    lines += ["{:010d} 00000 n ".format(offset) for offset in offsets]
+    lines += ["trailer", "<< /Size {} /Root 1 0 R >>".format(len(objects) + 1), "startxref", str(xref_offset),
+              "%%EOF", ""]
+    out.write("\n".join(lines).encode())
+    return out.getvalue()
+
+
+class IncrementalPdfWriter:
+    """
+    pdf file written page by page
+    ...
+    Attributes
+    path : path of pdf file
+    nb_pages : number of pages already written
+
+    Methods
+    """
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, path):
+        """
+        Constructor, the file is created with only its header
+        :param path: path of pdf file
+        """
+        self.path = path
+        self.nb_pages = 0
+        self._file = open(path, 'wb')
+        self._file.write(b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n")
+        self._next_id = self.PAGES_ID + 1
+        self._kids = []
+        self._prev_xref = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _new_id(self):
+        new_id = self._next_id
+        self._next_id += 1
+        return new_id
+
+    def _renumber(self, container, id_map, objects):
+        """
+        replace indirect references of a direct container (dictionary or array) by references to new objects ids
+        :param container: DictionaryObject or ArrayObject modified in place
+        :param id_map: dictionary (reader id, generation) -> new id
+        :param objects: list of (new id, object) to write, referenced objects are appended to it
+        :return: nothing
+        """
+        items = list(container.items()) if isinstance(container, DictionaryObject) else list(enumerate(container))
+        for key, value in items:
+            if isinstance(value, IndirectObject):
+                if value.pdf is None:
+                    # reference to an object of this file
+                    continue
+                ref = (value.idnum, value.generation)
+                if ref not in id_map:
+                    id_map[ref] = self._new_id()
+                    objects.append((id_map[ref], value.getObject()))
+                container[key] = IndirectObject(id_map[ref], 0, None)
+            elif isinstance(value, (DictionaryObject, ArrayObject)):
+                self._renumber(value, id_map, objects)
+
+    def _write_object(self, obj_id, obj, offsets):
+        offsets[obj_id] = self._file.tell()
+        self._file.write("{} 0 obj\n".format(obj_id).encode())
+        if isinstance(obj, bytes):
+            self._file.write(obj)
+        else:
+            obj.writeToStream(self._file, None)
+        self._file.write(b"\nendobj\n")
+
+    def _write_update(self, offsets):
+        """
+        write pages tree, catalog (first update), cross reference section and trailer
+        :param offsets: dictionary object id -> offset of objects written in this update
+        :return: nothing
+        """
+        kids = " ".join("{} 0 R".format(k) for k in self._kids)
+        self._write_object(self.PAGES_ID, "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            kids, len(self._kids)).encode(), offsets)
+        if self._prev_xref is None:
+            self._write_object(self.CATALOG_ID, "<< /Type /Catalog /Pages {} 0 R >>".format(
+                self.PAGES_ID).encode(), offsets)
+
+        xref_offset = self._file.tell()
+        lines = ["xref", "0 1", "0000000000 65535 f "]
+        ids = sorted(offsets)
+        while ids:
+            first = last = ids.pop(0)
+            while ids and ids[0] == last + 1:
+                last = ids.pop(0)
+            lines.append("{} {}".format(first, last - first + 1))
+            lines += ["{:010d} 00000 n ".format(offsets[i]) for i in range(first, last + 1)]
+        trailer = "<< /Size {} /Root {} 0 R".format(self._next_id, self.CATALOG_ID)
+        if self._prev_xref is not None:
+            trailer += " /Prev {}".format(self._prev_xref)
+        lines += ["trailer", trailer + " >>", "startxref", str(xref_offset), "%%EOF", ""]
+        self._file.write("\n".join(lines).encode())
+        self._file.flush()
+        self._prev_xref = xref_offset
+
+    def add_page(self, page):
+        """
+        append a page and update the file so that it is a valid pdf with all pages added so far
+        :param page: PyPDF4 page object (from a PdfFileReader)
+        :return: nothing
+        """
+        page_id = self._new_id()
+        page[NameObject("/Parent")] = IndirectObject(self.PAGES_ID, 0, None)
+        objects = [(page_id, page)]
+        id_map = {}
+        if getattr(page, "indirectRef", None) is not None:
+            # references to page inside its objects
+            id_map[(page.indirectRef.idnum, page.indirectRef.generation)] = page_id
+        offsets = {}
+        idx = 0
+        while idx < len(objects):
+            obj_id, obj = objects[idx]
+            if isinstance(obj, (DictionaryObject, ArrayObject)):
+                self._renumber(obj, id_map, objects)
+            self._write_object(obj_id, obj, offsets)
+            idx += 1
+        self._kids.append(page_id)
+        self.nb_pages += 1
+        self._write_update(offsets)
+
+    def add_page_from_bytes(self, pdf_bytes, page_num=0):
+        """
+        append a page of a pdf in memory (no temporary file)
+        :param pdf_bytes: pdf file content
+        :param page_num: index of page in pdf (default first one)
+        :return: nothing
+        """
+        reader = PdfFileReader(BytesIO(pdf_bytes), strict=False)
+        self.add_page(reader.getPage(page_num))
+
+    def close(self):
+        """
+        close the file, a pdf without page is written if no page was added
+        :return: nothing
+        """
+        if self._file.closed:
+            return
+        if self._prev_xref is None:
+            self._write_update({})
+        self._file.close()
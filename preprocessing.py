@@ -0,0 +1,207 @@
+"""
+Preprocessing of pages images before recognition, on numpy buffers
+Operations are chained on a grayscale buffer :
+- transform : orientation (90 degrees) and deskew rotations fused in one rotation of the grayscale image
+- opening : 3x3 max then min filters, each blended with its input by image_graysacle_opening_coeff
+- binarize : dark pixels become black and others white (Otsu threshold or a configured one)
+A chain without transform is run on the page in configured orientation (rotation without deskew)
+Work buffers are kept by the engine and reused for next pages of the same size
+"""
+import numpy
+from PIL import Image
+
+# local imports
+from deskew import estimate_skew_angle, get_dark_threshold
+
+# skew angles below this value (degrees) are not corrected
+MIN_SKEW_ANGLE = 0.5
+# operations of preprocessing chains
+PREPROCESSING_OPS = ["transform", "opening", "binarize"]
+
+
+def get_orientation_angle(size, cfg_json):
+    """
+    :param size: (width, height) of page image
+    :param cfg_json: json of configuration for this type of document
+    :return: 90 if image must be rotated to the configured orientation, else 0 (same test as rotate_to_orientation)
+    """
+    if "orientation" in cfg_json:
+        width, height = size
+        if (width < height and cfg_json["orientation"] == 'landscape') or \
+                (width > height and cfg_json["orientation"] == 'portrait'):
+            return 90
+    return 0
+
+
+def get_opening_coeff(coeff):
+    """
+    :param coeff: blend coefficient of opening in ]0, 1]
+    :return: tuple of integers (weight of filtered image, weight of input image, divisor) as the historical
+             ImageMath expression (decimal coefficient)
+    """
+    max_val = 1
+    int_coeff = coeff
+    while int(int_coeff) != int_coeff:
+        max_val *= 10
+        int_coeff *= 10
+    return int(int_coeff), int(max_val - int_coeff), max_val
+
+
+def get_preprocessing_chain(cfg_json):
+    """
+    :param cfg_json: json of configuration for this type of document
+    :return: list of operations names, given by config key preprocessing or by historical keys
+             (transform, then opening if image_graysacle_opening_coeff is in ]0, 1])
+    :raise ValueError: an operation of config key preprocessing is unknown (see PREPROCESSING_OPS)
+    """
+    if "preprocessing" in cfg_json:
+        unknown_ops = [op for op in cfg_json["preprocessing"] if op not in PREPROCESSING_OPS]
+        if unknown_ops:
+            raise ValueError("unknown preprocessing operations {} (known : {})".format(
+                ", ".join(unknown_ops), ", ".join(PREPROCESSING_OPS)))
+        return list(cfg_json["preprocessing"])
+    chain = ["transform"]
+    coeff = cfg_json.get("image_graysacle_opening_coeff", 0)
+    if 0 < coeff <= 1.0:
+        chain.append("opening")
+    return chain
+
+
+class PreprocessingEngine:
+    """
+    chain of preprocessing operations on numpy buffers, one engine by process
+    ...
+    Methods
+    run : preprocessing of a page image
+    """
+    def __init__(self):
+        self._buffers = {}
+
+    def _get_buffer(self, name, shape, dtype=numpy.uint8):
+        """
+        :return: work buffer of given name, allocated again only if shape or type changes
+        """
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = numpy.empty(shape, dtype=dtype)
+            self._buffers[name] = buf
+        return buf
+
+    def estimate_skew(self, gray, orientation_angle, max_size=1200, verbose=0):
+        """
+        skew angle of page in its final orientation, estimated on a downscaled copy (see deskew.py)
+        :param gray: grayscale PIL image (not oriented)
+        :param orientation_angle: 0 or 90
+        :param max_size: greatest dimension of downscaled copy (pixels)
+        :param verbose: verbose mode
+        :return: angle in degrees (see deskew.estimate_skew_angle)
+        """
+        if orientation_angle:
+            # transposition of grayscale image is cheap, it is reduced in the same way as the oriented page
+            gray = gray.transpose(Image.Transpose.ROTATE_90)
+        return estimate_skew_angle(gray, max_size=max_size, verbose=verbose)
+
+    def transform(self, gray, orientation_angle, skew_angle):
+        """
+        fused orientation and deskew rotations
+        :param gray: grayscale PIL image
+        :param orientation_angle: 0 or 90
+        :param skew_angle: skew angle in degrees (not corrected if below MIN_SKEW_ANGLE)
+        :return: grayscale PIL image
+        """
+        angle = orientation_angle + (skew_angle if abs(skew_angle) > MIN_SKEW_ANGLE else 0)
+        if angle == 0:
+            return gray
+        if angle == 90:
+            return gray.transpose(Image.Transpose.ROTATE_90)
+        return gray.rotate(angle, expand=True, fillcolor=255)
+
+    def _filter3(self, gray_array, func, name):
+        """
+        3x3 rank filter (func is numpy.maximum or numpy.minimum), edges are replicated as PIL MaxFilter / MinFilter
+        :return: filtered array (work buffer of given name)
+        """
+        height, width = gray_array.shape
+        padded = self._get_buffer("padded", (height + 2, width + 2))
+        padded[1:-1, 1:-1] = gray_array
+        padded[0, 1:-1] = gray_array[0]
+        padded[-1, 1:-1] = gray_array[-1]
+        padded[:, 0] = padded[:, 1]
+        padded[:, -1] = padded[:, -2]
+        rows = self._get_buffer("rows", (height + 2, width))
+        func(padded[:, :-2], padded[:, 1:-1], out=rows)
+        func(rows, padded[:, 2:], out=rows)
+        out = self._get_buffer(name, (height, width))
+        func(rows[:-2], rows[1:-1], out=out)
+        func(out, rows[2:], out=out)
+        return out
+
+    def _blend(self, filtered, gray_array, weights, out):
+        """
+        out = (a * filtered + b * gray_array) // divisor with weights (a, b, divisor)
+        """
+        a, b, divisor = weights
+        acc = self._get_buffer("blend", filtered.shape, numpy.uint32)
+        numpy.multiply(filtered, a, out=acc, dtype=numpy.uint32)
+        tmp = self._get_buffer("blend_tmp", filtered.shape, numpy.uint32)
+        numpy.multiply(gray_array, b, out=tmp, dtype=numpy.uint32)
+        acc += tmp
+        acc //= divisor
+        numpy.copyto(out, acc, casting='unsafe')
+        return out
+
+    def opening(self, gray_array, coeff):
+        """
+        3x3 max filter then min filter, each result is blended with its input
+        :param gray_array: numpy uint8 array of grayscale image
+        :param coeff: weight of filtered images in ]0, 1]
+        :return: new numpy uint8 array
+        """
+        out = numpy.empty_like(gray_array)
+        if coeff == 1:
+            numpy.copyto(out, self._filter3(self._filter3(gray_array, numpy.maximum, "max"), numpy.minimum, "min"))
+            return out
+        weights = get_opening_coeff(coeff)
+        temp = self._blend(self._filter3(gray_array, numpy.maximum, "max"), gray_array, weights,
+                           self._get_buffer("temp", gray_array.shape))
+        return self._blend(self._filter3(temp, numpy.minimum, "min"), temp, weights, out)
+
+    def binarize(self, gray_array, threshold=None):
+        """
+        :param gray_array: numpy uint8 array of grayscale image
+        :param threshold: pixels below it become black, others white (Otsu threshold if None)
+        :return: new numpy uint8 array of 0 and 255
+        """
+        if threshold is None:
+            threshold = get_dark_threshold(gray_array)
+        return numpy.where(gray_array < threshold, numpy.uint8(0), numpy.uint8(255))
+
+    def run(self, img, cfg_json, skew_angle=None, verbose=0):
+        """
+        preprocessing of a page image
+        :param img: PIL image of page (in any orientation)
+        :param cfg_json: json of configuration for this type of document
+        :param skew_angle: skew angle of page in its final orientation (estimated from pixels if None)
+        :param verbose: verbose mode
+        :return: grayscale PIL image in configured orientation
+        :raise ValueError: an operation of chain is unknown
+        """
+        gray = img.convert("L")
+        chain = get_preprocessing_chain(cfg_json)
+        if "transform" not in chain:
+            # page is oriented but not deskewed
+            gray = self.transform(gray, get_orientation_angle(gray.size, cfg_json), 0)
+        for op in chain:
+            if op == "transform":
+                orientation_angle = get_orientation_angle(gray.size, cfg_json)
+                if skew_angle is None:
+                    skew_angle = self.estimate_skew(gray, orientation_angle, verbose=verbose)
+                gray = self.transform(gray, orientation_angle, skew_angle)
+            elif op == "opening":
+                gray_array = self.opening(numpy.asarray(gray), cfg_json["image_graysacle_opening_coeff"])
+                gray = Image.fromarray(gray_array)
+            elif op == "binarize":
+                threshold = cfg_json.get("binarize_threshold")
+                gray_array = self.binarize(numpy.asarray(gray), threshold)
+                gray = Image.fromarray(gray_array)
+        return gray
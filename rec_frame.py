@@ -0,0 +1,196 @@
+"""
+Columnar representation of recognition data
+A RecognitionFrame keeps each column of tesseract data (level, line keys, positions, confidence) in a numpy array
+and texts in a list. It is built directly from tesseract TSV output and can be read as the pytesseract
+Output.DICT dictionary (data_rec[key][index], data_rec["box"]...) by code not yet migrated to arrays.
+"""
+import numpy
+
+# local imports
+from box import Box, BoxArray, BoxFormats
+from utils import LINE_INDEX_KEY, WORD_LEVEL
+
+INT_KEYS = ["level", "page_num", "block_num", "par_num", "line_num", "word_num", "left", "top", "width", "height"]
+DATA_REC_KEYS = INT_KEYS + ["conf", "text"]
+
+
+class RecognitionFrame:
+    """
+    recognition data in columns
+    ...
+    Attributes
+    columns : dictionary key of DATA_REC_KEYS -> numpy array (list of str for text)
+    index : indexes of entries in the frame they were selected from (see words)
+
+    Methods
+    array : numpy array of a column (with computed columns right and bottom)
+    box_array : BoxArray of entries
+    words : frame of words only
+    page_box : box of page entry
+    to_dict : data dictionary in pytesseract Output.DICT format
+    """
+    def __init__(self, columns, index=None):
+        """
+        Constructor
+        :param columns: dictionary key -> values, all keys of DATA_REC_KEYS must be given
+        :param index: indexes of entries in original frame (default 0..n-1)
+        """
+        self.columns = {}
+        self._lists = {}
+        self._boxes = None
+        self._line_index = None
+        for key in DATA_REC_KEYS:
+            self[key] = columns[key]
+        self.index = numpy.arange(len(self)) if index is None else numpy.asarray(index)
+
+    @classmethod
+    def from_tsv(cls, tsv):
+        """
+        :param tsv: tesseract TSV output (string with a header line)
+        :return: RecognitionFrame object
+        """
+        lines = tsv.strip('\n').split('\n')
+        header = lines[0].split('\t')
+        rows = [line.split('\t') for line in lines[1:] if line]
+        nb_keys = len(header)
+        for row in rows:
+            if len(row) < nb_keys:
+                # empty text at end of line
+                row.extend([''] * (nb_keys - len(row)))
+        values = list(zip(*rows)) if rows else [()] * nb_keys
+        raw = dict(zip(header, values))
+        columns = {key: numpy.asarray(raw[key], dtype=numpy.float64) for key in INT_KEYS + ["conf"]}
+        columns["text"] = list(raw["text"])
+        return cls(columns)
+
+    @classmethod
+    def from_dict(cls, data_rec):
+        """
+        :param data_rec: data dictionary in pytesseract Output.DICT format (box key is ignored)
+        :return: RecognitionFrame object
+        """
+        return cls({key: data_rec[key] for key in DATA_REC_KEYS})
+
+    def __len__(self):
+        return len(self.columns["level"])
+
+    def __repr__(self):
+        return "RecognitionFrame({} entries, {} words)".format(len(self), int(numpy.sum(self.word_mask())))
+
+    # dictionary compatible accessors (pytesseract Output.DICT with box key)
+    def __getitem__(self, key):
+        """
+        :param key: key of DATA_REC_KEYS, box or line_index
+        :return: list of values of column (same types as in pytesseract dictionary), list of Box objects for box,
+                 utils.LineIndex object (or None) for line_index
+        """
+        if key == LINE_INDEX_KEY:
+            return self._line_index
+        if key == "box":
+            if self._boxes is None:
+                self._boxes = self.box_array().to_boxes()
+            return self._boxes
+        if key not in self._lists:
+            self._lists[key] = self.columns[key] if key == "text" else self.columns[key].tolist()
+        return self._lists[key]
+
+    def __setitem__(self, key, values):
+        """
+        :param key: key of DATA_REC_KEYS, box or line_index
+        :param values: values of column (list of Box objects for box, utils.LineIndex object for line_index)
+        """
+        if key == LINE_INDEX_KEY:
+            self._line_index = values
+            return
+        if key == "box":
+            self._boxes = values
+            return
+        if key == "text":
+            self.columns[key] = [str(v) for v in values]
+        elif key == "conf":
+            self.columns[key] = numpy.asarray(values, dtype=numpy.float64)
+        elif key in INT_KEYS:
+            self.columns[key] = numpy.asarray(values, dtype=numpy.float64).astype(numpy.int64)
+        else:
+            raise KeyError(key)
+        self._lists.pop(key, None)
+        self._line_index = None
+        if key in ("left", "top", "width", "height"):
+            self._boxes = None
+
+    def __contains__(self, key):
+        return key in self.columns or key == "box" or (key == LINE_INDEX_KEY and self._line_index is not None)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return DATA_REC_KEYS + ["box"]
+
+    # columnar accessors
+    def array(self, key):
+        """
+        :param key: key of DATA_REC_KEYS, right or bottom (last pixel of entries, as Box)
+        :return: numpy array of column (list for text)
+        """
+        if key == "right":
+            return self.columns["left"] + self.columns["width"] - 1
+        if key == "bottom":
+            return self.columns["top"] + self.columns["height"] - 1
+        return self.columns[key]
+
+    def box_array(self):
+        """
+        :return: BoxArray of entries
+        """
+        return BoxArray(numpy.stack([self.columns["top"], self.array("bottom"), self.columns["left"],
+                                     self.array("right")], axis=1))
+
+    def line_keys(self):
+        """
+        :return: numpy array of shape (n, 4) of line tuples (page_num, block_num, par_num, line_num)
+        """
+        return numpy.stack([self.columns[k] for k in ("page_num", "block_num", "par_num", "line_num")], axis=1)
+
+    def word_mask(self, min_conf=None):
+        """
+        :param min_conf: minimal confidence of words (all words if None)
+        :return: boolean numpy array, True for entries of words with a not empty text
+        """
+        mask = (self.columns["level"] == WORD_LEVEL) & numpy.array([bool(t.strip()) for t in self.columns["text"]],
+                                                                   dtype=bool)
+        if min_conf is not None:
+            mask &= self.columns["conf"] >= min_conf
+        return mask
+
+    def take(self, indexes):
+        """
+        :param indexes: numpy array of indexes or boolean mask
+        :return: new frame with selected entries, its index gives their indexes in original frame
+        """
+        indexes = numpy.flatnonzero(indexes) if numpy.asarray(indexes).dtype == bool else numpy.asarray(indexes)
+        columns = {key: self.columns[key][indexes] for key in INT_KEYS + ["conf"]}
+        columns["text"] = [self.columns["text"][i] for i in indexes]
+        return RecognitionFrame(columns, index=self.index[indexes])
+
+    def words(self, min_conf=None):
+        """
+        :param min_conf: minimal confidence of words (all words if None)
+        :return: frame of words only (see word_mask), its index gives their indexes in this frame
+        """
+        return self.take(self.word_mask(min_conf))
+
+    def page_box(self):
+        """
+        :return: Box of first page entry (level 1), empty box if there is none
+        """
+        pages = numpy.flatnonzero(self.columns["level"] == 1)
+        if len(pages) == 0:
+            return Box(BoxFormats.EMPTY)
+        return self["box"][pages[0]]
+
+    def to_dict(self):
+        """
+        :return: data dictionary in pytesseract Output.DICT format (without box)
+        """
+        return {key: list(self[key]) for key in DATA_REC_KEYS}
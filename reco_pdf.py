@@ -1,12 +1,30 @@
+import os
+import copy
+from concurrent.futures import ProcessPoolExecutor
 from PyPDF4 import PdfFileReader, PdfFileWriter
-from pdf2image import convert_from_path
-import pytesseract
-from tempfile import NamedTemporaryFile
+from io import BytesIO
+from itertools import chain, repeat
 
 ## local import
 from table import Table
 import utils
-from box import update_tesseract_rec_with_boxes
+from box import update_tesseract_rec_with_boxes, SpatialIndex
+from ocr import CONFIGS_DIR, OCR_BACKEND_NAMES, create_ocr_backend, get_ocr_backend, set_ocr_backend
+from preprocessing import PreprocessingEngine
+from pages import get_nb_pages, generate_document_pages, render_page
+from mining_pdf import generate_text_layers, get_hocr_from_data_rec
+from parallel import imap_ordered, init_worker_process
+from ocr_cache import OcrCache, DEFAULT_CACHE_DIR
+from pdf_output import IncrementalPdfWriter, get_searchable_pdf_page
+from roi_ocr import use_roi_ocr, search_headers_low_res, recognize_table_region
+from headers import DocumentLayout, use_document_layout
+from sinks import MemorySink, StdoutSink, create_sink, OUTPUT_FORMATS
+from instrumentation import Tracer, get_tracer, set_tracer, trace_stage
+
+# resolution of pixel values of configuration files (headers lengths, margins...)
+REFERENCE_DPI = 300
+# configuration keys given in pixels at REFERENCE_DPI
+PIXEL_KEYS = ["next_header_margin", "min_pixels_for_a_line", "layout_tolerance"]
 
 #print("TESSDATA_PREFIX : {}".format(os.environ["TESSDATA_PREFIX"]))
 #print(" cur directory : {}".format(os.getcwd()))
@@ -33,71 +51,76 @@ def extract_information(pdf_path):
     return information
 
 
-def image_improvement(img_orig, data_rec, cfg_json):
-    from headers import get_angle_from_headers_line
-    from PIL import Image, ImageMorph, ImageFilter
-    from PIL.ImageMorph import LutBuilder, MorphOp
+def get_deskew_method(cfg_json):
+    """
+    :param cfg_json: json of configuration for this type of document
+    :return: "projection" (angle from pixels, default) or "headers" (angle from headers of a first OCR pass)
+    """
+    return cfg_json.get("deskew_method", "projection")
 
-    new_image = img_orig
-    cur_angle = get_angle_from_headers_line(data_rec, cfg_json, verbose)
-    if abs(cur_angle) > 0.5:
-        rotated_image = img_orig.rotate(cur_angle, expand=True, fillcolor=(255, 255, 255))
-    else:
-        rotated_image = img_orig
-
-    if "image_graysacle_opening_coeff" in cfg_json and cfg_json["image_graysacle_opening_coeff"] > 0\
-            and cfg_json["image_graysacle_opening_coeff"] <= 1.0:
-        coeff = cfg_json["image_graysacle_opening_coeff"]
-        gs_image = rotated_image.convert("L")
-        if coeff == 1:
-            temp_image = gs_image.filter(ImageFilter.MaxFilter(3))
-            new_image = temp_image.filter(ImageFilter.MinFilter(3))
-        else:
-            from PIL import ImageMath
-            max_val = 1
-            int_coeff = coeff
-            while int(int_coeff) != int_coeff:
-                max_val *= 10
-                int_coeff *= 10
-            imageMath_txt = "convert(({} * A + {} * B)/{}, 'L')".format(int(int_coeff), int(max_val-int_coeff), max_val)
-            max_image = gs_image.filter(ImageFilter.MaxFilter(3))
-            temp_image = ImageMath.eval(imageMath_txt, A=max_image, B=gs_image)
-            new_image = ImageMath.eval(imageMath_txt, A=temp_image.filter(ImageFilter.MinFilter(3)), B=temp_image)
-        #temp_image.show()
-        #new_image.show()
-    else:
-        new_image = rotated_image.convert("L")
-    return new_image
+
+# preprocessing work buffers are reused for all pages of a process
+_preprocessing_engine = PreprocessingEngine()
 
 
-def analyze_data_dict(data_rec, cfg_json, verbose=0):
+def image_improvement(img_orig, data_rec, cfg_json, layout=None, verbose=0):
+    """
+    preprocessing of a page image before recognition (see preprocessing.py)
+    :param img_orig: PIL image of page, in any orientation
+    :param data_rec: recognition data of page in configured orientation (with boxes), only used to find skew angle
+                     with headers deskew method
+    :param cfg_json: json of configuration for this type of document
+    :param layout: DocumentLayout of document or None
+    :param verbose: verbose mode
+    :return: grayscale PIL image in configured orientation
+    """
+    skew_angle = None
+    if get_deskew_method(cfg_json) == "headers":
+        from headers import get_angle_from_headers_line
+        skew_angle = get_angle_from_headers_line(data_rec, cfg_json, verbose=verbose, layout=layout)
+    with trace_stage("preprocessing"):
+        return _preprocessing_engine.run(img_orig, cfg_json, skew_angle=skew_angle, verbose=verbose)
+
+
+def analyze_data_dict(data_rec, cfg_json, sink=None, page_num=None, layout=None, verbose=0):
+    """
+    search package table in recognition data
+    :param data_rec: recognition data in tesseract format (with boxes)
+    :param cfg_json: json of configuration for this type of document
+    :param sink: ResultSink object given the table found (sinks.py) or None
+    :param page_num: number of page (starting from 1) given to sink
+    :param layout: DocumentLayout of document (headers of previous pages are reused) or None
+    :param verbose: verbose mode
+    :return: package table found (Table object) or None if no headers are found
+    """
     from headers import search_headers
-    headers_list = search_headers(data_rec, cfg_json, resize_hdr=True, verbose=verbose)
+    with trace_stage("search_headers"):
+        if layout is not None:
+            headers_list = layout.get_headers(data_rec, cfg_json, resize_hdr=True, verbose=verbose)
+        else:
+            headers_list = search_headers(data_rec, cfg_json, resize_hdr=True, verbose=verbose)
     if not headers_list:
         print("No headers found go to next page")
-        return False
+        return None
 
     if verbose > 0:
         print("headers : {}".format(headers_list))
 
-    package_table = Table(headers_list, headers_of_columns=True)
-    indexes_col_rec_list = package_table.search_rec_in_headed_columns(data_rec)
-    horiz_lines = utils.get_rows_from_selected_rec(data_rec, indexes_col_rec_list, threshold=cfg_json["min_pixels_for_a_line"], verbose=verbose)
-    for h_line in horiz_lines:
-        l_top = h_line[0]
-        l_bottom = h_line[1]
-        idx_rec_list = [idx for idx, c_box in enumerate(data_rec["box"]) if c_box.top >= l_top and c_box.bottom <= l_bottom]
-        #print(idx_rec_list)
-        package_table.add_new_line_from_idx_rec(data_rec, idx_rec_list, True, verbose=verbose)
+    with trace_stage("table"):
+        package_table = Table(headers_list, headers_of_columns=True)
+        # boxes of page indexed once for all rows and columns searches
+        spatial_index = SpatialIndex.from_data_rec(data_rec)
+        indexes_col_rec_list = package_table.search_rec_in_headed_columns(data_rec, spatial_index)
+        horiz_lines = utils.get_rows_from_selected_rec(data_rec, indexes_col_rec_list, threshold=cfg_json["min_pixels_for_a_line"], verbose=verbose)
+        package_table.add_rows_from_lines(data_rec, horiz_lines, spatial_index, verbose=verbose)
 
-    print("Package table found : ")
-    print(package_table.get_csv_string(separator=";"))
-    print("----------------")
-    return True
+    if sink is not None:
+        sink.write_table(page_num, package_table)
+    return package_table
 
 
 def get_config_info(cfg_filename):
-    from headers import ConfigHeader
+    from headers import ConfigHeader, HeaderMatcher
     cfg_json = {}
     if cfg_filename:
         import json
@@ -112,86 +135,612 @@ def get_config_info(cfg_filename):
                 cfg_json[key].append(ConfigHeader(hdr))
         else:
             cfg_json[key] = cfg_json_in[key]
+    if "headers" in cfg_json:
+        # search texts of headers compiled once for all pages
+        cfg_json["header_matcher"] = HeaderMatcher(cfg_json["headers"])
     return cfg_json
 
 
+def get_dpi(cfg_json):
+    """
+    :param cfg_json: json of configuration for this type of document
+    :return: resolution of rendered pages (config key dpi, default REFERENCE_DPI)
+    """
+    return cfg_json.get("dpi", REFERENCE_DPI)
+
+
+def get_render_dpi(cfg_json):
+    """
+    :param cfg_json: json of configuration for this type of document
+    :return: resolution of first rendering of pages : config key low_dpi in adaptive mode (pages are rendered again
+             at dpi when recognition is not good enough), dpi otherwise
+    """
+    return cfg_json.get("low_dpi") or get_dpi(cfg_json)
+
+
+def scale_config(cfg_json, dpi):
+    """
+    pixel values of configuration files are given at REFERENCE_DPI
+    :param cfg_json: json of configuration for this type of document
+    :param dpi: resolution of recognized images
+    :return: configuration with pixel values at dpi (same object if dpi is REFERENCE_DPI)
+    """
+    if not cfg_json or dpi == REFERENCE_DPI:
+        return cfg_json
+    ratio = dpi / REFERENCE_DPI
+    scaled_json = dict(cfg_json)
+    for key in PIXEL_KEYS:
+        if scaled_json.get(key) is not None:
+            scaled_json[key] = int(round(scaled_json[key] * ratio))
+    if "headers" in cfg_json:
+        scaled_json["headers"] = []
+        for hdr in cfg_json["headers"]:
+            scaled_hdr = copy.copy(hdr)
+            if hdr.length != -1:
+                scaled_hdr.length = int(round(hdr.length * ratio))
+            scaled_json["headers"].append(scaled_hdr)
+    return scaled_json
+
+
+def rotate_to_orientation(img, cfg_json):
+    """
+    rotate image of 90 degrees if its orientation is not the configured one
+    :param img: PIL image of page
+    :param cfg_json: json of configuration for this type of document
+    :return: image in configured orientation
+    """
+    if "orientation" in cfg_json:
+        width, height = img.size
+        if (width < height and cfg_json["orientation"] == 'landscape') or\
+                (width > height and cfg_json["orientation"] == 'portrait'):
+            angle = 90
+            img = img.rotate(angle, expand=True)
+    return img
+
+
+def decode_hocr(hocr_bytes):
+    """
+    :param hocr_bytes: hocr page given by tesseract
+    :return: hocr html string
+    """
+    return hocr_bytes.decode('utf-8').replace('\\n', '\n').replace('\\t', '\t')
+
+
+def get_page_result(page_idx, page_sink=None, pdf=None, hocr=None):
+    """
+    :param page_idx: index of page in document (starting from 0)
+    :param page_sink: MemorySink given the tables found in page or None
+    :param pdf: searchable pdf page bytes
+    :param hocr: hocr html string
+    :return: dictionary with keys page_idx, info_found, tables (list of (page number, Table object)),
+             pdf (bytes or None) and hocr (str or None), outputs are only given for pages with a table
+    """
+    page_result = {"page_idx": page_idx, "info_found": False, "tables": [], "pdf": None, "hocr": None}
+    if page_sink is not None and page_sink.tables:
+        page_result.update({"info_found": True, "tables": page_sink.tables, "pdf": pdf, "hocr": hocr})
+    return page_result
+
+
+def recognize_image(img, lang='fra', config='', pdf=True, hocr=True, ocr_cache=None, document_key=None,
+                    page_idx=None, dpi=None):
+    """
+    recognition of an image with one run of OCR backend of process (see ocr.set_ocr_backend), results are taken from
+    and stored in OCR cache if given
+    :param img: PIL image to recognize
+    :param lang: tesseract language
+    :param config: tesseract options
+    :param pdf: compute searchable pdf page
+    :param hocr: compute hocr page
+    :param ocr_cache: OcrCache object or None
+    :param document_key: key of document in OCR cache, page is linked to its image entry if given
+    :param page_idx: index of page in document (starting from 0)
+    :param dpi: resolution of image, kept with page link
+    :return: dictionary with keys data (pytesseract Output.DICT format), pdf (bytes or None) and hocr (bytes or None)
+    """
+    entry = key = None
+    if ocr_cache:
+        key = ocr_cache.get_image_key(img, lang, config)
+        entry = ocr_cache.get(key, pdf=pdf, hocr=hocr)
+    if entry is None:
+        with trace_stage("ocr", pdf=pdf, hocr=hocr):
+            data, pdf_bytes, hocr_bytes = get_ocr_backend().recognize(img, lang=lang, config=config, pdf=pdf,
+                                                                      hocr=hocr)
+        entry = {"data": data, "pdf": pdf_bytes, "hocr": hocr_bytes}
+        if ocr_cache:
+            ocr_cache.put(key, data, pdf_bytes, hocr_bytes)
+    if ocr_cache and document_key:
+        ocr_cache.put_page(document_key, page_idx, key, dpi=dpi)
+    return entry
+
+
+def recognize_roi_image(img, cfg_json, extract_hocr=True, ocr_cache=None, layout=None, verbose=0):
+    """
+    recognition of table region of an image only (see roi_ocr.py), hocr page is created from recognized data
+    :param img: PIL image to recognize
+    :param cfg_json: json of configuration for this type of document
+    :param extract_hocr: compute hocr page
+    :param ocr_cache: OcrCache object or None
+    :param layout: DocumentLayout of document or None : region of headers of previous pages is recognized first,
+                   headers are searched on downscaled page only if they are not found in it
+    :param verbose: verbose mode
+    :return: OCR entry (see recognize_image) with data of table region only and no pdf page,
+             None if no headers are found
+    """
+    def recognize(region_img, config):
+        return recognize_image(region_img, lang='fra', config=config, pdf=False, hocr=False,
+                               ocr_cache=ocr_cache)["data"]
+
+    data_dict = None
+    template_headers = layout.get_template_headers(img.size) if layout is not None else None
+    if template_headers:
+        data_dict = recognize_table_region(img, template_headers, cfg_json, recognize,
+                                           margin=cfg_json.get("layout_tolerance", 50), verbose=verbose)
+        if data_dict is not None and layout.validate(data_dict, cfg_json) is None:
+            if verbose:
+                print("headers of document layout not found in table region")
+            data_dict = None
+    if data_dict is None:
+        headers_list = search_headers_low_res(img, cfg_json, recognize,
+                                              reduce_factor=cfg_json.get("roi_reduce_factor", 2), verbose=verbose)
+        data_dict = recognize_table_region(img, headers_list, cfg_json, recognize, verbose=verbose) if headers_list \
+            else None
+    if data_dict is None:
+        return None
+    return {"data": data_dict, "pdf": None,
+            "hocr": get_hocr_from_data_rec(data_dict).encode('utf-8') if extract_hocr else None}
+
+
+def recognize_page(page_idx, img, cfg_json, extract_pdf=True, extract_hocr=True, temp_image_path=None,
+                   ocr_cache=None, document_key=None, dpi=REFERENCE_DPI, layout=None, verbose=0):
+    """
+    recognition of one page, it does not depend on other pages and can run in any process
+    :param page_idx: index of page in document (starting from 0)
+    :param img: PIL image of page
+    :param cfg_json: json of configuration for this type of document
+    :param extract_pdf: compute searchable pdf page if a table is found
+    :param extract_hocr: compute hocr page if a table is found
+    :param temp_image_path: if given, the recognition image is saved in this file when a table is found
+    :param ocr_cache: OcrCache object or None
+    :param document_key: key of document in OCR cache
+    :param dpi: resolution of image
+    :param layout: DocumentLayout of document or None
+    :param verbose: verbose mode
+    :return: page result (see get_page_result)
+    """
+    if not cfg_json:
+        # nothing to search without configuration
+        return get_page_result(page_idx)
+    cfg_json = scale_config(cfg_json, dpi)
+
+    data_dict = None
+    if get_deskew_method(cfg_json) == "headers":
+        # first recognition only used to find skew angle from headers
+        img = rotate_to_orientation(img, cfg_json)
+        with trace_stage("deskew_ocr"):
+            data_dict = get_ocr_backend().recognize(img, lang='fra', pdf=False, hocr=False)[0].to_dict()
+        update_tesseract_rec_with_boxes(data_dict)
+    recognition_img = image_improvement(img, data_dict, cfg_json, layout=layout, verbose=verbose)
+    ocr_entry = None
+    if use_roi_ocr(cfg_json):
+        ocr_entry = recognize_roi_image(recognition_img, cfg_json, extract_hocr=extract_hocr, ocr_cache=ocr_cache,
+                                        layout=layout, verbose=verbose)
+    if ocr_entry is None:
+        # word data, pdf and hocr come from the same recognition of improved image
+        ocr_entry = recognize_image(recognition_img, lang='fra', pdf=extract_pdf, hocr=extract_hocr,
+                                    ocr_cache=ocr_cache, document_key=document_key, page_idx=page_idx, dpi=dpi)
+    data_dict = ocr_entry["data"]
+    update_tesseract_rec_with_boxes(data_dict)
+    page_sink = MemorySink()
+    package_table = analyze_data_dict(data_dict, cfg_json, sink=page_sink, page_num=page_idx + 1, layout=layout,
+                                      verbose=verbose)
+
+    if package_table is not None and extract_pdf and ocr_entry["pdf"] is None:
+        # searchable pdf of a page whose table region only was recognized : page image with words of table region,
+        # without OCR of whole page
+        ocr_entry["pdf"] = get_searchable_pdf_page(recognition_img, data_dict, dpi=dpi)
+    if package_table is not None and temp_image_path:
+        recognition_img.save(temp_image_path, 'png')
+    return get_page_result(page_idx, page_sink, ocr_entry["pdf"],
+                           decode_hocr(ocr_entry["hocr"]) if ocr_entry["hocr"] is not None else None)
+
+
+def recognize_cached_page(page_idx, ocr_entry, cfg_json, dpi=REFERENCE_DPI, layout=None, verbose=0):
+    """
+    recognition of one page already recognized by OCR (no rendering nor OCR), result is the same as recognize_page
+    :param page_idx: index of page in document (starting from 0)
+    :param ocr_entry: OCR cache entry of page (dictionary with keys data, pdf, hocr and dpi)
+    :param cfg_json: json of configuration for this type of document
+    :param dpi: resolution of page image if it is not given by entry
+    :param layout: DocumentLayout of document or None
+    :param verbose: verbose mode
+    :return: page result (see get_page_result)
+    """
+    if verbose:
+        print("page {} recognized from OCR cache".format(page_idx + 1))
+    cfg_json = scale_config(cfg_json, ocr_entry.get("dpi") or dpi)
+    data_dict = ocr_entry["data"]
+    update_tesseract_rec_with_boxes(data_dict)
+    page_sink = MemorySink()
+    analyze_data_dict(data_dict, cfg_json, sink=page_sink, page_num=page_idx + 1, layout=layout, verbose=verbose)
+    return get_page_result(page_idx, page_sink, ocr_entry["pdf"],
+                           decode_hocr(ocr_entry["hocr"]) if ocr_entry["hocr"] is not None else None)
+
+
+def recognize_text_layer_page(page_idx, data_rec, pdf_path, cfg_json, extract_pdf=True, extract_hocr=True,
+                              dpi=REFERENCE_DPI, layout=None, verbose=0):
+    """
+    recognition of one page from its text layer (no OCR), result is the same as recognize_page
+    :param page_idx: index of page in document (starting from 0)
+    :param data_rec: recognition data created from text layer (mining_pdf.get_text_layer_data_rec)
+    :param pdf_path: path of pdf file, its page is copied in searchable pdf (it has already a text layer)
+    :param cfg_json: json of configuration for this type of document
+    :param extract_pdf: give pdf page if a table is found
+    :param extract_hocr: compute hocr page if a table is found
+    :param dpi: resolution used to create recognition data
+    :param layout: DocumentLayout of document or None
+    :param verbose: verbose mode
+    :return: page result (see get_page_result)
+    """
+    if verbose:
+        print("page {} recognized from its text layer".format(page_idx + 1))
+    cfg_json = scale_config(cfg_json, dpi)
+    update_tesseract_rec_with_boxes(data_rec)
+    page_sink = MemorySink()
+    package_table = analyze_data_dict(data_rec, cfg_json, sink=page_sink, page_num=page_idx + 1, layout=layout,
+                                      verbose=verbose)
+    if package_table is None:
+        return get_page_result(page_idx)
+
+    cur_pdf = cur_hocr = None
+    if extract_pdf:
+        pdf_writer = PdfFileWriter()
+        pdf_buffer = BytesIO()
+        with open(pdf_path, 'rb') as f:
+            pdf_writer.addPage(PdfFileReader(f).getPage(page_idx))
+            pdf_writer.write(pdf_buffer)
+        cur_pdf = pdf_buffer.getvalue()
+    if extract_hocr:
+        cur_hocr = get_hocr_from_data_rec(data_rec)
+    return get_page_result(page_idx, page_sink, cur_pdf, cur_hocr)
+
+
+def use_text_layer(cfg_json):
+    """
+    :param cfg_json: json of configuration for this type of document
+    :return: True if pages with a usable text layer are recognized without OCR (default)
+    """
+    return bool(cfg_json) and cfg_json.get("text_layer", True)
+
+
+def generate_pages_sources(pdf_path, nb_pages, cfg_json, dpi=300, page_numbers=None, ocr_cache=None,
+                           document_key=None, extract_pdf=True, extract_hocr=True, verbose=0):
+    """
+    generator of what is known of pages before rendering them
+    :param pdf_path: path of pdf file
+    :param nb_pages: number of pages of document
+    :param cfg_json: json of configuration for this type of document
+    :param dpi: resolution of pages pixels
+    :param page_numbers: list of indexes of pages (starting from 0) to consider (all pages if None)
+    :param ocr_cache: OcrCache object or None
+    :param document_key: key of document in OCR cache
+    :param extract_pdf: searchable pdf page is needed
+    :param extract_hocr: hocr page is needed
+    :param verbose: verbose mode
+    :return: yields for each page a tuple ("text_layer", recognition data) or ("ocr_cache", cache entry),
+             or None if page must be rendered and recognized
+    """
+    if use_text_layer(cfg_json):
+        text_layers = generate_text_layers(pdf_path, nb_pages, dpi=dpi, cfg_json=cfg_json, page_numbers=page_numbers,
+                                           verbose=verbose)
+    else:
+        text_layers = repeat(None)
+    for page_idx, text_rec in zip(range(nb_pages) if page_numbers is None else page_numbers, text_layers):
+        if text_rec is not None:
+            yield "text_layer", text_rec
+            continue
+        ocr_entry = None
+        if ocr_cache and document_key:
+            ocr_entry = ocr_cache.get_page(document_key, page_idx, pdf=extract_pdf, hocr=extract_hocr)
+        yield ("ocr_cache", ocr_entry) if ocr_entry is not None else None
+
+
+def is_recognition_too_poor(page_result, cfg_json):
+    """
+    :param page_result: page result (see get_page_result)
+    :param cfg_json: json of configuration for this type of document
+    :return: True if no table is found or if mean confidence of its words is below config key min_table_conf
+             (default 60)
+    """
+    if not page_result["info_found"]:
+        return True
+    min_conf = cfg_json.get("min_table_conf", 60)
+    for (_, package_table) in page_result["tables"]:
+        mean_conf = package_table.get_mean_conf()
+        if mean_conf is None or mean_conf < min_conf:
+            return True
+    return False
+
+
+def recognize_document_page(page_idx, img, page_source, pdf_path, cfg_json, extract_pdf=True, extract_hocr=True,
+                            temp_image_path=None, ocr_cache=None, document_key=None, layout=None, verbose=0):
+    """
+    recognition of a page from what is known of it (see generate_pages_sources) or from its image,
+    in adaptive mode (config key low_dpi) pages recognized too poorly at low resolution are rendered again at dpi,
+    page is traced (see instrumentation.Tracer.page)
+    :param img: PIL image of page rendered at get_render_dpi(cfg_json)
+    :param layout: DocumentLayout of document or None, pages must be given in order while it is not frozen
+    :return: page result (see get_page_result)
+    """
+    page_result = _recognize_document_page(page_idx, img, page_source, pdf_path, cfg_json, extract_pdf=extract_pdf,
+                                           extract_hocr=extract_hocr, temp_image_path=temp_image_path,
+                                           ocr_cache=ocr_cache, document_key=document_key, layout=layout,
+                                           verbose=verbose)
+    if layout is not None:
+        layout.end_page()
+    return page_result
+
+
+def _recognize_document_page(page_idx, img, page_source, pdf_path, cfg_json, extract_pdf, extract_hocr,
+                             temp_image_path, ocr_cache, document_key, layout, verbose):
+    with get_tracer().page(page_idx):
+        dpi = get_dpi(cfg_json)
+        if page_source is None:
+            render_dpi = get_render_dpi(cfg_json)
+            page_result = recognize_page(page_idx, img, cfg_json, extract_pdf=extract_pdf, extract_hocr=extract_hocr,
+                                         temp_image_path=temp_image_path, ocr_cache=ocr_cache,
+                                         document_key=document_key, dpi=render_dpi, layout=layout, verbose=verbose)
+            if render_dpi != dpi and cfg_json and is_recognition_too_poor(page_result, cfg_json):
+                if verbose:
+                    print("page {} recognized again at {} dpi".format(page_idx + 1, dpi))
+                img = render_page(pdf_path, page_idx, dpi=dpi, grayscale=True)
+                page_result = recognize_page(page_idx, img, cfg_json, extract_pdf=extract_pdf,
+                                             extract_hocr=extract_hocr, temp_image_path=temp_image_path,
+                                             ocr_cache=ocr_cache,
+                                             document_key=document_key, dpi=dpi, layout=layout, verbose=verbose)
+            return page_result
+        elif page_source[0] == "text_layer":
+            return recognize_text_layer_page(page_idx, page_source[1], pdf_path, cfg_json, extract_pdf=extract_pdf,
+                                             extract_hocr=extract_hocr, dpi=dpi, layout=layout, verbose=verbose)
+        else:
+            return recognize_cached_page(page_idx, page_source[1], cfg_json, dpi=dpi, layout=layout, verbose=verbose)
+
+
+# context of worker processes, set once by init_page_worker
+_page_worker_context = {}
+
+
+def recognize_single_page(page_idx, pdf_path, nb_pages, cfg_json, dpi=300, extract_pdf=True, extract_hocr=True,
+                          temp_image_path=None, ocr_cache=None, document_key=None, layout=None, verbose=0):
+    """
+    recognition of one page of a document : page is read or rendered alone (see recognize_document_page)
+    :param page_idx: index of page in document (starting from 0)
+    :param pdf_path: path of pdf file
+    :param nb_pages: number of pages of document
+    :param dpi: resolution of pages pixels (see get_dpi)
+    :return: page result (see get_page_result)
+    """
+    page_source = next(generate_pages_sources(pdf_path, nb_pages, cfg_json, dpi=dpi, page_numbers=[page_idx],
+                                              ocr_cache=ocr_cache, document_key=document_key,
+                                              extract_pdf=extract_pdf, extract_hocr=extract_hocr, verbose=verbose))
+    img = render_page(pdf_path, page_idx, dpi=get_render_dpi(cfg_json), grayscale=True) \
+        if page_source is None else None
+    return recognize_document_page(page_idx, img, page_source, pdf_path, cfg_json, extract_pdf=extract_pdf,
+                                   extract_hocr=extract_hocr, temp_image_path=temp_image_path, ocr_cache=ocr_cache,
+                                   document_key=document_key, layout=layout, verbose=verbose)
+
+
+def init_page_worker(pdf_path, nb_pages, cfg_json, dpi, extract_pdf, extract_hocr, temp_image_path, ocr_cache,
+                     document_key, layout, tracer, ocr_backend, verbose):
+    """
+    initializer of page worker processes : keep document information for all pages tasks
+    :param temp_image_path: recognition image of document, each page is saved in its own file next to it
+    :param layout: frozen DocumentLayout of document or None
+    """
+    init_worker_process(ocr_backend, tracer)
+    tracer.document = os.path.basename(pdf_path)
+    _page_worker_context.update({"pdf_path": pdf_path, "nb_pages": nb_pages, "cfg_json": cfg_json, "dpi": dpi,
+                                 "extract_pdf": extract_pdf, "extract_hocr": extract_hocr,
+                                 "temp_image_path": temp_image_path, "ocr_cache": ocr_cache,
+                                 "document_key": document_key, "layout": layout, "verbose": verbose})
+
+
+def recognize_page_task(page_idx):
+    """
+    task of page worker processes : page is read or rendered inside the worker so that no image is sent between
+    processes
+    :param page_idx: index of page in document (starting from 0)
+    :return: page result (see get_page_result) with keys trace (records of stages of page, see Tracer.pop_records)
+             and temp_image_path (recognition image of page if a table is found, else None)
+    """
+    ctx = dict(_page_worker_context)
+    temp_root, temp_ext = os.path.splitext(ctx.pop("temp_image_path"))
+    page_temp_path = '{}_p{}{}'.format(temp_root, page_idx + 1, temp_ext)
+    if os.path.exists(page_temp_path):
+        os.remove(page_temp_path)
+    page_result = recognize_single_page(page_idx, temp_image_path=page_temp_path, **ctx)
+    page_result["temp_image_path"] = page_temp_path if os.path.exists(page_temp_path) else None
+    page_result["trace"] = get_tracer().pop_records()
+    return page_result
+
+
+def process_document(root_file, cfg_json, jobs=1, chunk_size=4, extract_pdf=True, extract_hocr=True, ocr_cache=None,
+                     sink=None, pdf_path=None, verbose=0):
+    """
+    recognition of all pages of a pdf document, outputs are written next to the input file
+    pages results are assembled in page order whatever the number of jobs, and they do not depend on it : with more
+    than one job, headers templates are learnt on first pages by current process before pages are given to workers
+    (see headers.DocumentLayout)
+    :param root_file: pdf filename without extension
+    :param cfg_json: json of configuration for this type of document
+    :param jobs: number of worker processes (1 means pages are computed in current process)
+    :param chunk_size: number of pages rendered at once in sequential mode
+    :param extract_pdf: write searchable pdf of pages with a table
+    :param extract_hocr: write hocr html file of pages with a table
+    :param ocr_cache: OcrCache object or None (no cache)
+    :param sink: ResultSink object given tables in page order (default tables are printed), it is not closed
+    :param pdf_path: path of pdf file when its extension is not .pdf (ex: .PDF), default <root_file>.pdf
+    :param verbose: verbose mode
+    :return: dictionary of statistics (nb_pages, nb_tables)
+    :note: stages are traced with tracer of process (see instrumentation.set_tracer), also in worker processes,
+           images are recognized by OCR backend of process (see ocr.set_ocr_backend), also in worker processes
+    """
+    path = pdf_path or '{}.pdf'.format(root_file)
+    output_path_pdf = '{}_output.pdf'.format(root_file)
+    temp_image_path = '{}_temp.png'.format(root_file)
+    dpi = get_dpi(cfg_json)
+    nb_pages = get_nb_pages(path)
+    if sink is None:
+        sink = StdoutSink()
+    tracer = get_tracer()
+    tracer.document = os.path.basename(path)
+    document_key = None
+    if ocr_cache and cfg_json:
+        document_key = ocr_cache.get_document_key(path, cfg_json, dpi, 'fra')
+
+    layout = DocumentLayout() if use_document_layout(cfg_json) else None
+    if jobs > 1:
+        # workers are given the frozen layout so that headers of a page do not depend on pages given to its worker
+        first_results = []
+        while layout is not None and not layout.frozen and len(first_results) < nb_pages:
+            first_results.append(recognize_single_page(len(first_results), path, nb_pages, cfg_json, dpi=dpi,
+                                                       extract_pdf=extract_pdf, extract_hocr=extract_hocr,
+                                                       temp_image_path=temp_image_path, ocr_cache=ocr_cache,
+                                                       document_key=document_key, layout=layout, verbose=verbose))
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_page_worker,
+                                       initargs=(path, nb_pages, cfg_json, dpi, extract_pdf, extract_hocr,
+                                                 temp_image_path, ocr_cache, document_key, layout, tracer,
+                                                 get_ocr_backend(), verbose))
+        pages_results = chain(first_results, imap_ordered(executor, recognize_page_task,
+                                                          range(len(first_results), nb_pages), max_pending=2 * jobs))
+    else:
+        executor = None
+        pages_sources = generate_pages_sources(path, nb_pages, cfg_json, dpi=dpi, ocr_cache=ocr_cache,
+                                               document_key=document_key, extract_pdf=extract_pdf,
+                                               extract_hocr=extract_hocr, verbose=verbose)
+        pages_results = (recognize_document_page(np, img, page_source, path, cfg_json, extract_pdf=extract_pdf,
+                                                 extract_hocr=extract_hocr, temp_image_path=temp_image_path,
+                                                 ocr_cache=ocr_cache, document_key=document_key, layout=layout,
+                                                 verbose=verbose)
+                         for (np, img, page_source) in generate_document_pages(path, dpi=get_render_dpi(cfg_json),
+                                                                               chunk_size=chunk_size,
+                                                                               nb_pages=nb_pages,
+                                                                               pages_sources=pages_sources,
+                                                                               grayscale=True, verbose=verbose))
+
+    # searchable pdf is written as pages are found
+    output_pdf = IncrementalPdfWriter(output_path_pdf) if extract_pdf else None
+    nb_tables = 0
+    try:
+        for page_result in pages_results:
+            np = page_result["page_idx"]
+            print(" computed page {} of {}".format(np+1, nb_pages))
+            # stages of pages computed by workers
+            tracer.merge(page_result.pop("trace", []))
+            page_temp_path = page_result.pop("temp_image_path", None)
+            if page_temp_path:
+                # as in sequential mode, recognition image of last page with a table is kept
+                os.replace(page_temp_path, temp_image_path)
+            if not page_result["info_found"]:
+                continue
+            with tracer.stage("export", np):
+                for (page_num, package_table) in page_result["tables"]:
+                    nb_tables += 1
+                    sink.write_table(page_num, package_table)
+
+                if output_pdf and page_result["pdf"] is not None:
+                    # add page to searchable pdf
+                    output_pdf.add_page_from_bytes(page_result["pdf"])
+
+                # create html file from hocr
+                if page_result["hocr"] is not None:
+                    output_path_hocr = '{}_p{}.html'.format(root_file, np+1)
+                    with open(output_path_hocr, 'w') as f:
+                        f.write(page_result["hocr"])
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if output_pdf:
+            output_pdf.close()
+
+    if layout is not None and executor is None and verbose:
+        print("headers reused from document layout {} times, searched {} times".format(layout.nb_reused,
+                                                                                       layout.nb_searched))
+
+    return {"nb_pages": nb_pages, "nb_tables": nb_tables}
+
+
 if __name__ == '__main__':
     import argparse
 
     parser = argparse.ArgumentParser(description='Recognition of pdf file')
     parser.add_argument('-f', '--file', type=str, help='pdf filename without extension')
-    parser.add_argument('-c', '--config', type=str, help='config filename', default='')
+    parser.add_argument('-c', '--config', type=str, default='',
+                        help='config filename, auto : config of document is found among configs of --configs-dir')
+    parser.add_argument('--configs-dir', type=str, default=CONFIGS_DIR, help='directory of configs (with -c auto)')
+    parser.add_argument('--min-template-score', type=float, default=0.5,
+                        help='minimal part of headers of a config found in document (with -c auto)')
     parser.add_argument('-v', '--verbose', type=int, default=0, help='verbose mode')
+    parser.add_argument('--chunk-size', type=int, default=4, help='number of pages rendered at once')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes for pages')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help='directory of OCR cache')
+    parser.add_argument('--cache-size', type=int, default=2048, help='maximal size of OCR cache in MB')
+    parser.add_argument('--no-cache', action='store_true', help='do not use OCR cache')
+    parser.add_argument('--clear-cache', action='store_true', help='remove all OCR cache entries before recognition')
+    parser.add_argument('--output-format', type=str, default='stdout', choices=OUTPUT_FORMATS,
+                        help='format of tables output')
+    parser.add_argument('--output', type=str, default='',
+                        help='tables output filename (default <file>_tables.<csv|jsonl|sqlite>)')
+    parser.add_argument('--trace', type=str, default='',
+                        help='stages of pages are timed and written in this JSON lines file, summary is printed')
+    parser.add_argument('--profile-page', type=int, default=0,
+                        help='number of page (starting from 1) profiled with cProfile (written next to trace file)')
+    parser.add_argument('--ocr-backend', type=str, default='auto', choices=OCR_BACKEND_NAMES,
+                        help='cli : tesseract program run for each image, tesserocr : tesseract engine kept in process'
+                             ' (auto : tesserocr if it is installed)')
 
     args = parser.parse_args()
     verbose = args.verbose
     config_filename = args.config
-    config_json = get_config_info(config_filename)
-    extract_pdf = True
-    extract_hocr = True
 
     if args.file.endswith(".pdf"):
         root_file = args.file[0:-4]
     else:
         root_file = args.file
-    path = '{}.pdf'.format(root_file)
-    output_path_pdf = '{}_output.pdf'.format(root_file)
-    temp_image_path = '{}_temp.png'.format(root_file)
-    info = extract_information(path)
-
-    images_list = convert_from_path(path, dpi=300)
-
-    output_pdf = PdfFileWriter()
-    output_hocr = []
-    for (np, img) in enumerate(images_list):
-        print(" computing page {} of {}".format(np+1, len(images_list)))
-        # rotate image if necessary
-        if "orientation" in config_json:
-            width, height = img.size
-            if (width < height and config_json["orientation"] == 'landscape') or\
-                (width > height and config_json["orientation"] == 'portrait'):
-                angle = 90
-                img = img.rotate(angle, expand=True)
-        #img = img.convert("L")
-
-        #rotated.save(temp_image_path, 'ppm')
-        #print(pytesseract.image_to_osd(temp_image_path, lang='fra', output_type=pytesseract.Output.DICT))
-
-        # create tesseract data buffer
-        data_dict = pytesseract.image_to_data(img, lang='fra', output_type=pytesseract.Output.DICT)
-        update_tesseract_rec_with_boxes(data_dict)
-        info_found = False
-        if config_json:
-            recognition_img = image_improvement(img, data_dict, config_json)
-            data_dict = pytesseract.image_to_data(recognition_img, lang='fra', output_type=pytesseract.Output.DICT)
-            #import json
-            #json.dump(data_rec, open("/Users/stephane/workarea/Pickare/BTL/documents/tests/data_rec.json", "w"))
-
-            update_tesseract_rec_with_boxes(data_dict)
-            info_found = analyze_data_dict(data_dict, config_json, verbose)
-
-        if info_found:
-            recognition_img.save(temp_image_path, 'png')
-
-        if info_found and extract_pdf:
-            cur_pdf = pytesseract.image_to_pdf_or_hocr(recognition_img, extension='pdf', lang='fra',
-                                        config='./configs/pdf')
-            # add page to searchable pdf
-            tmp_pdf_file = NamedTemporaryFile()
-            with open(tmp_pdf_file.name, 'w+b') as f:
-                f.write(cur_pdf)
-                pdf_reader = PdfFileReader(tmp_pdf_file.name)
-                output_pdf.addPage(pdf_reader.getPage(0))
-
-        # create html file from hocr
-        if info_found and extract_hocr:
-            cur_hocr = pytesseract.image_to_pdf_or_hocr(recognition_img, extension='hocr', lang='fra',
-                                        config='./configs/hocr')
-            output_path_hocr = '{}_p{}.html'.format(root_file, np+1)
-            with open(output_path_hocr, 'w') as f:
-                f.write(cur_hocr.decode('utf-8').replace('\\n', '\n').replace('\\t', '\t'))
-
-    # Write out the searchable PDF
-    if extract_pdf:
-        with open(output_path_pdf, 'wb') as out:
-            output_pdf.write(out)
\ No newline at end of file
+    info = extract_information('{}.pdf'.format(root_file))
+    set_ocr_backend(create_ocr_backend(args.ocr_backend))
+
+    ocr_cache = None
+    if args.clear_cache or not args.no_cache:
+        ocr_cache = OcrCache(args.cache_dir, max_size=args.cache_size * 1024 * 1024, verbose=verbose)
+        if args.clear_cache:
+            ocr_cache.clear()
+        if args.no_cache:
+            ocr_cache = None
+
+    tracer = None
+    if args.trace or args.profile_page:
+        tracer = Tracer(args.trace, profile_page=args.profile_page - 1 if args.profile_page else None)
+        set_tracer(tracer)
+
+    if config_filename == "auto":
+        from registry import ConfigRegistry
+        registry = ConfigRegistry.from_dir(args.configs_dir, min_score=args.min_template_score, verbose=verbose)
+        config_name, template_score = registry.classify_document('{}.pdf'.format(root_file), verbose=verbose)
+        config_json = registry.configs.get(config_name)
+        if config_json is None:
+            print("unknown document template (best score {:.2f}), document is not recognized".format(template_score))
+        else:
+            print("document template : {} (score {:.2f})".format(config_name, template_score))
+    else:
+        config_json = get_config_info(config_filename)
+
+    if config_json is not None:
+        output_path = args.output or '{}_tables.{}'.format(root_file, args.output_format)
+        with create_sink(args.output_format, output_path, document=os.path.basename(root_file)) as sink:
+            process_document(root_file, config_json, jobs=args.jobs, chunk_size=args.chunk_size, ocr_cache=ocr_cache,
+                             sink=sink, verbose=verbose)
+
+    get_ocr_backend().close()
+    if tracer is not None:
+        tracer.close()
+        tracer.print_summary()
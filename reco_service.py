@@ -0,0 +1,364 @@
+"""
+Long running recognition service : configurations are loaded once and documents are recognized by a pool of warm
+worker processes (modules imported, configurations parsed, tesseract run once at start, with tesserocr backend
+its engine and language model are then kept in worker for all jobs)
+Jobs are sent over HTTP, on a TCP port or on a local Unix socket, with pdf bytes as request body, response gives
+tables (one record by cell, see sinks.CELL_FIELDS), searchable pdf and hocr pages of pages with a table
+
+usage :
+> python3 reco_service.py --port 8080 -j 4
+> python3 reco_service.py --unix-socket /tmp/reco.sock -j 4
+> curl --data-binary @document.pdf "http://localhost:8080/recognize?config=Hachette_config&pdf=1&hocr=0"
+> curl --unix-socket /tmp/reco.sock --data-binary @document.pdf "http://localhost/recognize?config=auto"
+> curl http://localhost:8080/metrics
+"""
+import base64
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse, parse_qs
+
+## local import
+from reco_pdf import process_document, recognize_image
+from registry import ConfigRegistry
+from sinks import CELL_FIELDS, MemorySink, get_table_records
+from ocr import CONFIGS_DIR, OCR_BACKEND_NAMES, create_ocr_backend
+from parallel import init_worker_process
+
+# quantiles of latencies given by metrics
+LATENCY_QUANTILES = [0.5, 0.9, 0.99]
+
+# context of worker processes, set once by init_service_worker
+_service_worker_context = {}
+
+
+def init_service_worker(registry, warm_up, ocr_backend, verbose):
+    """
+    initializer of service worker processes : configurations and OCR backend are kept for all jobs, tesseract is run
+    once so that its program and language data are loaded before first job
+    """
+    init_worker_process(ocr_backend)
+    _service_worker_context.update({"registry": registry, "verbose": verbose})
+    if warm_up:
+        from PIL import Image
+        try:
+            recognize_image(Image.new("L", (200, 60), 255), pdf=False, hocr=False)
+        except Exception as e:
+            print("ERROR : warm up of worker {} failed ({}: {})".format(os.getpid(), type(e).__name__, e))
+
+
+def recognize_document_task(pdf_bytes, config_name, extract_pdf=True, extract_hocr=True):
+    """
+    task of service worker processes : recognition of one document
+    :param pdf_bytes: content of pdf file
+    :param config_name: name of configuration in registry, auto to find it (see ConfigRegistry.classify_document)
+    :param extract_pdf: give searchable pdf of pages with a table
+    :param extract_hocr: give hocr pages of pages with a table
+    :return: dictionary with keys config, nb_pages, tables (list of records, one by cell), pdf (base64 string or
+             None), hocr (dictionary page number -> html string), time (seconds in worker) and error (None if no error)
+    """
+    ctx = _service_worker_context
+    registry = ctx["registry"]
+    result = {"config": config_name, "nb_pages": 0, "tables": [], "pdf": None, "hocr": {}, "time": 0., "error": None}
+    start = time.perf_counter()
+    log = StringIO()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir, redirect_stdout(log):
+            root_file = os.path.join(tmp_dir, "document")
+            with open(root_file + ".pdf", "wb") as f:
+                f.write(pdf_bytes)
+            if config_name == "auto":
+                config_name, score = registry.classify_document(root_file + ".pdf", verbose=ctx["verbose"])
+                result["config"] = config_name
+                if config_name is None:
+                    result["error"] = "unknown document template (best score {:.2f})".format(score)
+            if config_name is not None:
+                sink = MemorySink()
+                stats = process_document(root_file, registry.configs[config_name], extract_pdf=extract_pdf,
+                                         extract_hocr=extract_hocr, sink=sink, verbose=ctx["verbose"])
+                result["nb_pages"] = stats["nb_pages"]
+                for (page_num, table) in sink.tables:
+                    result["tables"] += [dict(zip(CELL_FIELDS, record))
+                                         for record in get_table_records(table, page_num)]
+                if extract_pdf and sink.tables and os.path.exists(root_file + "_output.pdf"):
+                    with open(root_file + "_output.pdf", "rb") as f:
+                        result["pdf"] = base64.b64encode(f.read()).decode("ascii")
+                for hocr_path in glob.glob(root_file + "_p*.html"):
+                    with open(hocr_path) as f:
+                        result["hocr"][int(hocr_path[len(root_file) + 2:-5])] = f.read()
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    if ctx["verbose"]:
+        print(log.getvalue())
+    result["time"] = time.perf_counter() - start
+    return result
+
+
+class RecognitionService:
+    """
+    pool of warm workers recognizing documents, with metrics of jobs
+    ...
+    Attributes
+    registry : ConfigRegistry of configurations loaded at start
+    executor : ProcessPoolExecutor of workers
+    nb_workers : number of worker processes
+    max_size : maximal size of a pdf document in bytes
+    nb_pending : number of jobs sent to workers and not finished (waiting for a worker or being recognized)
+    counts : dictionary status (ok, unknown, error) -> number of finished jobs
+    latencies : last latencies of jobs (seconds from request to result)
+    worker_times : last recognition times of jobs in workers
+
+    Methods
+    recognize : recognition of a document (blocking, may be called by many threads)
+    get_metrics : metrics in prometheus text format
+    close : stop workers
+    """
+    def __init__(self, registry, jobs=None, max_size=50 * 1024 * 1024, warm_up=True, history=1000, ocr_backend=None,
+                 verbose=0):
+        """
+        Constructor
+        :param registry: ConfigRegistry object
+        :param jobs: number of worker processes (default number of cores)
+        :param max_size: maximal size of a pdf document in bytes
+        :param warm_up: tesseract is run once by each worker at start
+        :param history: number of last jobs used for latency quantiles
+        :param ocr_backend: OcrBackend of workers (see ocr.create_ocr_backend), None for tesseract program
+        :param verbose: verbose mode
+        """
+        self.registry = registry
+        self.nb_workers = jobs or os.cpu_count() or 1
+        self.max_size = max_size
+        self.nb_pending = 0
+        self.counts = {"ok": 0, "unknown": 0, "error": 0}
+        self.latencies = deque(maxlen=history)
+        self.worker_times = deque(maxlen=history)
+        self._latency_sum = 0.
+        self._lock = threading.Lock()
+        self.executor = ProcessPoolExecutor(max_workers=self.nb_workers, initializer=init_service_worker,
+                                            initargs=(registry, warm_up, ocr_backend, verbose))
+        # workers are started now rather than at first job
+        for future in [self.executor.submit(os.getpid) for _ in range(self.nb_workers)]:
+            future.result()
+
+    def recognize(self, pdf_bytes, config_name, extract_pdf=True, extract_hocr=True):
+        """
+        :param pdf_bytes: content of pdf file
+        :param config_name: name of configuration in registry or auto
+        :param extract_pdf: give searchable pdf of pages with a table
+        :param extract_hocr: give hocr pages of pages with a table
+        :return: job result (see recognize_document_task) with key latency (seconds)
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self.nb_pending += 1
+        try:
+            result = self.executor.submit(recognize_document_task, pdf_bytes, config_name, extract_pdf,
+                                          extract_hocr).result()
+        except Exception as e:
+            # worker process died or pool is stopped
+            result = {"config": config_name, "nb_pages": 0, "tables": [], "pdf": None, "hocr": {}, "time": 0.,
+                      "error": "{}: {}".format(type(e).__name__, e)}
+        result["latency"] = time.perf_counter() - start
+        status = "ok" if result["error"] is None else ("unknown" if result["config"] is None else "error")
+        with self._lock:
+            self.nb_pending -= 1
+            self.counts[status] += 1
+            self.latencies.append(result["latency"])
+            self.worker_times.append(result["time"])
+            self._latency_sum += result["latency"]
+        return result
+
+    def get_metrics(self):
+        """
+        :return: metrics in prometheus text format : queue depth, running jobs, finished jobs by status,
+                 quantiles of latencies and of recognition times of last jobs
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+            worker_times = sorted(self.worker_times)
+            # jobs beyond number of workers wait in queue of pool
+            lines = ["# TYPE reco_queue_depth gauge",
+                     "reco_queue_depth {}".format(max(0, self.nb_pending - self.nb_workers)),
+                     "# TYPE reco_jobs_running gauge",
+                     "reco_jobs_running {}".format(min(self.nb_pending, self.nb_workers)),
+                     "# TYPE reco_workers gauge", "reco_workers {}".format(self.nb_workers),
+                     "# TYPE reco_jobs_total counter"]
+            lines += ['reco_jobs_total{{status="{}"}} {}'.format(status, nb) for status, nb in self.counts.items()]
+            nb_jobs = sum(self.counts.values())
+            latency_sum = self._latency_sum
+        for name, values in (("reco_job_latency_seconds", latencies), ("reco_job_worker_seconds", worker_times)):
+            lines.append("# TYPE {} summary".format(name))
+            for quantile in LATENCY_QUANTILES:
+                value = values[min(len(values) - 1, int(quantile * len(values)))] if values else float("nan")
+                lines.append('{}{{quantile="{}"}} {:.4f}'.format(name, quantile, value))
+        lines += ["reco_job_latency_seconds_sum {:.4f}".format(latency_sum),
+                  "reco_job_latency_seconds_count {}".format(nb_jobs)]
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP requests of service (server attribute service is a RecognitionService object) :
+    GET /health, GET /metrics, GET /configs, POST /recognize?config=<name|auto>&pdf=<0|1>&hocr=<0|1> with pdf bytes
+    """
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # no address for clients of Unix sockets
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, code, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send(200, {"status": "ok", "workers": service.nb_workers})
+        elif path == "/metrics":
+            self._send(200, service.get_metrics(), content_type="text/plain; version=0.0.4")
+        elif path == "/configs":
+            self._send(200, {"configs": sorted(service.registry.configs), "default": self.server.default_config})
+        else:
+            self._send(404, {"error": "unknown path {}".format(path)})
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        length_header = self.headers.get("Content-Length")
+        if length_header is None:
+            # body is not read, connection can not be reused
+            self.close_connection = True
+            self._send(411, {"error": "Content-Length header expected"})
+            return
+        try:
+            length = int(length_header)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self._send(400, {"error": "invalid Content-Length {}".format(length_header)})
+            return
+        if length > service.max_size:
+            # body is not read, connection can not be reused
+            self.close_connection = True
+            self._send(413, {"error": "document larger than {} bytes".format(service.max_size)})
+            return
+        pdf_bytes = self.rfile.read(length)
+        if url.path != "/recognize":
+            self._send(404, {"error": "unknown path {}".format(url.path)})
+            return
+        query = parse_qs(url.query)
+        config_name = query.get("config", [self.server.default_config])[0]
+        if config_name != "auto" and config_name not in service.registry.configs:
+            self._send(400, {"error": "unknown config {}".format(config_name)})
+            return
+        if not pdf_bytes:
+            self._send(400, {"error": "pdf document expected in request body"})
+            return
+        result = service.recognize(pdf_bytes, config_name, extract_pdf=query.get("pdf", ["1"])[0] != "0",
+                                   extract_hocr=query.get("hocr", ["1"])[0] != "0")
+        code = 200
+        if result["error"] is not None:
+            code = 422 if result["config"] is None else 500
+        self._send(code, result)
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """
+    HTTP server on a local Unix socket
+    """
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # client address of Unix sockets is empty, BaseHTTPRequestHandler expects a tuple
+        return request, ("unix", 0)
+
+
+def create_server(service, port=8080, host="127.0.0.1", unix_socket='', default_config="auto", verbose=0):
+    """
+    :param service: RecognitionService object
+    :param port: TCP port (not used with a Unix socket)
+    :param host: address of TCP server
+    :param unix_socket: path of Unix socket (replaced if it exists)
+    :param default_config: configuration of requests without config parameter
+    :param verbose: verbose mode (requests are logged)
+    :return: server object (serve_forever to run it)
+    """
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, ServiceRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.service = service
+    server.default_config = default_config
+    server.verbose = verbose
+    return server
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Recognition service')
+    parser.add_argument('--port', type=int, default=8080, help='TCP port')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='address of TCP server')
+    parser.add_argument('--unix-socket', type=str, default='', help='path of Unix socket (instead of TCP port)')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='number of worker processes (default number of cores)')
+    parser.add_argument('--configs-dir', type=str, default=CONFIGS_DIR, help='directory of configs')
+    parser.add_argument('-c', '--config', type=str, default='auto',
+                        help='config name of requests without config parameter (default auto)')
+    parser.add_argument('--min-template-score', type=float, default=0.5,
+                        help='minimal part of headers of a config found in document (config auto)')
+    parser.add_argument('--max-size', type=int, default=50, help='maximal size of a document in MB')
+    parser.add_argument('--no-warm-up', action='store_true', help='tesseract is not run at start of workers')
+    parser.add_argument('--ocr-backend', type=str, default='auto', choices=OCR_BACKEND_NAMES,
+                        help='cli : tesseract program run for each image, tesserocr : tesseract engine kept in workers'
+                             ' (auto : tesserocr if it is installed)')
+    parser.add_argument('-v', '--verbose', type=int, default=0, help='verbose mode')
+    args = parser.parse_args()
+
+    config_registry = ConfigRegistry.from_dir(args.configs_dir, min_score=args.min_template_score,
+                                              verbose=args.verbose)
+    reco_service = RecognitionService(config_registry, jobs=args.jobs, max_size=args.max_size * 1024 * 1024,
+                                      warm_up=not args.no_warm_up, ocr_backend=create_ocr_backend(args.ocr_backend),
+                                      verbose=args.verbose)
+    http_server = create_server(reco_service, port=args.port, host=args.host, unix_socket=args.unix_socket,
+                                default_config=args.config, verbose=args.verbose)
+    print("recognition service with {} workers and configs {} on {}".format(
+        reco_service.nb_workers, ", ".join(sorted(config_registry.configs)),
+        args.unix_socket or "http://{}:{}".format(args.host, args.port)))
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.server_close()
+        reco_service.close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
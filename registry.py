@@ -0,0 +1,141 @@
+"""
+Registry of configurations of all types of documents
+Configurations of a directory are loaded once and the search texts of headers of all of them are compiled in one
+HeaderMatcher : a document is classified with one pass over the words of its first page (text layer, or OCR of page
+rendered at low resolution), each configuration is scored by its headers found in these words
+and only the best one is used for recognition, documents whose best score is too low are unknown
+"""
+import glob
+import os
+
+# local imports
+from headers import HeaderMatcher
+from ocr import CONFIGS_DIR
+from pages import get_nb_pages, render_page
+from mining_pdf import generate_text_layers
+from instrumentation import trace_stage
+
+
+class ConfigRegistry:
+    """
+    configurations of types of documents, headers of all of them are compiled once
+    ...
+    Attributes
+    configs : dictionary name of configuration (filename without extension) -> json of configuration
+    owners : list of tuples (name of configuration, index of header in configuration) of compiled headers
+    matcher : HeaderMatcher of headers of all configurations
+    min_score : minimal score of a known type of document
+
+    Methods
+    from_dir : registry of all configuration files of a directory
+    score_data_rec : score of each configuration for recognition data of a page
+    classify_data_rec : best configuration for recognition data of a page
+    classify_document : best configuration for a pdf file
+    """
+    def __init__(self, configs, min_score=0.5):
+        """
+        Constructor
+        :param configs: dictionary name of configuration -> json of configuration (see reco_pdf.get_config_info)
+        :param min_score: minimal score of a known type of document (part of headers of configuration found)
+        """
+        self.configs = configs
+        self.min_score = min_score
+        self.owners = []
+        all_headers = []
+        for name, cfg_json in configs.items():
+            for cfg_idx, hdr in enumerate(cfg_json.get("headers", [])):
+                self.owners.append((name, cfg_idx))
+                all_headers.append(hdr)
+        self.matcher = HeaderMatcher(all_headers)
+
+    @classmethod
+    def from_dir(cls, configs_dir=CONFIGS_DIR, min_score=0.5, verbose=0):
+        """
+        :param configs_dir: directory of configuration files (*.json)
+        :param min_score: minimal score of a known type of document
+        :param verbose: verbose mode
+        :return: ConfigRegistry object, files that are not valid configurations are ignored
+        """
+        from reco_pdf import get_config_info
+        configs = {}
+        for cfg_filename in sorted(glob.glob(os.path.join(configs_dir, "*.json"))):
+            name = os.path.splitext(os.path.basename(cfg_filename))[0]
+            try:
+                cfg_json = get_config_info(cfg_filename)
+            except Exception as e:
+                print("ERROR : configuration {} is ignored ({}: {})".format(cfg_filename, type(e).__name__, e))
+                continue
+            if not cfg_json.get("headers"):
+                print("ERROR : configuration {} is ignored (no headers)".format(cfg_filename))
+                continue
+            configs[name] = cfg_json
+            if verbose:
+                print("configuration {} : {} headers".format(name, len(cfg_json["headers"])))
+        return cls(configs, min_score=min_score)
+
+    def score_data_rec(self, data_rec):
+        """
+        score of a configuration is the mean of match scores of its headers (0 for headers not found) in words
+        :param data_rec: recognition data of a page in tesseract format
+        :return: dictionary name of configuration -> score between 0 and 1
+        """
+        scores = {name: 0. for name in self.configs}
+        texts = [txt if lvl == 5 else "" for (lvl, txt) in zip(data_rec["level"], data_rec["text"])]
+        for (name, _), words in zip(self.owners, self.matcher.match_words(texts)):
+            if words:
+                scores[name] += max(words.values())
+        for name in scores:
+            scores[name] /= len(self.configs[name]["headers"])
+        return scores
+
+    def classify_data_rec(self, data_rec):
+        """
+        :param data_rec: recognition data of a page in tesseract format
+        :return: tuple (name of best configuration or None if its score is below min_score, best score)
+        """
+        return self._get_best(self.score_data_rec(data_rec))
+
+    def _get_best(self, scores):
+        if not scores:
+            return None, 0.
+        name = max(scores, key=scores.get)
+        return (name if scores[name] >= self.min_score else None), scores[name]
+
+    def _recognize_page(self, pdf_path, page_idx, dpi):
+        """
+        :return: generator of recognition data of page rendered at dpi, one by orientation of configurations
+        """
+        from reco_pdf import rotate_to_orientation, recognize_image
+        img = render_page(pdf_path, page_idx, dpi=dpi, grayscale=True)
+        orientations = sorted(set(cfg_json.get("orientation", "") for cfg_json in self.configs.values()))
+        for orientation in orientations:
+            oriented_img = rotate_to_orientation(img, {"orientation": orientation} if orientation else {})
+            yield recognize_image(oriented_img, pdf=False, hocr=False)["data"]
+
+    def classify_document(self, pdf_path, max_pages=2, dpi=150, nb_pages=None, verbose=0):
+        """
+        pages are read until one is known : from their text layer if it is usable, otherwise from OCR of page
+        rendered at low resolution (in each orientation of configurations)
+        :param pdf_path: path of pdf file
+        :param max_pages: maximal number of pages read
+        :param dpi: resolution of rendered pages
+        :param nb_pages: number of pages of the document (computed with pdfinfo if not given)
+        :param verbose: verbose mode
+        :return: tuple (name of configuration or None if document is unknown, best score)
+        """
+        best_scores = {}
+        with trace_stage("classify", 0, document=os.path.basename(pdf_path)):
+            if nb_pages is None:
+                nb_pages = get_nb_pages(pdf_path)
+            page_numbers = list(range(min(max_pages, nb_pages)))
+            text_layers = generate_text_layers(pdf_path, nb_pages, dpi=dpi, page_numbers=page_numbers)
+            for page_idx, text_rec in zip(page_numbers, text_layers):
+                pages_recs = [text_rec] if text_rec is not None else self._recognize_page(pdf_path, page_idx, dpi)
+                for data_rec in pages_recs:
+                    for name, score in self.score_data_rec(data_rec).items():
+                        best_scores[name] = max(score, best_scores.get(name, 0.))
+                    if verbose:
+                        print("page {} scores : {}".format(page_idx + 1, best_scores))
+                    if self._get_best(best_scores)[0] is not None:
+                        return self._get_best(best_scores)
+        return self._get_best(best_scores)
@@ -0,0 +1,172 @@
+"""
+Recognition of the package table region only (region of interest)
+Headers are first searched on a downscaled copy of the page, then only the table region below them is recognized:
+columns without a specific tesseract configuration in one crop (with the header row), columns sharing a specific
+configuration (for example a digits whitelist) in one image where their strips are pasted side by side.
+Recognized positions are mapped back to page coordinates, so that table analysis is the same as for a full page.
+"""
+from PIL import Image, ImageDraw
+
+# local imports
+from box import update_tesseract_rec_with_boxes
+from headers import search_headers
+from rec_frame import DATA_REC_KEYS, RecognitionFrame
+
+# offset of block numbers between recognized images, lines of different images are never merged
+BLOCK_NUM_OFFSET = 1000
+# white gap between pasted column strips
+STRIPS_GAP = 20
+
+
+def use_roi_ocr(cfg_json):
+    """
+    :param cfg_json: json of configuration for this type of document
+    :return: True if only table region is recognized (config key roi_ocr, default False)
+    """
+    return bool(cfg_json) and cfg_json.get("roi_ocr", False)
+
+
+def scale_data_rec(data_rec, factor):
+    """
+    scale positions of recognition data in place
+    :param data_rec: data dictionary in pytesseract Output.DICT format (without boxes)
+    :param factor: scale factor
+    :return: nothing
+    """
+    for key in ("left", "top", "width", "height"):
+        data_rec[key] = [int(round(val * factor)) for val in data_rec[key]]
+
+
+def search_headers_low_res(img, cfg_json, recognize, reduce_factor=2, verbose=0):
+    """
+    search headers on a downscaled copy of page
+    :param img: PIL image of page (ready for recognition)
+    :param cfg_json: json of configuration for this type of document
+    :param recognize: function (image, tesseract config) -> data dictionary in pytesseract Output.DICT format
+    :param reduce_factor: integer downscale factor of page
+    :param verbose: verbose mode
+    :return: list of headers (see headers.search_headers) with boxes in page coordinates, resized as columns
+    """
+    small_img = img.reduce(reduce_factor) if reduce_factor > 1 else img
+    data_rec = recognize(small_img, '')
+    if not data_rec.get("level"):
+        return []
+    scale_data_rec(data_rec, reduce_factor)
+    update_tesseract_rec_with_boxes(data_rec)
+    return search_headers(data_rec, cfg_json, resize_hdr=True, verbose=verbose)
+
+
+def get_table_region(headers_list, page_size, margin=10):
+    """
+    :param headers_list: list of headers with boxes in page coordinates
+    :param page_size: (width, height) of page
+    :param margin: margin around headers (pixels)
+    :return: tuple (top, bottom of headers row, left, right) of table region, None if no header has a box
+    """
+    boxes = [hdr["box"] for hdr in headers_list if "box" in hdr]
+    if not boxes:
+        return None
+    width, height = page_size
+    top = max(0, min(b.top for b in boxes) - margin)
+    headers_bottom = min(height - 1, max(b.bottom for b in boxes))
+    left = max(0, min(b.left for b in boxes) - margin)
+    right = min(width - 1, max(b.right for b in boxes) + margin)
+    return top, headers_bottom, left, right
+
+
+def get_columns_groups(headers_list, cfg_json):
+    """
+    group columns by their tesseract configuration (ConfigHeader.tesseract_config)
+    :param headers_list: list of headers found (see headers.search_headers)
+    :param cfg_json: json of configuration for this type of document
+    :return: dictionary tesseract config -> list of headers with a box, only for specific configurations
+    """
+    groups = {}
+    for hdr in headers_list:
+        config = cfg_json["headers"][hdr["cfg_index"]].tesseract_config
+        if config and "box" in hdr:
+            groups.setdefault(config, []).append(hdr)
+    return groups
+
+
+def add_mapped_data_rec(page_rec, data_rec, strips, block_offset):
+    """
+    append recognition data of an image to page recognition data, positions are mapped to page coordinates
+    :param page_rec: page data dictionary in pytesseract Output.DICT format, modified in place
+    :param data_rec: data dictionary of recognized image
+    :param strips: list of tuples (image left, image right, page x offset, page y offset) : an object whose left
+                   position is in [image left, image right] is moved by offsets
+    :param block_offset: offset added to block numbers
+    :return: nothing
+    """
+    for idx, level in enumerate(data_rec.get("level", [])):
+        if level == 1:
+            # page of image
+            continue
+        left = data_rec["left"][idx]
+        dx = dy = None
+        for (img_left, img_right, x_offset, y_offset) in strips:
+            if img_left <= left <= img_right:
+                dx, dy = x_offset, y_offset
+                break
+        if dx is None:
+            # object in gap between strips
+            continue
+        for key in DATA_REC_KEYS:
+            val = data_rec[key][idx]
+            if key == "left":
+                val += dx
+            elif key == "top":
+                val += dy
+            elif key == "block_num":
+                val += block_offset
+            elif key == "page_num":
+                val = 1
+            page_rec[key].append(val)
+
+
+def recognize_table_region(img, headers_list, cfg_json, recognize, margin=10, verbose=0):
+    """
+    recognition of table region below headers
+    :param img: PIL image of page (ready for recognition)
+    :param headers_list: list of headers with boxes in page coordinates (see search_headers_low_res)
+    :param cfg_json: json of configuration for this type of document
+    :param recognize: function (image, tesseract config) -> data dictionary in pytesseract Output.DICT format
+    :param margin: margin around headers (pixels)
+    :param verbose: verbose mode
+    :return: RecognitionFrame in page coordinates, None if no header has a box
+    """
+    region = get_table_region(headers_list, img.size, margin=margin)
+    if region is None:
+        return None
+    top, headers_bottom, left, right = region
+    width, height = img.size
+    page_rec = {key: [] for key in DATA_REC_KEYS}
+    for key, val in zip(DATA_REC_KEYS, (1, 1, 0, 0, 0, 0, 0, 0, width, height, -1, "")):
+        page_rec[key].append(val)
+
+    groups = get_columns_groups(headers_list, cfg_json)
+    region_img = img.crop((left, top, right + 1, height))
+    draw = ImageDraw.Draw(region_img)
+    strips_height = height - headers_bottom - 1
+    for group_idx, (config, group) in enumerate(groups.items()):
+        # columns of group are recognized with their configuration only
+        strips = []
+        img_left = 0
+        for hdr in group:
+            col_left, col_right = max(0, hdr["box"].left), min(width - 1, hdr["box"].right)
+            draw.rectangle((col_left - left, headers_bottom + 1 - top, col_right - left, height - top), fill="white")
+            strips.append((img_left, img_left + col_right - col_left, col_left - img_left, headers_bottom + 1))
+            img_left += col_right - col_left + 1 + STRIPS_GAP
+        group_img = Image.new(img.mode, (img_left - STRIPS_GAP, strips_height), "white")
+        for (strip_left, strip_right, x_offset, _) in strips:
+            group_img.paste(img.crop((strip_left + x_offset, headers_bottom + 1, strip_right + x_offset + 1, height)),
+                            (strip_left, 0))
+        if verbose:
+            print("columns {} recognized with config {}".format([hdr["name"] for hdr in group], config))
+        add_mapped_data_rec(page_rec, recognize(group_img, config), strips, (group_idx + 1) * BLOCK_NUM_OFFSET)
+
+    if verbose:
+        print("table region recognized : {}".format(region))
+    add_mapped_data_rec(page_rec, recognize(region_img, ''), [(0, right - left, left, top)], 0)
+    return RecognitionFrame(page_rec)
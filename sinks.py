@@ -0,0 +1,186 @@
+"""
+Sinks of package tables found in pages
+A sink is given each page table once (write_table) and writes its cells as they are produced,
+one record by cell with page number, row and column indexes, text, confidence and box
+"""
+import csv
+import json
+import sqlite3
+
+# fields of a cell record
+CELL_FIELDS = ["document", "page", "row", "column", "header", "text", "conf", "top", "bottom", "left", "right"]
+
+
+def get_table_records(table, page_num, document=""):
+    """
+    records of cells of a package table (header row is not given)
+    :param table: Table object
+    :param page_num: number of page of table (starting from 1)
+    :param document: name of document
+    :return: yields a tuple of CELL_FIELDS values for each not empty cell
+    """
+    headers = [str(cell) if cell else "" for cell in table.rows[0].cells] if table.rows else []
+    for row_idx, row in enumerate(table.rows[1:], start=1):
+        for col_idx, cell in enumerate(row.cells):
+            if not cell:
+                continue
+            header = headers[col_idx] if col_idx < len(headers) else ""
+            yield (document, page_num, row_idx, col_idx, header, str(cell), round(cell.score, 2),
+                   cell.box.top, cell.box.bottom, cell.box.left, cell.box.right)
+
+
+class ResultSink:
+    """
+    Base class of sinks
+    ...
+    Attributes
+    document : name of document given in records
+
+    Methods
+    write_table : called once for each page with a table
+    close : called once at end of recognition
+    """
+    def __init__(self, document=""):
+        self.document = document
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write_table(self, page_num, table):
+        """
+        :param page_num: number of page of table (starting from 1)
+        :param table: Table object
+        :return: nothing
+        """
+        raise NotImplementedError
+
+    def close(self):
+        return
+
+
+class StdoutSink(ResultSink):
+    """
+    tables are printed in csv format (historical output)
+    """
+    def __init__(self, document="", separator=";"):
+        super().__init__(document)
+        self.separator = separator
+
+    def write_table(self, page_num, table):
+        print("Package table found : ")
+        print(table.get_csv_string(separator=self.separator))
+        print("----------------")
+
+
+class MemorySink(ResultSink):
+    """
+    tables are kept in memory (list of tuples (page number, Table object)),
+    used to send tables found in a worker process to the sink of main process
+    """
+    def __init__(self, document=""):
+        super().__init__(document)
+        self.tables = []
+
+    def write_table(self, page_num, table):
+        self.tables.append((page_num, table))
+
+
+class CsvSink(ResultSink):
+    """
+    one csv line by cell
+    """
+    def __init__(self, path, document="", separator=";", buffer_size=1 << 20):
+        super().__init__(document)
+        self._file = open(path, 'w', newline='', encoding='utf-8', buffering=buffer_size)
+        self._writer = csv.writer(self._file, delimiter=separator)
+        self._writer.writerow(CELL_FIELDS)
+
+    def write_table(self, page_num, table):
+        self._writer.writerows(get_table_records(table, page_num, self.document))
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class JsonlSink(ResultSink):
+    """
+    one json object by cell and by line
+    """
+    def __init__(self, path, document="", buffer_size=1 << 20):
+        super().__init__(document)
+        self._file = open(path, 'w', encoding='utf-8', buffering=buffer_size)
+
+    def write_table(self, page_num, table):
+        self._file.writelines(json.dumps(dict(zip(CELL_FIELDS, record)), ensure_ascii=False) + "\n"
+                              for record in get_table_records(table, page_num, self.document))
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class SqliteSink(ResultSink):
+    """
+    cells are inserted in table cells of a sqlite database, by batches in one transaction
+    several processes can write in the same database
+    """
+    def __init__(self, path, document="", batch_size=1000, timeout=60.):
+        super().__init__(document)
+        self.batch_size = batch_size
+        self._records = []
+        self._connection = sqlite3.connect(path, timeout=timeout)
+        # readers and writers of other processes do not block each other
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS cells (document TEXT, page INTEGER, row INTEGER, "
+                                     "column INTEGER, header TEXT, text TEXT, conf REAL, top INTEGER, "
+                                     "bottom INTEGER, left INTEGER, right INTEGER)")
+
+    def write_table(self, page_num, table):
+        self._records.extend(get_table_records(table, page_num, self.document))
+        if len(self._records) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        insert buffered records in one transaction
+        :return: nothing
+        """
+        if self._records:
+            with self._connection:
+                self._connection.executemany("INSERT INTO cells VALUES ({})".format(
+                    ", ".join("?" * len(CELL_FIELDS))), self._records)
+            self._records = []
+
+    def close(self):
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+
+OUTPUT_FORMATS = ["stdout", "csv", "jsonl", "sqlite"]
+
+
+def create_sink(output_format="stdout", path=None, document=""):
+    """
+    :param output_format: one of stdout, csv, jsonl or sqlite
+    :param path: path of output file (not used for stdout)
+    :param document: name of document given in records
+    :return: ResultSink object
+    """
+    if output_format == "stdout":
+        return StdoutSink(document)
+    elif output_format == "csv":
+        return CsvSink(path, document)
+    elif output_format == "jsonl":
+        return JsonlSink(path, document)
+    elif output_format == "sqlite":
+        return SqliteSink(path, document)
+    else:
+        raise Exception("Output format {} NOT YET IMPLEMENTED".format(output_format))
@@ -1,5 +1,7 @@
 
-from box import BoxFormats, Box
+import numpy
+
+from box import BoxFormats, Box, SpatialIndex
 
 class Type:
     """
@@ -38,7 +40,7 @@ class Word:
         self.score = 0.0
 
         if "box" in info_dict:
-            self.box = Box(BoxFormats.BOX_CLASS, box_class=info_dict["box"])
+            self.box = info_dict["box"].copy()
         if "conf" in info_dict:
             self.score = float(info_dict["conf"])
         if "text" in info_dict:
@@ -61,13 +63,14 @@ class Cell:
         self.words = []
 
         if "box" in info_dict:
-            self.box = Box(BoxFormats.BOX_CLASS, box_class=info_dict["box"])
+            self.box = info_dict["box"].copy()
         if is_header:
             self.type = Type.HEADER
             self.value = info_dict["name"]  # force standard name, and not recognized
 
         self.words.append(Word(info_dict, Type.UNKNOWN))
         self.words.sort(key=lambda x: x.box.left)
+        self.update_score()
 
     def __str__(self):
         """
@@ -76,15 +79,15 @@ class Cell:
         if self.type == Type.HEADER:
             return "{self.value}".format(self=self)
         else:
-            rtn = ""
-            first = True
-            for w in self.words:
-                if first:
-                    first = False
-                else:
-                    rtn += " "
-                rtn += "{}".format(w.value)
-            return rtn
+            return " ".join("{}".format(w.value) for w in self.words)
+
+    def update_score(self):
+        """
+        score of a cell is the mean confidence of its recognized words (words without confidence are ignored)
+        :return: nothing
+        """
+        scores = [w.score for w in self.words if w.score >= 0]
+        self.score = sum(scores) / len(scores) if scores else 0.0
 
     def add_word(self, info_dict):
         """
@@ -96,6 +99,7 @@ class Cell:
         # next line should verify positions
         self.words.append(new_word)
         self.box.union(new_word.box)
+        self.update_score()
 
 
 class Line:
@@ -129,17 +133,7 @@ class Line:
         :param separator: separator to use between cells
         :return: a string with str value of each cell separated by separator
         """
-        out_csv = ""
-        first = True
-        for cell in self.cells:
-            if first:
-                first = False
-            else:
-                out_csv += separator
-            if cell:
-                out_csv += str(cell)
-
-        return out_csv
+        return separator.join(str(cell) if cell else "" for cell in self.cells)
 
 class Table:
     """Tables with headers
@@ -197,34 +191,76 @@ class Table:
         """
         return len(self.rows)
 
-    def search_rec_in_headed_columns(self, data_rec):
+    def search_rec_in_headed_columns(self, data_rec, spatial_index=None):
         """
         search for columns that contain recognised elements that are under headers
         :param data_rec: data recognition structure in tesseract format
-        :return: list of tuples (column index, list of recognition indices)
+        :param spatial_index: SpatialIndex of boxes of data_rec (built if not given)
+        :return: list of tuples (column index, list of recognition indices), one by column with recognised elements
         :note: recognised elements are accepted in a column if they are entirely contained in this column
         """
+        if spatial_index is None:
+            spatial_index = SpatialIndex.from_data_rec(data_rec)
         idx_col_rec = []
         headers_row = self.rows[0]
         header_bottom = headers_row.box.bottom
-        ind_rec_below = [idx for idx, box in enumerate(data_rec["box"]) if box.top >= header_bottom]
-        for ind_rec in ind_rec_below:
-            if not data_rec["text"][ind_rec]:
-                continue
-            rec_box = data_rec["box"][ind_rec]
-            for idx_col, col in enumerate(self.columns):
-                if col.box.left <= rec_box.left \
-                        and col.box.right >= rec_box.right:
-                    idx_col_rec.append((idx_col, [ind_rec]))
+        has_text = numpy.array([bool(txt) for txt in data_rec["text"]], dtype=bool)
+        below = (spatial_index.boxes.tops >= header_bottom) & has_text
+        for idx_col, col in enumerate(self.columns):
+            ind_rec = spatial_index.in_horizontal_range(col.box.left, col.box.right)
+            ind_rec = ind_rec[below[ind_rec]]
+            if len(ind_rec):
+                idx_col_rec.append((idx_col, ind_rec.tolist()))
         return idx_col_rec
 
-    def add_new_line_from_idx_rec(self, data_rec, idx_rec_list, is_row, verbose=0):
+    def get_column_of_box(self, rec_box):
+        """
+        :param rec_box: Box object of a recognised element
+        :return: index of column entirely containing box, -1 if there is none, -2 if there are several ones
+        """
+        cols = [idx_c for idx_c, col in enumerate(self.columns) if rec_box.left >= col.box.left and rec_box.right <= col.box.right]
+        if len(cols) == 1:
+            return cols[0]
+        return -1 if not cols else -2
+
+    def get_columns_of_rec(self, spatial_index):
+        """
+        :param spatial_index: SpatialIndex of boxes of recognition data
+        :return: numpy array of index of column entirely containing each recognised element, -1 if there is none,
+                 -2 if there are several ones
+        """
+        return spatial_index.get_intervals([(col.box.left, col.box.right) for col in self.columns])
+
+    def add_rows_from_lines(self, data_rec, horiz_lines, spatial_index=None, verbose=0):
+        """
+        add rows from horizontal lines, each recognised element is assigned to its line and its column in one pass
+        (same rows as add_new_line_from_idx_rec called for elements of each line)
+        :param data_rec: recognition structure in tesseract format
+        :param horiz_lines: list of disjoint lines sorted by top, each one is a tuple (top, bottom) in pixels
+        :param spatial_index: SpatialIndex of boxes of data_rec (built if not given)
+        :param verbose: verbose mode (int)
+        :return: nothing
+        """
+        if spatial_index is None:
+            spatial_index = SpatialIndex.from_data_rec(data_rec)
+        lines_of_rec = spatial_index.get_bands(horiz_lines)
+        columns_of_rec = self.get_columns_of_rec(spatial_index)
+        in_line = numpy.flatnonzero(lines_of_rec >= 0)
+        # stable sort keeps recognition order in each line
+        in_line = in_line[numpy.argsort(lines_of_rec[in_line], kind="stable")]
+        bounds = numpy.searchsorted(lines_of_rec[in_line], numpy.arange(len(horiz_lines) + 1))
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            self.add_new_line_from_idx_rec(data_rec, in_line[begin:end].tolist(), True, verbose=verbose,
+                                           columns_of_rec=columns_of_rec)
+
+    def add_new_line_from_idx_rec(self, data_rec, idx_rec_list, is_row, verbose=0, columns_of_rec=None):
         """
         add a new line in Table from a list of recognition indices
         :param data_rec: recognition structure in tesseract format
         :param idx_rec_list: list of indices to insert in new line
         :param is_row: is the line a row (boolean)
         :param verbose: verbose mode (int)
+        :param columns_of_rec: column of each recognised element (see get_columns_of_rec), searched if not given
         :return:
         """
         if is_row:
@@ -232,20 +268,19 @@ class Table:
             not_found_idx = []
             at_least_one = False
             for idx in idx_rec_list:
-                c_left = data_rec["box"][idx].left
-                c_right = data_rec["box"][idx].right
-                cols = [idx_c for idx_c, col in enumerate(self.columns) if c_left >= col.box.left and c_right <= col.box.right]
-                if len(cols) == 1:
+                col_idx = int(columns_of_rec[idx]) if columns_of_rec is not None else \
+                    self.get_column_of_box(data_rec["box"][idx])
+                if col_idx >= 0:
                     c_dict = {'conf': data_rec['conf'][idx], 'text': data_rec['text'][idx], 'box': data_rec['box'][idx]}
-                    if not cells_list_for_each_col[cols[0]]:
+                    if not cells_list_for_each_col[col_idx]:
                         n_cell = Cell(c_dict, False)
-                        cells_list_for_each_col[cols[0]] = n_cell
+                        cells_list_for_each_col[col_idx] = n_cell
                         at_least_one = True
                     else:
                         if verbose:
-                            print("position for text {} already found in cell {}".format(c_dict['text'], cells_list_for_each_col[cols[0]]))
-                        cells_list_for_each_col[cols[0]].add_word(c_dict)
-                elif len(cols) == 0:
+                            print("position for text {} already found in cell {}".format(c_dict['text'], cells_list_for_each_col[col_idx]))
+                        cells_list_for_each_col[col_idx].add_word(c_dict)
+                elif col_idx == -1:
                     not_found_idx.append(idx)
                 else:
                     print("ERROR : add_new_line_from_idx_rec : this should not arrive")
@@ -257,15 +292,17 @@ class Table:
             print("ERROR : add_new_line_from_idx_rec for columns is not yet implemented")
         return
 
+    def get_mean_conf(self):
+        """
+        :return: mean confidence of recognized words of table (header row excluded), None if there is no word
+        """
+        scores = [w.score for row in self.rows[1:] for cell in row.cells if cell for w in cell.words if w.score >= 0]
+        return sum(scores) / len(scores) if scores else None
+
     def get_csv_string(self, separator=","):
         """
         get csv string for a table object
         :param separator: separator to use in lines (default ,)
         :return: a string of csv lines separated by \n
         """
-        out_csv = ""
-
-        for row in self.rows:
-            out_csv += row.get_csv_string(separator)
-            out_csv += "\n"
-        return out_csv
+        return "".join(row.get_csv_string(separator) + "\n" for row in self.rows)
@@ -0,0 +1,65 @@
+import unittest
+import os
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+# local imports
+from batch_reco import get_pdf_files, get_output_path, get_file_result, print_batch_summary, process_batch
+
+
+class TestBatchReco(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def touch(self, filename):
+        path = os.path.join(self.tmp_dir.name, filename)
+        with open(path, "wb") as f:
+            f.write(b"%PDF-1.4\n")
+        return path
+
+    def test_pdf_files(self):
+        pdf_files = [self.touch(f) for f in ("a.pdf", "B.PDF", "c.Pdf")]
+        for f in ("a_output.pdf", "B_output.PDF", "notes.txt", "pdf", "a_reco.log"):
+            self.touch(f)
+        self.assertEqual(get_pdf_files(self.tmp_dir.name), sorted(pdf_files))
+        self.assertEqual(get_pdf_files(os.path.join(self.tmp_dir.name, "[aB]*")), sorted(pdf_files[:2]))
+        self.assertEqual(get_pdf_files(os.path.join(self.tmp_dir.name, "missing")), [])
+
+    def test_output_path(self):
+        self.assertIsNone(get_output_path("dir/doc", "stdout"))
+        self.assertEqual(get_output_path("dir/doc", "csv"), "dir/doc_tables.csv")
+        self.assertEqual(get_output_path("dir/doc", "jsonl", "all.db"), "dir/doc_tables.jsonl")
+        self.assertEqual(get_output_path("dir/doc", "sqlite"), "dir/doc_tables.sqlite")
+        self.assertEqual(get_output_path("dir/doc", "sqlite", "all.db"), "all.db")
+
+    def test_batch_summary(self):
+        files_results = [dict(get_file_result("a.pdf"), nb_pages=3, nb_tables=2, time=1., config="Hachette_config"),
+                         dict(get_file_result("B.PDF", "unknown document template (best score 0.10)"), config=None),
+                         dict(get_file_result("c.pdf"), nb_pages=1, nb_tables=1, config="Hachette_config")]
+        log = StringIO()
+        with redirect_stdout(log):
+            print_batch_summary(files_results, 2.)
+        lines = log.getvalue().splitlines()
+        self.assertIn("files : 3 (1 failed)", lines)
+        self.assertIn("pages : 4", lines)
+        self.assertIn("tables : 3", lines)
+        self.assertIn("throughput : 1.50 files/s, 2.00 pages/s", lines)
+        self.assertIn("templates : Hachette_config 2, unknown 1", lines)
+        self.assertIn("failed : B.PDF (unknown document template (best score 0.10))", lines)
+
+    def test_broken_pool(self):
+        pdf_files = [self.touch(f) for f in ("a.pdf", "B.PDF")]
+        # workers can not start without their configuration : files fail, batch is not aborted
+        with redirect_stdout(StringIO()):
+            files_results = process_batch(pdf_files, os.path.join(self.tmp_dir.name, "missing.json"), jobs=1)
+        self.assertEqual(sorted(r["file"] for r in files_results), sorted(pdf_files))
+        for file_result in files_results:
+            self.assertIn("worker process ended abruptly", file_result["error"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from box import BoxFormats, Box, horizontal_overlapping, vertical_overlapping
+import numpy
+from box import BoxFormats, Box, BoxArray, SpatialIndex, horizontal_overlapping, vertical_overlapping
 
 class TestBox(unittest.TestCase):
 
@@ -53,6 +54,99 @@ class TestBox(unittest.TestCase):
         self.assertEqual(vertical_overlapping(bx1, bx2),
                          (bx1_tuple[1] - bx2_tuple[0] + 1, (bx1_tuple[1] - bx2_tuple[0] + 1) / (bx1_tuple[1] - bx1_tuple[0] + 1), (bx1_tuple[1] - bx2_tuple[0] + 1) / (bx2_tuple[1] - bx2_tuple[0] + 1)))
 
+    def test_copy(self):
+        bx = Box(BoxFormats.TUPLE_TBLR, (30, 40, 50, 60))
+        bx2 = bx.copy()
+        bx2.set_top(10)
+        self.assertEqual((bx.top, bx2.top), (30, 10))
+        self.assertEqual(str(Box.from_tblr(30, 40, 50, 60)), str(bx))
+        # boxes have no instance dictionary
+        with self.assertRaises(AttributeError):
+            bx.width = 10
+
+
+class TestBoxArray(unittest.TestCase):
+    def setUp(self) -> None:
+        self.boxes = [Box(BoxFormats.TUPLE_TBLR, tblr) for tblr in
+                      [(30, 40, 50, 60), (35, 50, 45, 65), (100, 110, 10, 20), (-1, -1, -1, -1)]]
+        self.array = BoxArray.from_boxes(self.boxes)
+
+    def test_create(self):
+        self.assertEqual(len(self.array), 4)
+        self.assertEqual([str(b) for b in self.array.to_boxes()], [str(b) for b in self.boxes])
+        self.assertEqual(str(self.array[1]), str(self.boxes[1]))
+        self.assertEqual(len(self.array[1:3]), 2)
+        ltwh = BoxArray.from_ltwh([50, 45], [30, 35], [11, 21], [11, 16])
+        numpy.testing.assert_array_equal(ltwh.tblr, self.array.tblr[:2])
+        self.assertEqual(self.array.is_empty().tolist(), [False, False, False, True])
+
+    def test_union_and_spans(self):
+        union = Box(BoxFormats.EMPTY)
+        for bx in self.boxes:
+            union.union(bx)
+        self.assertEqual(str(self.array.union()), str(union))
+        self.assertTrue(BoxArray().union().is_empty())
+        self.assertEqual(self.array.get_horizontal_spans()[:3].tolist(),
+                         [bx.get_horizontal_span() for bx in self.boxes[:3]])
+        self.assertEqual(self.array.get_vertical_spans()[:3].tolist(),
+                         [bx.get_vertical_span() for bx in self.boxes[:3]])
+
+    def test_ranges(self):
+        self.assertEqual(self.array.in_vertical_range(30, 50).tolist(), [True, True, False, False])
+        self.assertEqual(self.array.in_horizontal_range(0, 60).tolist(), [True, False, True, False])
+        self.assertEqual(self.array.contained_in(Box(BoxFormats.TUPLE_TBLR, (0, 60, 40, 70))).tolist(),
+                         [True, True, False, False])
+
+    def test_overlapping(self):
+        boxes = self.boxes[:3]
+        array = BoxArray.from_boxes(boxes)
+        for bx in boxes:
+            for array_func, func in ((array.horizontal_overlapping, horizontal_overlapping),
+                                     (array.vertical_overlapping, vertical_overlapping)):
+                overlaps = array_func(bx)
+                self.assertEqual([tuple(val[idx] for val in overlaps) for idx in range(len(boxes))],
+                                 [func(other, bx) for other in boxes])
+        for pairwise_func, func in ((array.pairwise_horizontal_overlapping, horizontal_overlapping),
+                                    (array.pairwise_vertical_overlapping, vertical_overlapping)):
+            overlaps = pairwise_func(array)
+            self.assertEqual(overlaps[0].shape, (3, 3))
+            for i, bx1 in enumerate(boxes):
+                for j, bx2 in enumerate(boxes):
+                    self.assertEqual(tuple(val[i, j] for val in overlaps), func(bx1, bx2))
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = numpy.random.default_rng(0)
+        tops = rng.integers(0, 1000, 300)
+        lefts = rng.integers(0, 1000, 300)
+        self.boxes = BoxArray(numpy.stack([tops, tops + rng.integers(5, 40, 300), lefts,
+                                           lefts + rng.integers(5, 200, 300)], axis=1))
+        self.index = SpatialIndex(self.boxes)
+
+    def test_ranges(self):
+        for (begin, end) in [(0, 50), (100, 400), (990, 2000), (500, 499)]:
+            self.assertEqual(self.index.in_vertical_range(begin, end).tolist(),
+                             numpy.flatnonzero(self.boxes.in_vertical_range(begin, end)).tolist())
+            self.assertEqual(self.index.in_horizontal_range(begin, end).tolist(),
+                             numpy.flatnonzero(self.boxes.in_horizontal_range(begin, end)).tolist())
+
+    def test_bands_and_intervals(self):
+        bands = [(0, 50), (100, 400), (401, 420), (990, 2000)]
+        expected = [-1] * len(self.boxes)
+        for band_idx, band in enumerate(bands):
+            for idx in self.index.in_vertical_range(*band):
+                expected[idx] = band_idx
+        self.assertEqual(self.index.get_bands(bands).tolist(), expected)
+        self.assertEqual(self.index.get_bands([]).tolist(), [-1] * len(self.boxes))
+
+        intervals = [(0, 300), (250, 600), (700, 1200)]
+        inside = numpy.stack([self.boxes.in_horizontal_range(*interval) for interval in intervals], axis=1)
+        intervals_of_boxes = self.index.get_intervals(intervals)
+        for idx, box_inside in enumerate(inside):
+            nb = int(box_inside.sum())
+            self.assertEqual(intervals_of_boxes[idx], int(numpy.argmax(box_inside)) if nb == 1 else -min(nb + 1, 2))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import random
+from PIL import Image, ImageDraw
+
+# local imports
+from deskew import estimate_skew_angle, get_dark_threshold
+
+
+class TestDeskew(unittest.TestCase):
+    def setUp(self) -> None:
+        # landscape page with lines of word-like dark rectangles
+        rnd = random.Random(1)
+        self.page = Image.new('L', (3508, 2480), 255)
+        draw = ImageDraw.Draw(self.page)
+        for y in range(200, 2300, 60):
+            x = 100
+            while x < 3300:
+                w = rnd.randint(30, 200)
+                draw.rectangle([x, y, x + w, y + 25], fill=0)
+                x += w + rnd.randint(20, 60)
+
+    def test_threshold(self):
+        import numpy
+        gray = numpy.array([[10, 12, 240], [250, 11, 245]], dtype=numpy.uint8)
+        threshold = get_dark_threshold(gray)
+        self.assertTrue(12 < threshold <= 240)
+
+    def test_angle(self):
+        for angle in [0.0, 0.4, -1.2, 3.0]:
+            with self.subTest(angle=angle):
+                # clockwise rotation : lines go down to the right, expected angle is positive
+                img = self.page.rotate(-angle, expand=True, fillcolor=255)
+                self.assertAlmostEqual(estimate_skew_angle(img), angle, delta=0.1)
+
+    def test_blank_page(self):
+        self.assertEqual(estimate_skew_angle(Image.new('L', (400, 300), 255)), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,19 @@
 import unittest
+import os
+import json
+import copy
+from contextlib import redirect_stdout
+from io import StringIO
 
 # local imports
-from headers import ConfigHeader
+from headers import ConfigHeader, HeaderMatcher, get_header_matcher, search_headers, DocumentLayout, \
+    get_angle_from_headers_line
+from utils import is_simple_reg_ex_ok
+import box
+from reco_pdf import get_config_info
 
 class TestHeaders(unittest.TestCase):
     def setUp(self) -> None:
-        from reco_pdf import get_config_info
         self.config_info = get_config_info(os.path.join(os.environ["METADOC_ROOT"], "tests", "test_header_config.json"))
 
     def test_configHeader(self):
@@ -19,8 +27,133 @@ class TestHeaders(unittest.TestCase):
         self.assertEqual(hdr.search_text, cfg_search.lower())
         self.assertEqual(hdr.length, cfg_length)
 
-    def test_(self):
-        return
+    def test_matcher(self):
+        hdr_list = self.config_info["headers"]
+        matcher = self.config_info["header_matcher"]
+        self.assertIs(get_header_matcher(self.config_info), matcher)
+        words = ["colis", "palet", "palette", "client.", "client.nom", "client", "d", "dd", "ville.*", "", "run"]
+        for word in words:
+            with self.subTest(word=word):
+                self.assertEqual(matcher.match(word), [idx for idx, hdr in enumerate(hdr_list)
+                                                       if is_simple_reg_ex_ok(hdr.search_text, word)])
+                self.assertEqual(matcher.prefix_match(word), [idx for idx, hdr in enumerate(hdr_list)
+                                                              if word.startswith(hdr.search_text)])
+        self.assertEqual(matcher.match_words(["Colis", "x", "RUN", "colis"])[0], {0: 1.0, 3: 1.0})
+
+    def test_regex(self):
+        hdr_list = [ConfigHeader({"id": "Poids", "search_text": "Poids", "length": 100}),
+                    ConfigHeader({"id": "Date", "search_text": "Date", "length": 100,
+                                  "search_regex": r"dat[eé]s?|livr\w*"})]
+        matcher = HeaderMatcher(hdr_list)
+        self.assertEqual([list(words) for words in matcher.match_words(["Poids", "Dates", "LIVRAISON", "datation",
+                                                                         "date"])], [[0], [1, 2, 4]])
+        self.assertEqual(matcher.prefix_match("dateur"), [1])
+        self.assertEqual(matcher.prefix_match("poidsx"), [0])
+
+    def test_fuzzy(self):
+        hdr_list = [ConfigHeader({"id": "UM", "search_text": "Colis", "length": 100, "max_errors": 1}),
+                    ConfigHeader({"id": "Poids", "search_text": "Poids.(KG)", "length": 100, "max_errors": 2}),
+                    ConfigHeader({"id": "CLIENT", "search_text": "CLIENT.*", "length": 100, "max_errors": 1}),
+                    ConfigHeader({"id": "D", "search_text": "D", "length": 100, "max_errors": 1})]
+        matcher = HeaderMatcher(hdr_list)
+        self.assertEqual(matcher.fuzzy_match("c0lis"), [(0, 0.8)])
+        self.assertEqual(matcher.fuzzy_match("po1ds.(kg"), [(1, 0.8)])
+        self.assertEqual(matcher.fuzzy_match("c0lls"), [])
+        # prefix headers tolerate errors in their beginning only
+        self.assertEqual(matcher.fuzzy_match("cl1ent.nom"), [(2, 1 - 1 / 7)])
+        # one character headers are never approximated
+        self.assertEqual(matcher.fuzzy_match("e"), [])
+        words = matcher.match_words(["Colis", "C0lis", "xx", "D"])
+        self.assertEqual(words[0], {0: 1.0, 1: 0.8})
+        self.assertEqual(list(words[0]), [0, 1])
+        self.assertEqual(words[3], {3: 1.0})
+
+    def test_search_headers(self):
+        with open(os.path.join(os.environ["METADOC_ROOT"], "tests", "data_rec.json")) as f:
+            data_rec = json.load(f)
+        box.update_tesseract_rec_with_boxes(data_rec)
+        with redirect_stdout(StringIO()):
+            headers_list = search_headers(data_rec, self.config_info)
+        self.assertEqual([hdr.get("text") for hdr in headers_list],
+                         ["Colis", "Palet", None, "RUN", "LOREC", "Facture.", None, "D.CLIENT......:,....),",
+                          None, "VILLE...", "PAYS.,..............", None])
+        self.assertEqual({hdr.get("match_score") for hdr in headers_list}, {1.0, None})
+
+        # an OCR error in header is tolerated with max_errors
+        data_rec["text"][headers_list[0]["rec_index"]] = "C0lis"
+        fuzzy_info = get_config_info(os.path.join(os.environ["METADOC_ROOT"], "tests", "test_header_config.json"))
+        fuzzy_info["headers"][0].max_errors = 1
+        del fuzzy_info["header_matcher"]
+        with redirect_stdout(StringIO()):
+            fuzzy_list = search_headers(data_rec, fuzzy_info)
+        self.assertEqual((fuzzy_list[0]["text"], fuzzy_list[0]["match_score"]), ("C0lis", 0.8))
+
+
+    def test_document_layout(self):
+        with open(os.path.join(os.environ["METADOC_ROOT"], "tests", "data_rec.json")) as f:
+            data_rec = json.load(f)
+        box.update_tesseract_rec_with_boxes(data_rec)
+        layout = DocumentLayout()
+        with redirect_stdout(StringIO()):
+            searched = search_headers(copy.deepcopy(data_rec), self.config_info, resize_hdr=True)
+            first = layout.get_headers(data_rec, self.config_info, resize_hdr=True)
+        self.assertEqual((layout.nb_searched, layout.nb_reused), (1, 0))
+        self.assertEqual([str(hdr.get("box")) for hdr in first], [str(hdr.get("box")) for hdr in searched])
+
+        # next page : same layout moved by a few pixels
+        moved_rec = copy.deepcopy(data_rec)
+        moved_rec["top"] = [val + 7 if idx else val for idx, val in enumerate(moved_rec["top"])]
+        moved_rec["left"] = [val - 4 if idx else val for idx, val in enumerate(moved_rec["left"])]
+        box.update_tesseract_rec_with_boxes(moved_rec)
+        reused = layout.get_headers(moved_rec, self.config_info, resize_hdr=True)
+        self.assertEqual((layout.nb_searched, layout.nb_reused), (1, 1))
+        for hdr_first, hdr_reused in zip(first, reused):
+            self.assertEqual(hdr_first["name"], hdr_reused["name"])
+            self.assertEqual("box" in hdr_first, "box" in hdr_reused)
+            if "box" not in hdr_first:
+                continue
+            self.assertEqual((hdr_reused["box"].top, hdr_reused["box"].left),
+                             (hdr_first["box"].top + 7, hdr_first["box"].left - 4))
+        anchors = [hdr for hdr in reused if "rec_index" in hdr]
+        self.assertTrue(2 <= len(anchors) <= DocumentLayout.NB_ANCHORS)
+        for hdr in anchors:
+            self.assertEqual(moved_rec["text"][hdr["rec_index"]], hdr["text"])
+
+        # headers are searched again when anchors are not found
+        for hdr in anchors:
+            moved_rec["text"][hdr["rec_index"]] = "xxxx"
+        self.assertIsNone(layout.validate(moved_rec, self.config_info))
+        with redirect_stdout(StringIO()):
+            layout.get_headers(moved_rec, self.config_info, resize_hdr=True)
+        self.assertEqual((layout.nb_searched, layout.nb_reused), (2, 1))
+
+        # headers not resized (skew angle) have their own template
+        self.assertIsNone(layout.validate(data_rec, self.config_info, resize_hdr=False))
+        angle = get_angle_from_headers_line(data_rec, self.config_info)
+        self.assertEqual(get_angle_from_headers_line(data_rec, self.config_info, layout=layout), angle)
+        self.assertEqual(get_angle_from_headers_line(data_rec, self.config_info, layout=layout), angle)
+        self.assertEqual(layout.nb_reused, 2)
+
+        # layout is frozen after the page giving templates : headers searched on next pages are not learnt
+        layout.end_page()
+        self.assertTrue(layout.frozen)
+        templates = dict(layout.templates)
+        with redirect_stdout(StringIO()):
+            layout.get_headers(moved_rec, self.config_info, resize_hdr=True)
+        self.assertEqual(layout.nb_searched, 3)
+        for key, template in templates.items():
+            self.assertIs(layout.templates[key], template)
+
+        # layout is frozen without template after the learning pages
+        layout = DocumentLayout()
+        for _ in range(DocumentLayout.NB_LEARNING_PAGES):
+            self.assertFalse(layout.frozen)
+            layout.end_page()
+        self.assertTrue(layout.frozen)
+        with redirect_stdout(StringIO()):
+            layout.get_headers(data_rec, self.config_info, resize_hdr=True)
+        self.assertEqual(layout.templates, {})
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
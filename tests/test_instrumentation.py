@@ -0,0 +1,101 @@
+import unittest
+import os
+import json
+import pickle
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+# local imports
+from instrumentation import Tracer, get_tracer, set_tracer, trace_stage
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory()
+        self.trace_path = os.path.join(self.tmp_dir.name, "trace.jsonl")
+
+    def tearDown(self) -> None:
+        set_tracer(None)
+        self.tmp_dir.cleanup()
+
+    def test_disabled(self):
+        tracer = get_tracer()
+        self.assertFalse(tracer.enabled)
+        with trace_stage("ocr"):
+            pass
+        with tracer.page(0):
+            pass
+        self.assertEqual(tracer.records, [])
+
+    def test_stages(self):
+        tracer = Tracer(self.trace_path)
+        set_tracer(tracer)
+        tracer.document = "doc.pdf"
+        with trace_stage("render", 0, nb_rendered=2):
+            pass
+        for page_idx in range(2):
+            with tracer.page(page_idx):
+                with trace_stage("ocr"):
+                    sum(range(10000))
+                with trace_stage("table"):
+                    pass
+        with trace_stage("alloc"):
+            # 64 MB kept until end of stage
+            buffer = bytearray(64 * 1024 ** 2)
+            buffer[::4096] = b"x" * len(buffer[::4096])
+        del buffer
+        # records of a worker process
+        worker = pickle.loads(pickle.dumps(tracer))
+        self.assertEqual((worker.run_id, worker.trace_path, worker.records), (tracer.run_id, self.trace_path, []))
+        with worker.page(2):
+            with worker.stage("ocr"):
+                pass
+        tracer.merge(worker.pop_records())
+        self.assertEqual(worker.records, [])
+        tracer.close()
+
+        self.assertEqual([(r["stage"], r["page"]) for r in tracer.records],
+                         [("render", 1), ("ocr", 1), ("table", 1), ("page", 1), ("ocr", 2), ("table", 2), ("page", 2),
+                          ("alloc", None), ("ocr", 3), ("page", 3)])
+        self.assertEqual(tracer.records[0]["nb_rendered"], 2)
+        for record in tracer.records:
+            self.assertEqual(record["run"], tracer.run_id)
+            self.assertGreaterEqual(record["wall"], 0)
+            self.assertGreater(record["process_peak_rss_mb"], 0)
+            self.assertGreaterEqual(record["peak_growth_mb"], 0)
+        alloc_record = tracer.records[7]
+        self.assertGreater(alloc_record["rss_growth_mb"], 60)
+        self.assertLess(tracer.records[0]["rss_growth_mb"], 10)
+        summary = tracer.get_summary()
+        self.assertEqual(list(summary), ["render", "ocr", "table", "page", "alloc"])
+        self.assertEqual(summary["ocr"]["count"], 3)
+        self.assertAlmostEqual(summary["page"]["mean_wall"], summary["page"]["wall"] / 3)
+
+        # trace file : records of both processes then summary
+        with open(self.trace_path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), len(tracer.records) + 1)
+        self.assertEqual(lines[-1]["stage"], "summary")
+        self.assertEqual(lines[-1]["summary"]["ocr"]["count"], 3)
+
+        output = StringIO()
+        with redirect_stdout(output):
+            tracer.print_summary()
+        self.assertEqual(len(output.getvalue().splitlines()), 6)
+
+    def test_profile_page(self):
+        tracer = Tracer(self.trace_path, profile_page=1)
+        tracer.document = "doc.pdf"
+        output = StringIO()
+        with redirect_stdout(output):
+            for page_idx in range(3):
+                with tracer.page(page_idx):
+                    sorted(range(1000), reverse=True)
+        self.assertEqual(os.listdir(self.tmp_dir.name).count("trace_doc_p2.prof"), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "trace_doc_p1.prof")))
+        self.assertIn("cumulative", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import os
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+# local imports
+from mining_pdf import generate_text_layers, get_text_layer_data_rec, is_text_layer_usable, get_hocr_from_data_rec
+
+
+def write_text_pdf(path, texts, width=842, height=595):
+    """
+    write a one page pdf with a text layer
+    :param texts: list of tuples (x, y, text) in pdf points
+    """
+    content = "BT /F1 10 Tf " + " ".join("1 0 0 1 {} {} Tm ({}) Tj".format(*t) for t in texts) + " ET"
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>",
+               "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+               "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {} {}] /Contents 4 0 R "
+               "/Resources << /Font << /F1 5 0 R >> >> >>".format(width, height),
+               "<< /Length {} >>\nstream\n{}\nendstream".format(len(content), content),
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for num, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += "{} 0 obj\n{}\nendobj\n".format(num, obj).encode()
+    xref_pos = len(out)
+    out += "xref\n0 {}\n0000000000 65535 f \n".format(len(objects) + 1).encode()
+    for offset in offsets:
+        out += "{:010d} 00000 n \n".format(offset).encode()
+    out += "trailer\n<< /Size {} /Root 1 0 R >>\nstartxref\n{}\n%%EOF\n".format(len(objects) + 1, xref_pos).encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+class TestMiningPdf(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory()
+        self.pdf_path = os.path.join(self.tmp_dir.name, "text.pdf")
+        texts = [(72, 500, "Colis"), (144, 500, "Poids.(KG)"), (288, 500, "CLIENT.")]
+        texts += [(72, 480 - 15 * r, "{} 12,5 LIB CLIENT{}".format(r, r)) for r in range(10)]
+        write_text_pdf(self.pdf_path, texts)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_data_rec(self):
+        from pdfminer.high_level import extract_pages
+        page_layout = next(extract_pages(self.pdf_path))
+        data_rec = get_text_layer_data_rec(page_layout, dpi=300)
+        # page entry first, as in tesseract data
+        self.assertEqual((data_rec["level"][0], data_rec["width"][0], data_rec["height"][0]), (1, 3508, 2479))
+        idx = data_rec["text"].index("Colis")
+        self.assertEqual(data_rec["level"][idx], 5)
+        self.assertEqual(data_rec["left"][idx], 300)
+        self.assertEqual(data_rec["conf"][idx], 100)
+        # headers are all in same line
+        line_keys = {(data_rec["block_num"][i], data_rec["line_num"][i]) for i, txt in enumerate(data_rec["text"])
+                     if txt in ("Colis", "Poids.(KG)", "CLIENT.")}
+        self.assertEqual(len(line_keys), 1)
+        self.assertEqual(data_rec["text"].count("LIB"), 10)
+        self.assertIn("ocrx_word", get_hocr_from_data_rec(data_rec))
+
+        # rotated as rendered image when orientation is not the configured one
+        rotated_rec = get_text_layer_data_rec(page_layout, dpi=300, orientation="portrait")
+        self.assertEqual((rotated_rec["width"][0], rotated_rec["height"][0]), (2479, 3508))
+        rotated_idx = rotated_rec["text"].index("Colis")
+        self.assertEqual(rotated_rec["top"][rotated_idx], 3508 - data_rec["left"][idx] - data_rec["width"][idx])
+        self.assertEqual(rotated_rec["left"][rotated_idx], data_rec["top"][idx])
+
+    def test_usable(self):
+        data_rec = next(generate_text_layers(self.pdf_path, 1, cfg_json={"text_layer_min_words": 20}))
+        self.assertIsNotNone(data_rec)
+        self.assertTrue(is_text_layer_usable(data_rec, 20))
+        self.assertFalse(is_text_layer_usable(data_rec, 100))
+        self.assertIsNone(next(generate_text_layers(self.pdf_path, 1, cfg_json={"text_layer_min_words": 100})))
+
+        # number of page is printed (not pdfminer id of page object)
+        log = StringIO()
+        with redirect_stdout(log):
+            list(generate_text_layers(self.pdf_path, 1, page_numbers=[0], verbose=1))
+        self.assertEqual(log.getvalue(), "text layer of page 1 is usable\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import os
+import json
+import pickle
+from contextlib import redirect_stdout
+from glob import glob
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+from PIL import Image
+
+# local imports
+from ocr import FakeOcrBackend, TesseractCliBackend, create_ocr_backend, get_ocr_backend, set_ocr_backend, \
+    parse_tesseract_config, image_to_data_pdf_hocr, CONFIGS_DIR, TSV_HEADER
+from ocr_cache import OcrCache
+from reco_pdf import get_config_info, recognize_image, recognize_page
+
+
+class TestOcr(unittest.TestCase):
+    def setUp(self) -> None:
+        with open(os.path.join(os.environ["METADOC_ROOT"], "tests", "data_rec.json")) as f:
+            self.data_rec = json.load(f)
+        self.backend = FakeOcrBackend(self.data_rec)
+        set_ocr_backend(self.backend)
+
+    def tearDown(self) -> None:
+        set_ocr_backend(None)
+
+    def test_parse_config(self):
+        self.assertEqual(parse_tesseract_config(''), (None, None, {}))
+        self.assertEqual(parse_tesseract_config('--psm 6 -c tessedit_char_whitelist=0123456789'),
+                         (6, None, {"tessedit_char_whitelist": "0123456789"}))
+        self.assertEqual(parse_tesseract_config('--oem 1 --psm 11'), (11, 1, {}))
+        self.assertEqual(parse_tesseract_config('--dpi 300'), (None, None, {"user_defined_dpi": "300"}))
+        # options only known by tesseract program
+        for config in ('--dpi', 'digits', '--user-words words.txt', '-l eng'):
+            with self.subTest(config=config):
+                with self.assertRaises(ValueError):
+                    parse_tesseract_config(config)
+
+    def test_one_tesseract_run(self):
+        runs = []
+
+        def run_tesseract(input_filename, output_filename_base, extension, lang, config):
+            # tesseract program writes one file by output
+            runs.append((output_filename_base, extension, lang, config, os.path.isfile(input_filename)))
+            outputs = {"tsv": TSV_HEADER + "1\t1\t0\t0\t0\t0\t0\t0\t40\t20\t-1\t\n"
+                                            "5\t1\t1\t1\t1\t1\t2\t3\t10\t8\t91.5\tColis\n",
+                       "pdf": "%PDF-1.5 page", "hocr": "<html>page</html>"}
+            for ext, content in outputs.items():
+                with open(output_filename_base + os.extsep + ext, 'w') as f:
+                    f.write(content)
+
+        img = Image.new('L', (40, 20), 255)
+        pdf_config, hocr_config = os.path.join(CONFIGS_DIR, "pdf"), os.path.join(CONFIGS_DIR, "hocr")
+        for (pdf, hocr, config_files) in ((True, True, [pdf_config, hocr_config]), (True, False, [pdf_config]),
+                                          (False, True, [hocr_config]), (False, False, [])):
+            with self.subTest(pdf=pdf, hocr=hocr):
+                runs.clear()
+                with mock.patch("ocr.tess.run_tesseract", side_effect=run_tesseract):
+                    data, pdf_bytes, hocr_bytes = image_to_data_pdf_hocr(img, lang='eng', config=' --psm 6 ',
+                                                                         pdf=pdf, hocr=hocr)
+                # options are given before config files of outputs
+                self.assertEqual(runs, [(runs[0][0], 'tsv', 'eng',
+                                         ' '.join(['-c tessedit_create_tsv=1', '--psm 6'] + config_files), True)])
+                self.assertTrue(all(os.path.isabs(path) and os.path.isfile(path) for path in config_files))
+                self.assertEqual(data["text"], ["", "Colis"])
+                self.assertEqual(list(data["conf"]), [-1, 91.5])
+                self.assertEqual((data["left"][1], data["top"][1], data["width"][1], data["height"][1]),
+                                 (2, 3, 10, 8))
+                self.assertEqual(pdf_bytes, b"%PDF-1.5 page" if pdf else None)
+                self.assertEqual(hocr_bytes, b"<html>page</html>" if hocr else None)
+                # input image and outputs are removed
+                self.assertEqual(glob(runs[0][0] + "*"), [])
+
+    def test_fake_backend(self):
+        img = Image.new('L', (40, 20), 255)
+        data, pdf_bytes, hocr_bytes = self.backend.recognize(img, config='--psm 6')
+        self.assertEqual(data["text"], self.data_rec["text"])
+        self.assertTrue(pdf_bytes.startswith(b"%PDF"))
+        self.assertIn(self.data_rec["text"][-1], hocr_bytes.decode('utf-8'))
+        self.assertEqual(self.backend.calls, [((40, 20), 'fra', '--psm 6')])
+
+        data, pdf_bytes, hocr_bytes = FakeOcrBackend().recognize(img, pdf=False, hocr=False)
+        self.assertEqual((data["level"], data["width"], data["height"]), ([1], [40], [20]))
+        self.assertIsNone(pdf_bytes)
+        self.assertIsNone(hocr_bytes)
+
+    def test_process_backend(self):
+        self.assertIs(get_ocr_backend(), self.backend)
+        set_ocr_backend(None)
+        self.assertIsInstance(get_ocr_backend(), TesseractCliBackend)
+        self.assertEqual(create_ocr_backend("fake").name, "fake")
+        with self.assertRaises(ValueError):
+            create_ocr_backend("unknown")
+        # backends are sent to worker processes
+        backend = pickle.loads(pickle.dumps(create_ocr_backend("auto")))
+        self.assertIn(backend.name, ("cli", "tesserocr"))
+
+    def test_recognize_image_cache(self):
+        img = Image.new('L', (40, 20), 255)
+        with TemporaryDirectory() as tmp_dir:
+            cache = OcrCache(os.path.join(tmp_dir, "cache"))
+            entry = recognize_image(img, pdf=False, hocr=False, ocr_cache=cache)
+            self.assertEqual(entry["data"]["text"], self.data_rec["text"])
+            recognize_image(img, pdf=False, hocr=False, ocr_cache=cache)
+            self.assertEqual(len(self.backend.calls), 1)
+            # results of another backend are not taken from cache
+            other_key = cache.get_image_key(img, 'fra')
+            set_ocr_backend(TesseractCliBackend())
+            self.assertNotEqual(cache.get_image_key(img, 'fra'), other_key)
+
+    def test_recognize_page(self):
+        config_info = get_config_info(os.path.join(os.environ["METADOC_ROOT"], "configs", "Hachette_config.json"))
+        img = Image.new('L', (self.data_rec["width"][0], self.data_rec["height"][0]), 255)
+        with redirect_stdout(StringIO()):
+            page_result = recognize_page(0, img, config_info)
+        self.assertTrue(page_result["info_found"])
+        self.assertEqual(len(page_result["tables"]), 1)
+        self.assertTrue(page_result["pdf"].startswith(b"%PDF"))
+        self.assertIn("ocrx_word", page_result["hocr"])
+        # whole page is recognized once for word data, pdf and hocr
+        self.assertEqual(len(self.backend.calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import os
+import json
+import time
+from tempfile import TemporaryDirectory
+from PIL import Image
+
+# local imports
+from ocr_cache import OcrCache
+from rec_frame import RecognitionFrame
+
+
+class TestOcrCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory()
+        self.cache = OcrCache(os.path.join(self.tmp_dir.name, "cache"))
+        self.data = {"level": [1, 5], "page_num": [1, 1], "block_num": [0, 1], "par_num": [0, 1], "line_num": [0, 1],
+                     "word_num": [0, 1], "left": [0, 12], "top": [0, 30], "width": [200, 40], "height": [100, 12],
+                     "conf": [-1., 96.5], "text": ["", "Colis"]}
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_image_key(self):
+        img = Image.new('L', (20, 10), 255)
+        key = self.cache.get_image_key(img, 'fra')
+        self.assertEqual(key, self.cache.get_image_key(img.copy(), 'fra'))
+        self.assertNotEqual(key, self.cache.get_image_key(img, 'eng'))
+        self.assertNotEqual(key, self.cache.get_image_key(img, 'fra', '--psm 6'))
+        img.putpixel((3, 3), 0)
+        self.assertNotEqual(key, self.cache.get_image_key(img, 'fra'))
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get("abcd"))
+        self.cache.put("abcd", RecognitionFrame.from_dict(self.data), pdf=b"%PDF")
+        entry = self.cache.get("abcd")
+        self.assertIsInstance(entry["data"], RecognitionFrame)
+        self.assertEqual(entry["data"].to_dict(), self.data)
+        self.assertEqual(self.cache.get("abcd", pdf=True)["pdf"], b"%PDF")
+        # needed hocr is missing
+        self.assertIsNone(self.cache.get("abcd", hocr=True))
+        self.cache.put("abcd", self.data, pdf=b"%PDF", hocr=b"<html>")
+        self.assertEqual(self.cache.get("abcd", pdf=True, hocr=True)["hocr"], b"<html>")
+
+        self.cache.put_page("doc", 3, "abcd")
+        self.assertEqual(self.cache.get_page("doc", 3)["data"].to_dict(), self.data)
+        self.assertIsNone(self.cache.get_page("doc", 4))
+
+        # resolution of page image is kept with its link
+        self.cache.put_page("doc", 5, "abcd", dpi=150)
+        self.assertEqual(self.cache.get_page("doc", 5)["dpi"], 150)
+        self.assertIsNone(self.cache.get_page("doc", 3)["dpi"])
+
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("abcd"))
+        self.assertIsNone(self.cache.get_page("doc", 3))
+
+    def test_plain_files(self):
+        self.cache.put("abcd", self.data, pdf=b"%PDF", hocr=b"<html>")
+        self.cache.put_page("doc", 0, "abcd", dpi=150)
+        with open(self.cache._get_path("abcd", OcrCache.ENTRY_EXT)) as f:
+            self.assertEqual(json.load(f), self.data)
+        with open(self.cache._get_path("abcd", OcrCache.PDF_EXT), 'rb') as f:
+            self.assertEqual(f.read(), b"%PDF")
+        with open(self.cache._get_path("doc_0", OcrCache.LINK_EXT)) as f:
+            self.assertEqual(json.load(f), {"key": "abcd", "dpi": 150})
+        # files which are not JSON (ex: pickle of another version) are not read
+        for path in (self.cache._get_path("abcd", OcrCache.ENTRY_EXT),
+                     self.cache._get_path("doc_0", OcrCache.LINK_EXT)):
+            with open(path, 'wb') as f:
+                f.write(b"\x80\x04\x95")
+        self.assertIsNone(self.cache.get("abcd"))
+        self.assertIsNone(self.cache.get_page("doc", 0))
+
+    def test_size(self):
+        self.cache.put("aa00", self.data, pdf=bytes(1000))
+        self.cache.put_page("doc", 0, "aa00")
+        size = self.cache.size
+        self.assertEqual(size, sum(f[1] for f in self.cache._get_files()))
+        # files replaced (same document recognized again) are not counted twice
+        self.cache.put("aa00", self.data, pdf=bytes(1000))
+        self.cache.put_page("doc", 0, "aa00")
+        self.assertEqual(self.cache.size, size)
+        self.cache.put("aa00", self.data, pdf=bytes(500))
+        self.assertEqual(self.cache.size, size - 500)
+        self.assertEqual(self.cache.size, sum(f[1] for f in self.cache._get_files()))
+
+    def set_entry_time(self, key, mtime):
+        for ext in (OcrCache.ENTRY_EXT, OcrCache.PDF_EXT):
+            os.utime(self.cache._get_path(key, ext), (mtime, mtime))
+
+    def test_eviction(self):
+        self.cache.put("aa00", self.data, pdf=bytes(1000))
+        entry_size = self.cache.size
+        self.cache.max_size = int(2.5 * entry_size)
+        self.cache.put("bb00", self.data, pdf=bytes(1000))
+        # oldest entry is used so that second one is the least recently used
+        past = time.time() - 100
+        self.set_entry_time("aa00", past)
+        self.set_entry_time("bb00", past - 10)
+        self.assertIsNotNone(self.cache.get("aa00", pdf=True))
+        self.cache.put("cc00", self.data, pdf=bytes(1000))
+        self.assertIsNone(self.cache.get("bb00", pdf=True))
+        self.assertIsNotNone(self.cache.get("aa00", pdf=True))
+        self.assertIsNotNone(self.cache.get("cc00", pdf=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import gc
+import weakref
+from unittest import mock
+from PIL import Image
+
+# local imports
+from pages import generate_pages_images, generate_document_pages, render_page
+
+
+class TestPages(unittest.TestCase):
+    """
+    pdf2image is replaced : rendered pages are small images whose width is the page number
+    """
+    def setUp(self) -> None:
+        self.calls = []
+        self.images = []
+        patcher = mock.patch("pages.convert_from_path", side_effect=self.convert_from_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def convert_from_path(self, pdf_path, dpi, first_page, last_page, grayscale):
+        self.calls.append((first_page, last_page))
+        images = [Image.new('L' if grayscale else 'RGB', (page_num, 10), 255)
+                  for page_num in range(first_page, last_page + 1)]
+        self.images += [weakref.ref(img) for img in images]
+        return images
+
+    def test_chunks(self):
+        for (nb_pages, chunk_size, calls) in ((10, 4, [(1, 4), (5, 8), (9, 10)]),
+                                              (8, 4, [(1, 4), (5, 8)]),
+                                              (3, 8, [(1, 3)]),
+                                              (3, 0, [(1, 1), (2, 2), (3, 3)])):
+            with self.subTest(nb_pages=nb_pages, chunk_size=chunk_size):
+                self.calls = []
+                pages = [(page_idx, img.width) for page_idx, img in
+                         generate_pages_images("doc.pdf", chunk_size=chunk_size, nb_pages=nb_pages, grayscale=True)]
+                self.assertEqual(pages, [(page_idx, page_idx + 1) for page_idx in range(nb_pages)])
+                self.assertEqual(self.calls, calls)
+
+    def test_lazy_rendering(self):
+        pages = generate_pages_images("doc.pdf", chunk_size=2, nb_pages=5)
+        page_idx, img = next(pages)
+        # first page is given before next chunks are rendered
+        self.assertEqual((page_idx, img.width), (0, 1))
+        self.assertEqual(self.calls, [(1, 2)])
+        del img
+        for page_idx, img in pages:
+            gc.collect()
+            # images of previous pages are released by the generator
+            self.assertEqual([ref() is not None for ref in self.images[:page_idx]], [False] * page_idx)
+            del img
+        self.assertEqual(self.calls, [(1, 2), (3, 4), (5, 5)])
+
+    def test_document_pages(self):
+        # pages known without rendering are not rendered, consecutive pages to render are rendered at once
+        sources = [None, ("text_layer", {}), None, None, ("ocr_cache", {}), None, None]
+        pages = [(page_idx, img.width if img is not None else None, source) for page_idx, img, source in
+                 generate_document_pages("doc.pdf", chunk_size=4, nb_pages=len(sources), pages_sources=iter(sources))]
+        self.assertEqual(pages, [(page_idx, page_idx + 1 if source is None else None, source)
+                                 for page_idx, source in enumerate(sources)])
+        self.assertEqual(self.calls, [(1, 1), (3, 4), (6, 7)])
+
+        self.calls = []
+        self.assertEqual([page_idx for page_idx, _, _ in generate_document_pages("doc.pdf", chunk_size=3, nb_pages=4)],
+                         [0, 1, 2, 3])
+        self.assertEqual(self.calls, [(1, 3), (4, 4)])
+
+    def test_render_page(self):
+        self.assertEqual(render_page("doc.pdf", 6).size, (7, 10))
+        self.assertEqual(self.calls, [(7, 7)])
+
+
+if __name__ == '__main__':
+    unittest.main()
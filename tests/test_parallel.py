@@ -0,0 +1,56 @@
+import unittest
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# local imports
+from parallel import imap_ordered
+
+
+class TestParallel(unittest.TestCase):
+    def setUp(self) -> None:
+        self.lock = threading.Lock()
+        self.finished = []
+        self.submitted = 0
+
+    def items(self, nb_items):
+        # count items taken by imap_ordered to submit their task
+        for item in range(nb_items):
+            with self.lock:
+                self.submitted += 1
+            yield item
+
+    def square(self, item):
+        # first items of a group of 4 are the slowest ones
+        time.sleep(0.01 * (3 - item % 4))
+        with self.lock:
+            self.finished.append(item)
+        return item * item
+
+    def test_order(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(imap_ordered(executor, self.square, self.items(12), max_pending=4))
+        self.assertEqual(results, [item * item for item in range(12)])
+        # tasks completed out of order
+        self.assertNotEqual(self.finished, sorted(self.finished))
+
+    def test_max_pending(self):
+        for max_pending in (1, 3, None):
+            with self.subTest(max_pending=max_pending):
+                self.submitted = 0
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    limit = 4 if max_pending is None else max_pending
+                    for nb_given, result in enumerate(imap_ordered(executor, self.square, self.items(10),
+                                                                   max_pending=max_pending), start=1):
+                        # tasks submitted ahead of results given, including the one of current result
+                        self.assertLessEqual(self.submitted - nb_given, limit - 1)
+                        self.assertEqual(result, (nb_given - 1) ** 2)
+                self.assertEqual(self.submitted, 10)
+
+    def test_empty(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(list(imap_ordered(executor, self.square, [])), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import os
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from PyPDF4 import PdfFileReader, PdfFileWriter
+
+# local imports
+from pdf_output import IncrementalPdfWriter, get_searchable_pdf_page
+
+
+def get_blank_pdf_bytes(width, height):
+    writer = PdfFileWriter()
+    writer.addBlankPage(width, height)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class TestPdfOutput(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory()
+        self.pdf_path = os.path.join(self.tmp_dir.name, "output.pdf")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def get_pages_sizes(self):
+        with open(self.pdf_path, 'rb') as f:
+            reader = PdfFileReader(f)
+            return [(int(p.mediaBox.getWidth()), int(p.mediaBox.getHeight())) for p in reader.pages]
+
+    def test_incremental(self):
+        sizes = [(100, 200), (300, 150), (50, 60)]
+        with IncrementalPdfWriter(self.pdf_path) as writer:
+            for nb, size in enumerate(sizes, start=1):
+                writer.add_page_from_bytes(get_blank_pdf_bytes(*size))
+                # file is a valid pdf after each page
+                self.assertEqual(self.get_pages_sizes(), sizes[0:nb])
+        self.assertEqual(writer.nb_pages, len(sizes))
+        self.assertEqual(self.get_pages_sizes(), sizes)
+
+    def test_searchable_page(self):
+        from PIL import Image
+        img = Image.new('L', (600, 300), 255)
+        data_rec = {"level": [1, 5, 5, 5], "text": ["", "Colis", "(12)", ""], "left": [0, 50, 200, 300],
+                    "top": [0, 100, 100, 100], "width": [600, 120, 80, 40], "height": [300, 30, 30, 30]}
+        pdf_bytes = get_searchable_pdf_page(img, data_rec, dpi=150)
+        with IncrementalPdfWriter(self.pdf_path) as writer:
+            writer.add_page_from_bytes(pdf_bytes)
+        self.assertEqual(self.get_pages_sizes(), [(288, 144)])
+        with open(self.pdf_path, 'rb') as f:
+            page = PdfFileReader(f).getPage(0)
+            text = page.extractText()
+            self.assertEqual(list(page["/Resources"]["/XObject"]), ["/Im1"])
+        self.assertIn("Colis", text)
+        self.assertIn("(12)", text)
+
+    def test_empty(self):
+        IncrementalPdfWriter(self.pdf_path).close()
+        self.assertEqual(self.get_pages_sizes(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import numpy
+from PIL import Image, ImageFilter, ImageMath
+
+# local imports
+from preprocessing import PreprocessingEngine, get_opening_coeff, get_orientation_angle, get_preprocessing_chain
+
+
+def pil_opening(gs_image, coeff):
+    """
+    historical opening with PIL filters and ImageMath
+    """
+    if coeff == 1:
+        return gs_image.filter(ImageFilter.MaxFilter(3)).filter(ImageFilter.MinFilter(3))
+    imageMath_txt = "convert(({} * A + {} * B)/{}, 'L')".format(*get_opening_coeff(coeff))
+    temp_image = ImageMath.eval(imageMath_txt, A=gs_image.filter(ImageFilter.MaxFilter(3)), B=gs_image)
+    return ImageMath.eval(imageMath_txt, A=temp_image.filter(ImageFilter.MinFilter(3)), B=temp_image)
+
+
+class TestPreprocessing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = PreprocessingEngine()
+        self.gray_array = numpy.random.default_rng(0).integers(0, 256, (31, 47), dtype=numpy.uint8)
+
+    def test_config(self):
+        self.assertEqual(get_opening_coeff(0.5), (5, 5, 10))
+        self.assertEqual(get_opening_coeff(1), (1, 0, 1))
+        self.assertEqual(get_orientation_angle((100, 200), {"orientation": "landscape"}), 90)
+        self.assertEqual(get_orientation_angle((200, 100), {"orientation": "landscape"}), 0)
+        self.assertEqual(get_orientation_angle((100, 200), {}), 0)
+        self.assertEqual(get_preprocessing_chain({"image_graysacle_opening_coeff": 0.5}), ["transform", "opening"])
+        self.assertEqual(get_preprocessing_chain({}), ["transform"])
+        self.assertEqual(get_preprocessing_chain({"preprocessing": ["binarize"]}), ["binarize"])
+        with self.assertRaises(ValueError):
+            get_preprocessing_chain({"preprocessing": ["transform", "sharpen"]})
+
+    def test_opening(self):
+        gs_image = Image.fromarray(self.gray_array)
+        for coeff in (1, 0.5, 0.25):
+            with self.subTest(coeff=coeff):
+                expected = numpy.asarray(pil_opening(gs_image, coeff))
+                numpy.testing.assert_array_equal(self.engine.opening(self.gray_array, coeff), expected)
+
+    def test_buffers_reuse(self):
+        first = self.engine.opening(self.gray_array, 0.5)
+        padded = self.engine._buffers["padded"]
+        second = self.engine.opening(self.gray_array, 0.5)
+        self.assertIs(self.engine._buffers["padded"], padded)
+        # results are not work buffers
+        self.assertIsNot(first, second)
+        numpy.testing.assert_array_equal(first, second)
+
+    def test_transform(self):
+        gray = Image.fromarray(self.gray_array)
+        # orientation and deskew in one rotation give the same image as two rotations
+        expected = gray.rotate(90, expand=True).rotate(2.0, expand=True, fillcolor=255)
+        numpy.testing.assert_array_equal(numpy.asarray(self.engine.transform(gray, 90, 2.0)), numpy.asarray(expected))
+        # small angles are not corrected
+        self.assertEqual(self.engine.transform(gray, 90, 0.2).size, (31, 47))
+        self.assertIs(self.engine.transform(gray, 0, 0.2), gray)
+
+    def test_binarize(self):
+        binary = self.engine.binarize(self.gray_array, 128)
+        numpy.testing.assert_array_equal(binary, numpy.where(self.gray_array < 128, 0, 255))
+
+    def test_run(self):
+        img = Image.new("RGB", (40, 60), "white")
+        out = self.engine.run(img, {"orientation": "landscape", "image_graysacle_opening_coeff": 0.5})
+        self.assertEqual((out.mode, out.size), ("L", (60, 40)))
+        out = self.engine.run(img, {"preprocessing": ["binarize"], "binarize_threshold": 128})
+        self.assertEqual((out.mode, out.size), ("L", (40, 60)))
+        # page is oriented even without transform in chain
+        out = self.engine.run(img, {"orientation": "landscape", "preprocessing": ["binarize"]})
+        self.assertEqual((out.mode, out.size), ("L", (60, 40)))
+
+
+if __name__ == '__main__':
+    unittest.main()
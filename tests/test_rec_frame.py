@@ -0,0 +1,82 @@
+import unittest
+import os
+import json
+import pickle
+from contextlib import redirect_stdout
+from io import StringIO
+import numpy
+
+# local imports
+from box import update_tesseract_rec_with_boxes
+from rec_frame import RecognitionFrame, DATA_REC_KEYS
+
+
+class TestRecognitionFrame(unittest.TestCase):
+    def setUp(self) -> None:
+        with open(os.path.join(os.environ["METADOC_ROOT"], "tests", "data_rec.json")) as f:
+            self.data_rec = json.load(f)
+        lines = ['\t'.join(DATA_REC_KEYS)] + ['\t'.join(str(self.data_rec[k][i]) for k in DATA_REC_KEYS)
+                                             for i in range(len(self.data_rec["level"]))]
+        self.tsv = '\n'.join(lines) + '\n'
+
+    def test_from_tsv(self):
+        frame = RecognitionFrame.from_tsv(self.tsv)
+        self.assertEqual(len(frame), len(self.data_rec["level"]))
+        for key in DATA_REC_KEYS:
+            if key == "conf":
+                # conf is a string in this data dictionary
+                self.assertEqual(frame[key], [float(v) for v in self.data_rec[key]])
+            else:
+                self.assertEqual(frame[key], self.data_rec[key], key)
+        self.assertEqual(frame.to_dict(), RecognitionFrame.from_dict(self.data_rec).to_dict())
+        # tesseract TSV of an empty image has only its header line
+        self.assertEqual(len(RecognitionFrame.from_tsv('\t'.join(DATA_REC_KEYS) + '\n')), 0)
+
+    def test_dict_accessors(self):
+        frame = RecognitionFrame.from_tsv(self.tsv)
+        self.assertIn("box", frame)
+        self.assertIn("conf", frame)
+        self.assertNotIn("boxes", frame)
+        self.assertIsNone(frame.get("boxes"))
+        update_tesseract_rec_with_boxes(self.data_rec)
+        update_tesseract_rec_with_boxes(frame)
+        for idx in (0, 10, len(frame) - 1):
+            self.assertEqual(str(frame["box"][idx]), str(self.data_rec["box"][idx]))
+        self.assertEqual(str(frame.page_box()), str(self.data_rec["box"][0]))
+
+        # columns can be replaced, boxes follow positions
+        frame["left"] = [val + 1 for val in frame["left"]]
+        self.assertEqual(frame["box"][10].left, self.data_rec["box"][10].left + 1)
+        numpy.testing.assert_array_equal(frame.array("right") - frame.array("left") + 1, frame.array("width"))
+
+        # frames are kept in OCR cache
+        self.assertEqual(pickle.loads(pickle.dumps(frame)).to_dict(), frame.to_dict())
+
+    def test_words(self):
+        frame = RecognitionFrame.from_tsv(self.tsv)
+        words = frame.words()
+        expected = [idx for idx, (lvl, txt) in enumerate(zip(self.data_rec["level"], self.data_rec["text"]))
+                    if lvl == 5 and str(txt).strip()]
+        self.assertEqual(words.index.tolist(), expected)
+        self.assertEqual(words["text"], [self.data_rec["text"][idx] for idx in expected])
+        confident = frame.words(min_conf=90)
+        self.assertTrue(all(conf >= 90 for conf in confident["conf"]))
+        self.assertTrue(set(confident.index.tolist()) < set(expected))
+        self.assertEqual(frame.line_keys().shape, (len(frame), 4))
+        self.assertEqual(tuple(frame.line_keys()[expected[0]]),
+                         tuple(self.data_rec[k][expected[0]] for k in ("page_num", "block_num", "par_num", "line_num")))
+
+    def test_analysis(self):
+        from reco_pdf import get_config_info, analyze_data_dict
+        cfg_json = get_config_info(os.path.join(os.environ["METADOC_ROOT"], "configs", "Hachette_config.json"))
+        frame = RecognitionFrame.from_tsv(self.tsv)
+        update_tesseract_rec_with_boxes(self.data_rec)
+        update_tesseract_rec_with_boxes(frame)
+        with redirect_stdout(StringIO()):
+            dict_table = analyze_data_dict(self.data_rec, cfg_json)
+            frame_table = analyze_data_dict(frame, cfg_json)
+        self.assertEqual(frame_table.get_csv_string(";"), dict_table.get_csv_string(";"))
+
+
+if __name__ == '__main__':
+    unittest.main()
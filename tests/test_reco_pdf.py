@@ -0,0 +1,175 @@
+import unittest
+import os
+import json
+import multiprocessing
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+from PIL import Image
+from PyPDF4 import PdfFileReader
+
+# local imports
+from reco_pdf import get_config_info, scale_config, get_dpi, get_render_dpi, is_recognition_too_poor, \
+    get_page_result, process_document, REFERENCE_DPI
+from ocr import FakeOcrBackend, set_ocr_backend
+from sinks import get_table_records, CELL_FIELDS
+from box import Box, BoxFormats, update_tesseract_rec_with_boxes
+from headers import search_headers
+import utils
+from sinks import MemorySink
+from table import Table
+
+
+class TestRecoPdf(unittest.TestCase):
+    def setUp(self) -> None:
+        self.config_info = get_config_info(os.path.join(os.environ["METADOC_ROOT"], "configs",
+                                                        "Hachette_config.json"))
+
+    def test_dpi(self):
+        self.assertEqual(get_dpi(self.config_info), REFERENCE_DPI)
+        self.assertEqual(get_render_dpi(self.config_info), REFERENCE_DPI)
+        self.assertEqual(get_render_dpi(dict(self.config_info, dpi=400, low_dpi=200)), 200)
+        self.assertEqual(get_render_dpi(dict(self.config_info, dpi=400)), 400)
+
+    def test_scale_config(self):
+        self.assertIs(scale_config(self.config_info, REFERENCE_DPI), self.config_info)
+        scaled = scale_config(self.config_info, 150)
+        self.assertEqual(scaled["headers"][0].length, round(self.config_info["headers"][0].length / 2))
+        self.assertEqual(scaled["min_pixels_for_a_line"], self.config_info["min_pixels_for_a_line"] // 2)
+        self.assertEqual(scaled["headers"][0].search_text, self.config_info["headers"][0].search_text)
+        # configuration is not modified
+        self.assertEqual(self.config_info["headers"][0].length, 153)
+
+    def test_recognition_too_poor(self):
+        self.assertTrue(is_recognition_too_poor(get_page_result(0), self.config_info))
+        for (conf, too_poor) in ((40, True), (90, False)):
+            with self.subTest(conf=conf):
+                headers_list = [{"name": "UM", "box": Box(BoxFormats.TUPLE_TBLR, (10, 20, 0, 100)), "conf": 95}]
+                package_table = Table(headers_list)
+                data_rec = {"box": [Box(BoxFormats.TUPLE_TBLR, (30, 40, 5, 50))], "conf": [conf], "text": ["12"]}
+                package_table.add_new_line_from_idx_rec(data_rec, [0], True)
+                self.assertEqual(package_table.get_mean_conf(), conf)
+                sink = MemorySink()
+                sink.write_table(1, package_table)
+                self.assertEqual(is_recognition_too_poor(get_page_result(0, sink), self.config_info), too_poor)
+
+    def test_rows_in_one_pass(self):
+        with open(os.path.join(os.environ["METADOC_ROOT"], "tests", "data_rec.json")) as f:
+            data_rec = json.load(f)
+        update_tesseract_rec_with_boxes(data_rec)
+        with redirect_stdout(StringIO()):
+            headers_list = search_headers(data_rec, self.config_info, resize_hdr=True)
+        one_pass_table = Table(headers_list)
+        by_line_table = Table(headers_list)
+        horiz_lines = utils.get_rows_from_selected_rec(data_rec, one_pass_table.search_rec_in_headed_columns(data_rec),
+                                                       threshold=self.config_info["min_pixels_for_a_line"])
+        one_pass_table.add_rows_from_lines(data_rec, horiz_lines)
+        for (l_top, l_bottom) in horiz_lines:
+            idx_rec_list = [idx for idx, c_box in enumerate(data_rec["box"])
+                            if c_box.top >= l_top and c_box.bottom <= l_bottom]
+            by_line_table.add_new_line_from_idx_rec(data_rec, idx_rec_list, True)
+        self.assertGreater(one_pass_table.get_nb_rows(), 1)
+        self.assertEqual(one_pass_table.get_csv_string(";"), by_line_table.get_csv_string(";"))
+
+
+class PageRecognition:
+    """
+    recognition data of fake OCR backend for pages of TestProcessDocument : image of page of index k is rendered
+    k pixels wider, words of this page are moved by a few pixels, not all of them by the same offset,
+    pages of odd index are recognized after a delay
+    """
+    def __init__(self, data_rec, delay=0.):
+        self.data_rec = data_rec
+        self.delay = delay
+
+    def __call__(self, img, lang, config):
+        page_idx = img.width - self.data_rec["width"][0]
+        if page_idx % 2:
+            time.sleep(self.delay)
+        data_rec = dict(self.data_rec, top=[val + (3 * page_idx * idx) % 7 if idx else val
+                                            for idx, val in enumerate(self.data_rec["top"])])
+        return data_rec
+
+
+class TestProcessDocument(unittest.TestCase):
+    """
+    documents of blank pages recognized by the fake OCR backend, pdf2image is replaced so that no pdf is rendered
+    (worker processes are forked with replaced functions)
+    """
+    NB_PAGES = 5
+
+    def setUp(self) -> None:
+        with open(os.path.join(os.environ["METADOC_ROOT"], "tests", "data_rec.json")) as f:
+            data_rec = json.load(f)
+        set_ocr_backend(FakeOcrBackend(PageRecognition(data_rec, delay=0.2)))
+        (self.width, height) = (data_rec["width"][0], data_rec["height"][0])
+        self.patchers = [mock.patch("pages.pdfinfo_from_path", return_value={"Pages": self.NB_PAGES}),
+                         mock.patch("pages.convert_from_path",
+                                    side_effect=lambda path, dpi, first_page, last_page, grayscale:
+                                    [Image.new('L', (self.width + page_idx, height), 255)
+                                     for page_idx in range(first_page - 1, last_page)])]
+        for patcher in self.patchers:
+            patcher.start()
+        self.config_info = dict(get_config_info(os.path.join(os.environ["METADOC_ROOT"], "configs",
+                                                             "Hachette_config.json")), text_layer=False)
+        self.tmp_dir = TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        for patcher in self.patchers:
+            patcher.stop()
+        set_ocr_backend(None)
+        self.tmp_dir.cleanup()
+
+    def process(self, name, jobs, extract=False):
+        root_file = os.path.join(self.tmp_dir.name, name)
+        sink = MemorySink()
+        with redirect_stdout(StringIO()):
+            stats = process_document(root_file, self.config_info, jobs=jobs, chunk_size=2, extract_pdf=extract,
+                                     extract_hocr=extract, sink=sink)
+        headers_boxes = [[str(cell.box) for cell in table.rows[0].cells if cell] for (_, table) in sink.tables]
+        return stats, headers_boxes, [record for (page_num, table) in sink.tables
+                                      for record in get_table_records(table, page_num)]
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "replaced functions are not in workers")
+    def test_jobs_results(self):
+        sequential = self.process("sequential", 1)
+        (stats, headers_boxes, records) = sequential
+        self.assertEqual(stats, {"nb_pages": self.NB_PAGES, "nb_tables": self.NB_PAGES})
+        self.assertGreater(len(records), self.NB_PAGES)
+        # headers of next pages are given by the template of first page
+        self.assertNotEqual(headers_boxes[0], headers_boxes[1])
+        # results do not depend on pages given to each worker
+        self.assertEqual(self.process("parallel", 2), sequential)
+
+    def read_outputs(self, name):
+        root_file = os.path.join(self.tmp_dir.name, name)
+        with open('{}_output.pdf'.format(root_file), 'rb') as f:
+            pdf_widths = [round(float(page.mediaBox.getWidth())) for page in PdfFileReader(f).pages]
+        hocr_pages = []
+        for page_num in range(1, self.NB_PAGES + 1):
+            with open('{}_p{}.html'.format(root_file, page_num)) as f:
+                hocr_pages.append(f.read())
+        with Image.open('{}_temp.png'.format(root_file)) as temp_img:
+            temp_size = temp_img.size
+        return pdf_widths, hocr_pages, temp_size
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "replaced functions are not in workers")
+    def test_ordered_outputs(self):
+        (_, _, records) = self.process("sequential", 1, extract=True)
+        self.assertEqual(sorted({record[CELL_FIELDS.index("page")] for record in records}),
+                         list(range(1, self.NB_PAGES + 1)))
+        # pages of odd index are finished by workers after next pages
+        self.assertEqual(self.process("parallel", 2, extract=True)[2], records)
+        (pdf_widths, hocr_pages, temp_size) = self.read_outputs("sequential")
+        # searchable pdf pages are images of pages, one pixel wider on each page
+        self.assertEqual(pdf_widths, [self.width + page_idx for page_idx in range(self.NB_PAGES)])
+        # recognition image of last page is kept
+        self.assertEqual(temp_size[0], self.width + self.NB_PAGES - 1)
+        self.assertEqual(self.read_outputs("parallel"), (pdf_widths, hocr_pages, temp_size))
+        self.assertEqual([name for name in os.listdir(self.tmp_dir.name) if "_temp_" in name], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
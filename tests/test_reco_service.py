@@ -0,0 +1,113 @@
+import unittest
+import os
+import json
+import socket
+import threading
+from contextlib import redirect_stdout
+from http.client import HTTPConnection
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+# local imports
+from registry import ConfigRegistry
+from reco_service import RecognitionService, create_server
+
+
+class UnixHTTPConnection(HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+class TestRecoService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        with redirect_stdout(StringIO()):
+            registry = ConfigRegistry.from_dir(os.path.join(os.environ["METADOC_ROOT"], "configs"))
+        cls.service = RecognitionService(registry, jobs=1, max_size=1000, warm_up=False)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.service.close()
+
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def serve(self, **kwargs):
+        server = create_server(self.service, port=0, default_config="Hachette_config", **kwargs)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def request(self, conn, method, path, body=None):
+        conn.request(method, path, body=body)
+        response = conn.getresponse()
+        content = response.read().decode("utf-8")
+        return response.status, content
+
+    def test_http(self):
+        server = self.serve()
+        conn = HTTPConnection("127.0.0.1", server.server_address[1])
+        self.addCleanup(conn.close)
+        status, content = self.request(conn, "GET", "/health")
+        self.assertEqual((status, json.loads(content)), (200, {"status": "ok", "workers": 1}))
+        status, content = self.request(conn, "GET", "/configs")
+        self.assertEqual(json.loads(content), {"configs": ["Hachette_config"], "default": "Hachette_config"})
+        self.assertEqual(self.request(conn, "GET", "/other")[0], 404)
+
+        # bad requests are not sent to workers
+        self.assertEqual(self.request(conn, "POST", "/recognize?config=Other", b"%PDF")[0], 400)
+        self.assertEqual(self.request(conn, "POST", "/recognize", b"")[0], 400)
+        self.assertEqual(self.request(conn, "POST", "/recognize", b"%PDF" * 1000)[0], 413)
+
+        # a document that can not be read is an error of job
+        status, content = self.request(conn, "POST", "/recognize?pdf=0&hocr=0", b"not a pdf")
+        result = json.loads(content)
+        self.assertEqual(status, 500)
+        self.assertEqual(result["config"], "Hachette_config")
+        self.assertTrue(result["error"])
+        self.assertEqual(result["tables"], [])
+        self.assertGreaterEqual(result["latency"], result["time"])
+
+        status, metrics = self.request(conn, "GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertIn("reco_queue_depth 0\n", metrics)
+        self.assertIn("reco_jobs_running 0\n", metrics)
+        self.assertIn('reco_jobs_total{status="error"} 1\n', metrics)
+        self.assertIn("reco_job_latency_seconds_count 1\n", metrics)
+        self.assertIn('reco_job_latency_seconds{quantile="0.5"}', metrics)
+
+    def test_content_length(self):
+        server = self.serve()
+        # body of a valid length is read before path is checked
+        for (length_header, body, code) in (("", b"", 411), ("Content-Length: -1\r\n", b"", 400),
+                                            ("Content-Length: abc\r\n", b"", 400),
+                                            ("Content-Length: 4\r\n", b"%PDF", 404)):
+            with self.subTest(length_header=length_header):
+                with socket.create_connection(server.server_address, timeout=10) as sock:
+                    sock.sendall("POST /other HTTP/1.1\r\nHost: localhost\r\n{}\r\n".format(length_header).encode()
+                                 + body)
+                    status_line = sock.makefile("rb").readline().decode()
+                self.assertEqual(int(status_line.split()[1]), code)
+
+    def test_unix_socket(self):
+        socket_path = os.path.join(self.tmp_dir.name, "reco.sock")
+        self.serve(unix_socket=socket_path)
+        conn = UnixHTTPConnection(socket_path)
+        self.addCleanup(conn.close)
+        status, content = self.request(conn, "GET", "/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(content)["status"], "ok")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import os
+import json
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+# local imports
+from registry import ConfigRegistry
+from box import update_tesseract_rec_with_boxes
+
+
+def write_text_pdf(path, pages_texts, width=842, height=595):
+    """
+    write a pdf with a text layer on each page
+    :param pages_texts: list of pages texts, lists of tuples (x, y, text) in pdf points
+    """
+    nb_pages = len(pages_texts)
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>",
+               "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+                   " ".join("{} 0 R".format(4 + 2 * idx) for idx in range(nb_pages)), nb_pages),
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for idx, texts in enumerate(pages_texts):
+        content = "BT /F1 10 Tf " + " ".join("1 0 0 1 {} {} Tm ({}) Tj".format(*t) for t in texts) + " ET"
+        objects += ["<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {} {}] /Contents {} 0 R "
+                    "/Resources << /Font << /F1 3 0 R >> >> >>".format(width, height, 5 + 2 * idx),
+                    "<< /Length {} >>\nstream\n{}\nendstream".format(len(content), content)]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for num, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += "{} 0 obj\n{}\nendobj\n".format(num, obj).encode()
+    xref_pos = len(out)
+    out += "xref\n0 {}\n0000000000 65535 f \n".format(len(objects) + 1).encode()
+    for offset in offsets:
+        out += "{:010d} 00000 n \n".format(offset).encode()
+    out += "trailer\n<< /Size {} /Root 1 0 R >>\nstartxref\n{}\n%%EOF\n".format(len(objects) + 1, xref_pos).encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory()
+        root = os.environ["METADOC_ROOT"]
+        with open(os.path.join(root, "configs", "Hachette_config.json")) as f:
+            hachette = f.read()
+        with open(os.path.join(self.tmp_dir.name, "Hachette_config.json"), "w") as f:
+            f.write(hachette)
+        other = {"orientation": "portrait", "min_pixels_for_a_line": 200,
+                 "headers": [{"id": "Ref", "search_text": "Reference", "length": 200},
+                             {"id": "Qty", "search_text": "Quantite", "length": 150, "max_errors": 1},
+                             {"id": "Pays", "search_text": "PAYS.*", "length": 300}]}
+        with open(os.path.join(self.tmp_dir.name, "Other_config.json"), "w") as f:
+            json.dump(other, f)
+        # configuration in an old format is ignored
+        with open(os.path.join(self.tmp_dir.name, "Old_config.json"), "w") as f:
+            json.dump({"headers": ["Pays - CP", "N Colis"]}, f)
+        output = StringIO()
+        with redirect_stdout(output):
+            self.registry = ConfigRegistry.from_dir(self.tmp_dir.name)
+        self.assertIn("Old_config.json is ignored", output.getvalue())
+        with open(os.path.join(root, "tests", "data_rec.json")) as f:
+            self.data_rec = json.load(f)
+        update_tesseract_rec_with_boxes(self.data_rec)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_registry(self):
+        self.assertEqual(sorted(self.registry.configs), ["Hachette_config", "Other_config"])
+        self.assertEqual(len(self.registry.owners), len(self.registry.configs["Hachette_config"]["headers"]) + 3)
+        self.assertEqual(self.registry.matcher.nb_headers, len(self.registry.owners))
+
+    def test_classify(self):
+        scores = self.registry.score_data_rec(self.data_rec)
+        self.assertGreaterEqual(scores["Hachette_config"], 0.5)
+        self.assertLess(scores["Other_config"], 0.5)
+        self.assertEqual(self.registry.classify_data_rec(self.data_rec), ("Hachette_config", scores["Hachette_config"]))
+
+        # words of other template, with an OCR error
+        words = ["Reference", "Quantlte", "PAYS.DEST", "Colis"]
+        data_rec = {"level": [1] + [5] * len(words), "text": [""] + words}
+        scores = self.registry.score_data_rec(data_rec)
+        self.assertAlmostEqual(scores["Other_config"], (1 + 7 / 8 + 1) / 3)
+        self.assertEqual(self.registry.classify_data_rec(data_rec)[0], "Other_config")
+
+        # unknown document
+        data_rec = {"level": [1, 5, 5], "text": ["", "Facture", "Total"]}
+        name, score = self.registry.classify_data_rec(data_rec)
+        self.assertIsNone(name)
+        self.assertLess(score, 0.5)
+
+    def test_classify_document(self):
+        headers = ["Colis", "Palet", "Poids.(KG)", "RUN", "LOREC", "Facture.", "CLIENT.", "VILLE.", "PAYS."]
+        manifest_page = [(40 + 85 * idx, 500, text) for idx, text in enumerate(headers)]
+        manifest_page += [(40, 480 - 15 * row, "{} 12,5 LIBRAIRIE PARIS FRANCE".format(row)) for row in range(8)]
+        letter_text = "Madame Monsieur nous vous remercions de votre commande numero {}"
+        letter_page = [(72, 500 - 15 * row, letter_text.format(row)) for row in range(4)]
+        for (name, pages_texts, expected, nb_read) in (("manifest", [manifest_page, letter_page], "Hachette_config", 1),
+                                                       ("late", [letter_page, manifest_page], "Hachette_config", 2),
+                                                       ("letter", [letter_page, letter_page], None, 2)):
+            with self.subTest(document=name):
+                pdf_path = os.path.join(self.tmp_dir.name, name + ".pdf")
+                write_text_pdf(pdf_path, pages_texts)
+                output = StringIO()
+                with redirect_stdout(output):
+                    config_name, score = self.registry.classify_document(pdf_path, nb_pages=len(pages_texts),
+                                                                         verbose=1)
+                self.assertEqual(config_name, expected)
+                if expected is None:
+                    self.assertLess(score, self.registry.min_score)
+                else:
+                    self.assertGreaterEqual(score, self.registry.min_score)
+                # pages are read until one is known
+                self.assertEqual(output.getvalue().count(" scores : "), nb_read)
+                self.assertNotIn("ERROR", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from PIL import Image
+
+# local imports
+from box import Box, BoxFormats
+from headers import ConfigHeader
+from rec_frame import DATA_REC_KEYS
+from roi_ocr import scale_data_rec, get_table_region, get_columns_groups, add_mapped_data_rec, \
+    recognize_table_region, BLOCK_NUM_OFFSET, STRIPS_GAP
+
+
+def make_data_rec(words):
+    """
+    :param words: list of tuples (left, top, width, height, text)
+    :return: data dictionary with a page entry then one entry by word
+    """
+    data_rec = {key: [] for key in DATA_REC_KEYS}
+    entries = [(1, 1, 0, 0, 0, 0, 0, 0, 1000, 1000, -1, "")]
+    entries += [(5, 1, 1, 1, 1, idx + 1, l, t, w, h, 90, txt) for idx, (l, t, w, h, txt) in enumerate(words)]
+    for entry in entries:
+        for key, val in zip(DATA_REC_KEYS, entry):
+            data_rec[key].append(val)
+    return data_rec
+
+
+class TestRoiOcr(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cfg_json = {"headers": [ConfigHeader({"id": "UM", "search_text": "Colis", "length": 100}),
+                                     ConfigHeader({"id": "Poids", "search_text": "Poids", "length": 100,
+                                                   "tesseract_config": "--psm 6"}),
+                                     ConfigHeader({"id": "RUN", "search_text": "RUN", "length": 100,
+                                                   "tesseract_config": "--psm 6"})]}
+        self.headers_list = [{"name": "UM", "cfg_index": 0, "box": Box(BoxFormats.TUPLE_TBLR, (100, 120, 50, 149))},
+                             {"name": "Poids", "cfg_index": 1, "box": Box(BoxFormats.TUPLE_TBLR, (102, 122, 200, 299))},
+                             {"name": "RUN", "cfg_index": 2, "box": Box(BoxFormats.TUPLE_TBLR, (101, 121, 400, 499))}]
+
+    def test_scale(self):
+        data_rec = make_data_rec([(10, 20, 30, 40, "a")])
+        scale_data_rec(data_rec, 2)
+        self.assertEqual([data_rec[k][1] for k in ("left", "top", "width", "height")], [20, 40, 60, 80])
+
+    def test_region_and_groups(self):
+        self.assertEqual(get_table_region(self.headers_list, (1000, 800), margin=10), (90, 122, 40, 509))
+        self.assertIsNone(get_table_region([{"name": "UM", "cfg_index": 0}], (1000, 800)))
+        groups = get_columns_groups(self.headers_list, self.cfg_json)
+        self.assertEqual(list(groups), ["--psm 6"])
+        self.assertEqual([hdr["name"] for hdr in groups["--psm 6"]], ["Poids", "RUN"])
+
+    def test_mapping(self):
+        page_rec = {key: [] for key in DATA_REC_KEYS}
+        data_rec = make_data_rec([(5, 7, 10, 10, "a"), (60, 7, 10, 10, "gap"), (105, 8, 10, 10, "b")])
+        add_mapped_data_rec(page_rec, data_rec, [(0, 50, 200, 300), (100, 150, 300, 300)], 2000)
+        # page entry and object in gap are ignored
+        self.assertEqual(page_rec["text"], ["a", "b"])
+        self.assertEqual(page_rec["left"], [205, 405])
+        self.assertEqual(page_rec["top"], [307, 308])
+        self.assertEqual(page_rec["block_num"], [2001, 2001])
+
+    def test_recognize_table_region(self):
+        img = Image.new("L", (1000, 800), 255)
+        calls = []
+
+        def recognize(region_img, config):
+            calls.append((region_img.size, config))
+            # one word at left of each image
+            return make_data_rec([(3, 4, 20, 10, "w{}".format(len(calls)))])
+
+        page_rec = recognize_table_region(img, self.headers_list, self.cfg_json, recognize)
+        # columns with a specific config are recognized together, then table region with headers row
+        self.assertEqual(calls, [((100 + STRIPS_GAP + 100, 800 - 123), "--psm 6"), ((470, 800 - 90), "")])
+        self.assertEqual(page_rec["level"][0], 1)
+        self.assertEqual((page_rec["width"][0], page_rec["height"][0]), (1000, 800))
+        self.assertEqual(page_rec["text"][1:], ["w1", "w2"])
+        # first word is in Poids column, below headers row
+        self.assertEqual((page_rec["left"][1], page_rec["top"][1]), (203, 127))
+        self.assertEqual(page_rec["block_num"][1], 1 + BLOCK_NUM_OFFSET)
+        # second word is in table region
+        self.assertEqual((page_rec["left"][2], page_rec["top"][2]), (43, 94))
+
+
+if __name__ == '__main__':
+    unittest.main()
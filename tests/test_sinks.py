@@ -0,0 +1,94 @@
+import unittest
+import os
+import csv
+import json
+import sqlite3
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+# local imports
+from sinks import CELL_FIELDS, CsvSink, JsonlSink, MemorySink, SqliteSink, StdoutSink, get_table_records
+
+
+class TestSinks(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        from reco_pdf import get_config_info, analyze_data_dict
+        from box import update_tesseract_rec_with_boxes
+        root = os.environ["METADOC_ROOT"]
+        cfg_json = get_config_info(os.path.join(root, "configs", "Hachette_config.json"))
+        with open(os.path.join(root, "tests", "data_rec.json")) as f:
+            data_rec = json.load(f)
+        update_tesseract_rec_with_boxes(data_rec)
+        with redirect_stdout(StringIO()):
+            cls.table = analyze_data_dict(data_rec, cfg_json)
+        cls.records = list(get_table_records(cls.table, 2, "doc.pdf"))
+
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_records(self):
+        self.assertTrue(self.records)
+        nb_rows = len(self.table.rows) - 1
+        for record in self.records:
+            self.assertEqual(len(record), len(CELL_FIELDS))
+            self.assertEqual(record[0:2], ("doc.pdf", 2))
+            self.assertTrue(1 <= record[2] <= nb_rows)
+            cell = self.table.rows[record[2]].cells[record[3]]
+            self.assertEqual(record[5], str(cell))
+            self.assertEqual(record[4], str(self.table.rows[0].cells[record[3]]))
+
+    def test_stdout(self):
+        out = StringIO()
+        with redirect_stdout(out), StdoutSink() as sink:
+            sink.write_table(2, self.table)
+        self.assertEqual(out.getvalue(), "Package table found : \n{}\n----------------\n".format(
+            self.table.get_csv_string(separator=";")))
+
+    def test_memory(self):
+        sink = MemorySink()
+        sink.write_table(2, self.table)
+        self.assertEqual(sink.tables, [(2, self.table)])
+
+    def test_csv_jsonl(self):
+        csv_path = os.path.join(self.tmp_dir.name, "tables.csv")
+        jsonl_path = os.path.join(self.tmp_dir.name, "tables.jsonl")
+        with CsvSink(csv_path, "doc.pdf") as csv_sink, JsonlSink(jsonl_path, "doc.pdf") as jsonl_sink:
+            csv_sink.write_table(2, self.table)
+            jsonl_sink.write_table(2, self.table)
+
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            rows = list(csv.reader(f, delimiter=';'))
+        self.assertEqual(rows[0], CELL_FIELDS)
+        self.assertEqual(rows[1:], [[str(v) for v in record] for record in self.records])
+
+        with open(jsonl_path, encoding='utf-8') as f:
+            objects = [json.loads(line) for line in f]
+        self.assertEqual(objects, [dict(zip(CELL_FIELDS, record)) for record in self.records])
+
+    def test_sqlite(self):
+        db_path = os.path.join(self.tmp_dir.name, "tables.db")
+        # small batches : records are inserted in several transactions
+        with SqliteSink(db_path, "doc.pdf", batch_size=3) as sink:
+            sink.write_table(2, self.table)
+            sink.write_table(3, self.table)
+        # a second sink appends to the same database
+        with SqliteSink(db_path, "doc2.pdf") as sink:
+            sink.write_table(1, self.table)
+
+        connection = sqlite3.connect(db_path)
+        nb_records = connection.execute("SELECT COUNT(*) FROM cells").fetchone()[0]
+        pages = connection.execute("SELECT DISTINCT document, page FROM cells ORDER BY document, page").fetchall()
+        first = connection.execute("SELECT * FROM cells WHERE page = 2 ORDER BY rowid LIMIT 1").fetchone()
+        connection.close()
+        self.assertEqual(nb_records, 3 * len(self.records))
+        self.assertEqual(pages, [("doc.pdf", 2), ("doc.pdf", 3), ("doc2.pdf", 1)])
+        self.assertEqual(first, self.records[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,9 @@ from collections import Counter
 
 # local imports
 from utils import get_line_tuple_from_index, is_same_line, get_min_max_line_idx, get_best_count, is_simple_reg_ex_ok, \
-    count_objects_by_rows, get_rows_from_selected_rec
+    count_objects_by_rows, get_rows_from_selected_rec, get_line_index, LineIndex, LINE_INDEX_KEY, \
+    get_rows_histogram
+from rec_frame import RecognitionFrame
 import box
 
 class TestUtils(unittest.TestCase):
@@ -22,6 +24,39 @@ class TestUtils(unittest.TestCase):
 
         self.assertEqual(get_min_max_line_idx(self.data_rec, line), (4, 5))
 
+    def test_line_index(self):
+        line_index = get_line_index(self.data_rec)
+        # index is built once and kept with data
+        self.assertIs(get_line_index(self.data_rec), line_index)
+        line = (1, 1, 1, 1)
+        self.assertEqual(line_index.get_min_max_idx(line), (4, 5))
+        self.assertEqual(line_index.get_min_max_idx((9, 9, 9, 9)), (-1, -1))
+        self.assertEqual(line_index.get_text(line), "{} {}".format(self.data_rec["text"][4], self.data_rec["text"][5]))
+        union = box.Box(box.BoxFormats.EMPTY)
+        union.union(self.data_rec["box"][4])
+        union.union(self.data_rec["box"][5])
+        self.assertEqual(line_index.get_box(line), (union.top, union.bottom, union.left, union.right))
+        # same answers as a scan of all words
+        for idx in range(0, len(self.data_rec["level"]), 7):
+            cur_line = line_index.get_line(idx)
+            words = [i for i, lvl in enumerate(self.data_rec["level"]) if lvl >= 5 and
+                     (self.data_rec["page_num"][i], self.data_rec["block_num"][i], self.data_rec["par_num"][i],
+                      self.data_rec["line_num"][i]) == cur_line]
+            self.assertEqual(line_index.get_min_max_idx(cur_line), (words[0], words[-1]) if words else (-1, -1))
+
+        # index is removed when boxes are updated
+        box.update_tesseract_rec_with_boxes(self.data_rec)
+        self.assertNotIn(LINE_INDEX_KEY, self.data_rec)
+
+        # frames keep their index until a column is changed
+        frame = RecognitionFrame.from_dict(self.data_rec)
+        frame_index = get_line_index(frame)
+        self.assertIsInstance(frame_index, LineIndex)
+        self.assertIs(get_line_index(frame), frame_index)
+        self.assertEqual(frame_index.get_min_max_idx(line), (4, 5))
+        frame["line_num"] = [0] * len(frame)
+        self.assertEqual(get_line_index(frame).get_min_max_idx(line), (-1, -1))
+
     def test_counting_objects(self):
         idx_list = [(0, [x]) for x in range(20, 100) if self.data_rec["level"][x] == 5]
         h_count = count_objects_by_rows(self.data_rec, idx_list)
@@ -33,6 +68,15 @@ class TestUtils(unittest.TestCase):
         h_lines = get_rows_from_selected_rec(self.data_rec, idx_list, threshold=1000, verbose=0)
         self.assertEqual(h_lines, expected_h_lines)
 
+        # same rows with one tuple by column, no rows without objects
+        by_column = [(0, [idx for (_, [idx]) in idx_list])]
+        self.assertEqual(get_rows_from_selected_rec(self.data_rec, by_column, threshold=1000), expected_h_lines)
+        self.assertEqual(count_objects_by_rows(self.data_rec, by_column), h_count)
+        self.assertEqual(get_rows_from_selected_rec(self.data_rec, []), [])
+        first_row, counts, covered = get_rows_histogram(self.data_rec, idx_list)
+        self.assertEqual(counts[420 - first_row], 31)
+        self.assertEqual(int(covered.sum()), len(h_count))
+
         # test counter functions
         inputCounter = Counter({'red': 5, 'blue': 2, 'green':3})
         self.assertEqual(get_best_count(inputCounter, 2), 'red')
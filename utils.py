@@ -1,5 +1,93 @@
-
 from collections import Counter
+import numpy
+
+# key of line index in recognition data (see get_line_index)
+LINE_INDEX_KEY = "line_index"
+# level of words in tesseract data
+WORD_LEVEL = 5
+
+
+class LineIndex:
+    """
+    index of lines of recognition results, built once by data_rec (see get_line_index)
+    ...
+    Attributes
+    line_of : list of line tuples (page num, block num, paragraph num, line num) of all objects
+    lines : dictionary line tuple -> dictionary of words of line {"indexes", "box", "text"}
+
+    Methods
+    get_line : line tuple of an object
+    get_min_max_idx : min and max indexes of words of a line
+    get_box : union of boxes of words of a line
+    get_text : text of a line
+    """
+    def __init__(self, data_rec):
+        """
+        Constructor
+        :param data_rec: recognition results in tesseract format
+        """
+        self.line_of = list(zip(data_rec["page_num"], data_rec["block_num"], data_rec["par_num"],
+                                data_rec["line_num"]))
+        self.lines = {}
+        for idx, (lvl, line) in enumerate(zip(data_rec["level"], self.line_of)):
+            if lvl >= WORD_LEVEL:
+                self.lines.setdefault(line, {"indexes": []})["indexes"].append(idx)
+
+        lefts, tops, widths, heights = data_rec["left"], data_rec["top"], data_rec["width"], data_rec["height"]
+        for line_info in self.lines.values():
+            indexes = line_info["indexes"]
+            line_info["box"] = (min(tops[idx] for idx in indexes),
+                                max(tops[idx] + heights[idx] - 1 for idx in indexes),
+                                min(lefts[idx] for idx in indexes),
+                                max(lefts[idx] + widths[idx] - 1 for idx in indexes))
+            line_info["text"] = " ".join(str(data_rec["text"][idx]) for idx in indexes)
+
+    def get_line(self, index):
+        """
+        :param index: index of object
+        :return: line tuple of object
+        """
+        return self.line_of[index]
+
+    def get_min_max_idx(self, line):
+        """
+        :param line: line in tuple format (page num, block num, paragraph num, line num)
+        :return: tuple min, max indexes of words of line, (-1, -1) if line has no word
+        """
+        line_info = self.lines.get(line)
+        if line_info is None:
+            return -1, -1
+        return line_info["indexes"][0], line_info["indexes"][-1]
+
+    def get_box(self, line):
+        """
+        :param line: line in tuple format (page num, block num, paragraph num, line num)
+        :return: tuple (top, bottom, left, right) of union of words of line, None if line has no word
+        """
+        line_info = self.lines.get(line)
+        return line_info["box"] if line_info else None
+
+    def get_text(self, line):
+        """
+        :param line: line in tuple format (page num, block num, paragraph num, line num)
+        :return: texts of words of line separated by spaces, empty string if line has no word
+        """
+        line_info = self.lines.get(line)
+        return line_info["text"] if line_info else ""
+
+
+def get_line_index(data_rec):
+    """
+    get line index of recognition results, it is created at first call and kept in data_rec
+    (removed when boxes are updated, see box.update_tesseract_rec_with_boxes)
+    :param data_rec: recognition results in tesseract format
+    :return: LineIndex object
+    """
+    line_index = data_rec.get(LINE_INDEX_KEY)
+    if line_index is None:
+        line_index = LineIndex(data_rec)
+        data_rec[LINE_INDEX_KEY] = line_index
+    return line_index
 
 
 def get_line_tuple_from_index(data_rec, index):
@@ -8,8 +96,7 @@ def get_line_tuple_from_index(data_rec, index):
     :param index: index of object to analyse
     :return: line tuple of index object
     """
-    return (data_rec["page_num"][index], data_rec["block_num"][index],
-                      data_rec["par_num"][index], data_rec["line_num"][index])
+    return get_line_index(data_rec).get_line(index)
 
 
 def is_same_line(data_rec, index, line):
@@ -19,8 +106,7 @@ def is_same_line(data_rec, index, line):
     :param line: line in tuple format (page num, block num, paragraph num, line num)
     :return: True if lines are equal, False otherwise
     """
-    line_tuple = get_line_tuple_from_index(data_rec, index)
-    return line_tuple == line
+    return get_line_index(data_rec).get_line(index) == line
 
 
 def get_min_max_line_idx(data_rec, line):
@@ -28,17 +114,9 @@ def get_min_max_line_idx(data_rec, line):
     get min and max indexes in data_rec reco for words that are in given line
     :param data_rec: recognition results in tesseract format
     :param line: line in tuple format (page num, block num, paragraph num, line num)
-    :return: tuple min, ma  x indexes
+    :return: tuple min, max indexes
     """
-    min_line_idx = -1
-    max_line_idx = -1
-    for idx, lvl in enumerate(data_rec["level"]):
-        if lvl >= 5: # word level
-            if is_same_line(data_rec, idx, line):
-                if min_line_idx == -1:
-                    min_line_idx = idx
-                max_line_idx = idx
-    return min_line_idx, max_line_idx
+    return get_line_index(data_rec).get_min_max_idx(line)
 
 
 def get_best_count(line_cnt, min_diff):
@@ -74,6 +152,75 @@ def is_simple_reg_ex_ok(search_txt, rec_txt):
         return False
 
 
+def get_bigrams(text):
+    """
+    :param text: input text
+    :return: Counter of pairs of consecutive characters of text
+    """
+    return Counter(text[idx:idx + 2] for idx in range(len(text) - 1))
+
+
+def get_bounded_edit_distance(ref_txt, rec_txt, max_dist, prefix=False):
+    """
+    Levenshtein distance between a reference text and a recognized text, only computed in a band of max_dist
+    around diagonal and stopped as soon as distance is more than max_dist
+    :param ref_txt: reference text
+    :param rec_txt: recognized text
+    :param max_dist: maximal distance
+    :param prefix: if True, distance between ref_txt and nearest beginning of rec_txt
+    :return: distance, None if it is more than max_dist
+    """
+    len_ref, len_rec = len(ref_txt), len(rec_txt)
+    if len_ref - len_rec > max_dist or (not prefix and len_rec - len_ref > max_dist):
+        return None
+    too_far = max_dist + 1
+    previous = [min(j, too_far) for j in range(len_rec + 1)]
+    for i in range(1, len_ref + 1):
+        current = [min(i, too_far)] + [too_far] * len_rec
+        ref_char = ref_txt[i - 1]
+        for j in range(max(1, i - max_dist), min(len_rec, i + max_dist) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_char != rec_txt[j - 1]),
+                             too_far)
+        if min(current) > max_dist:
+            return None
+        previous = current
+    if prefix:
+        distance = min(previous[max(0, len_ref - max_dist):min(len_rec, len_ref + max_dist) + 1])
+    else:
+        distance = previous[len_rec]
+    return distance if distance <= max_dist else None
+
+
+def get_rows_histogram(data_rec, indexes_any_rec, use_size=False):
+    """
+    histogram of objects by pixel rows, computed with a difference array : +count at top of each object,
+    -count after its bottom, then cumulative sum
+    :param data_rec: recognition results in tesseract format (with boxes)
+    :param indexes_any_rec: list of tuples (any, list of indexes to consider)
+    :param use_size: use horizontal length of object (if True) or one by object (if False [default])
+    :return: tuple (first row, numpy array of counts by row from first row, boolean numpy array of rows covered by
+             at least one object), (0, empty array, empty array) if there is no object
+    """
+    from box import get_box_array
+    indexes = [idx for ind_rec in indexes_any_rec for idx in ind_rec[1]]
+    tblr = get_box_array(data_rec, indexes).tblr
+    tblr = tblr[tblr[:, 1] >= tblr[:, 0]]
+    if len(tblr) == 0:
+        return 0, numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=bool)
+    first_row = int(tblr[:, 0].min())
+    nb_rows = int(tblr[:, 1].max()) - first_row + 2
+    tops = tblr[:, 0] - first_row
+    ends = tblr[:, 1] - first_row + 1
+    coverage = numpy.bincount(tops, minlength=nb_rows) - numpy.bincount(ends, minlength=nb_rows)
+    if use_size:
+        weights = tblr[:, 3] - tblr[:, 2] + 1
+        counts = numpy.bincount(tops, weights, minlength=nb_rows) - numpy.bincount(ends, weights, minlength=nb_rows)
+        counts = numpy.cumsum(counts).astype(numpy.int64)
+    else:
+        counts = numpy.cumsum(coverage)
+    return first_row, counts[:-1], numpy.cumsum(coverage)[:-1] > 0
+
+
 def count_objects_by_rows(data_rec, indexes_any_rec, use_size=False, verbose=0):
     """
     count objects in the recognition structure and list of indexes by rows
@@ -83,14 +230,9 @@ def count_objects_by_rows(data_rec, indexes_any_rec, use_size=False, verbose=0):
     :param verbose: verbose mode
     :return: a counter with pixel rows values as keys
     """
-    horizontal_cnt = Counter()
-    for indexes in indexes_any_rec:
-        for data_idx in indexes[1]:
-            top = data_rec["box"][data_idx].top
-            bottom = data_rec["box"][data_idx].bottom
-            cnt = data_rec["box"][data_idx].get_horizontal_span() if use_size else 1
-            for h in range(top, bottom+1):
-                horizontal_cnt[h] += cnt
+    first_row, counts, covered = get_rows_histogram(data_rec, indexes_any_rec, use_size=use_size)
+    rows = numpy.flatnonzero(covered)
+    horizontal_cnt = Counter(dict(zip((rows + first_row).tolist(), counts[rows].tolist())))
     if verbose:
         print("horizontal count of selected objects : {}".format(horizontal_cnt))
 
@@ -106,17 +248,14 @@ def get_rows_from_selected_rec(data_rec, indexes_any_rec, threshold=1, verbose=0
     :param verbose: verbose mode
     :return: a list of rows, each one is a tuple (begin, end) in pixels
     """
-    h_lines_begin_end = []
-    horiz_count = count_objects_by_rows(data_rec, indexes_any_rec, use_size=True, verbose=verbose)
-    sorted_h_pos = sorted([hz_pos for hz_pos in horiz_count if horiz_count[hz_pos] >= threshold])
-    begin = last = end = sorted_h_pos[0]
-    for h in sorted_h_pos[1:]:
-        if h == last + 1:
-            end = h
-        else:
-            h_lines_begin_end.append((begin, end))
-            begin = end = h
-        last = h
-    # last line is not
-    h_lines_begin_end.append((begin, end))
-    return h_lines_begin_end
+    first_row, counts, covered = get_rows_histogram(data_rec, indexes_any_rec, use_size=True)
+    if verbose:
+        rows = numpy.flatnonzero(covered)
+        print("horizontal count of selected objects : {}".format(
+            Counter(dict(zip((rows + first_row).tolist(), counts[rows].tolist())))))
+    selected = numpy.concatenate(([0], (covered & (counts >= threshold)).astype(numpy.int8), [0]))
+    # runs of selected rows begin where selection goes from 0 to 1 and end before it goes from 1 to 0
+    changes = numpy.diff(selected)
+    begins = numpy.flatnonzero(changes == 1) + first_row
+    ends = numpy.flatnonzero(changes == -1) - 1 + first_row
+    return list(zip(begins.tolist(), ends.tolist()))